@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Micro-benchmark of the telemetry frame decoder against the legacy parser.
+
+Run from the repository root: "./bench/decoder.py [frames]".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from time import time
+from commons import *
+import boat
+import telemetry
+
+
+class LegacyBoat(object):
+
+    '''
+    Replica of the original Boat.parse_log_data (one setattr per field).
+    '''
+
+    def __init__(self):
+        for a in LOG_SIGNALS.itervalues():
+            setattr(self, a[0], 0)
+
+    def parse_log_data(self, data):
+        for value in data.split():
+            key, value = value.split(":")
+            setattr(self, LOG_SIGNALS[key][0], int(float(value)))
+        self.last_log_message_time = time()
+
+
+def sample_frames(number):
+    '''
+    Generate "number" different frames carrying every known log signal.
+    '''
+    frames = []
+    for i in xrange(number):
+        bits = []
+        for key, entry in sorted(LOG_SIGNALS.iteritems()):
+            if entry[2] == 'REAL':
+                bits.append('%s:%.6f' % (key, 57.7 + i * 1e-6))
+            else:
+                bits.append('%s:%d' % (key, i % 360))
+        frames.append(' '.join(bits))
+    return frames
+
+
+def measure(parse, frames):
+    '''
+    Return the frames/sec rate of the "parse" callable over "frames".
+    '''
+    start = time()
+    for frame in frames:
+        parse(frame)
+    return len(frames) / (time() - start)
+
+
+def main(number=100000):
+    frames = sample_frames(number)
+    legacy = LegacyBoat()
+    target = boat.Boat()
+    decode = telemetry.decoder.decode
+    old = measure(legacy.parse_log_data, frames)
+    new = measure(lambda frame: decode(frame, target), frames)
+    print "Frames       : %d (%d signals each)" % (number, len(LOG_SIGNALS))
+    print "Legacy parser: %10.0f frames/sec" % old
+    print "FrameDecoder : %10.0f frames/sec" % new
+    print "Speed-up     : %10.2fx" % (new / old)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
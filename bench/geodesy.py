@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the batch geodesy functions on a synthetic GPS track.
+
+Run from the repository root: "./bench/geodesy.py [points]" (default: one
+million points). Compares the pairwise gps_distance_between loop with the
+pure python and the numpy implementations of geodesy.track_segments.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from commons import *
+import geodesy
+
+
+def synthetic_track(number):
+    '''
+    Return (latitudes, longitudes, millis) of a random walk at 10 Hz.
+    '''
+    random.seed(0)
+    lat, lon = 57.7, 11.9
+    latitudes, longitudes, millis = [], [], []
+    for i in xrange(number):
+        lat += random.uniform(-1e-5, 1e-5)
+        lon += random.uniform(-1e-5, 1e-5)
+        latitudes.append(lat)
+        longitudes.append(lon)
+        millis.append(i * 100)
+    return latitudes, longitudes, millis
+
+
+def pairwise(latitudes, longitudes, millis):
+    '''
+    The way distances and speeds were computed before geodesy existed.
+    '''
+    distances, speeds = [], []
+    for i in xrange(1, len(latitudes)):
+        m = gps_distance_between((latitudes[i-1], longitudes[i-1]),
+                                 (latitudes[i], longitudes[i]))
+        distances.append(m)
+        speeds.append(m / ((millis[i] - millis[i-1]) / 1000.0))
+    return distances, speeds
+
+
+def measure(func, number):
+    start = time()
+    func()
+    elapsed = time() - start
+    return elapsed, number / elapsed
+
+
+def main(number=1000000):
+    track = synthetic_track(number)
+    print "Points: %d" % number
+    results = [('pairwise loop', lambda: pairwise(*track)),
+               ('geodesy (python)',
+                lambda: geodesy.track_segments(*track, use_numpy=False))]
+    if geodesy.numpy != None:
+        results.append(('geodesy (numpy)',
+                        lambda: geodesy.track_segments(*track)))
+    else:
+        print "numpy not available: skipping the vectorised implementation"
+    for name, func in results:
+        print "%-18s: %7.3fs  %12.0f points/sec" % ((name,) +
+                                                    measure(func, number))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
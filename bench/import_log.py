@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the raw log import against the legacy ORM import.
+
+Run from the repository root: "./bench/import_log.py [lines]". Both imports
+are run on the same synthetic log, and the resulting rows are compared.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os
+import os.path
+import sys
+import shutil
+import sqlite3
+import datetime
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from commons import *
+from log import LogDataBase, LogTextFile, Signal, SIGNAL_COLUMNS
+
+
+def legacy_add_signals(db, signals):
+    '''
+    Replica of the original LogDataBase.add_signals (one ORM object per line).
+    '''
+    for signal in signals:
+        tmp = Signal()
+        signal = signal.replace('!', '')
+        bits = signal.split()
+        tmp.time = datetime.datetime.fromtimestamp(float(bits[0]))
+        for bit in bits[1:]:
+            k, v = bit.split(':')
+            v = int(v) if v.find('.') == -1 else float(v)
+            setattr(tmp, LOG_SIGNALS[k][0], v)
+        db.store.add(tmp)
+    db.store.commit()
+
+
+def write_synthetic_log(fname, number):
+    '''
+    Write a 10 Hz raw log of "number" lines, with some debug messages.
+    '''
+    out = open(fname, 'w')
+    start = 1288000000.0
+    for i in xrange(number):
+        stamp = start + i * 0.1
+        if i % 100 == 0:
+            out.write('%.3f Debug message number %d\n' % (stamp, i))
+        out.write('%.3f !B:600 I:100 H:%d P:1 R:%d S:%d T:%d W:%d '
+                  'Y:%.6f X:%.6f n:0 x:1 y:2 z:3\n' %
+                  (stamp, i % 360, i % 200 - 100, i % 100, i * 100, i % 360,
+                   57.7 + i * 1e-6, 11.9 + i * 1e-6))
+    out.close()
+
+
+def rows(fname):
+    '''
+    Return all the signals, without the columns the legacy import ignored.
+    '''
+    columns = [c for c in SIGNAL_COLUMNS if c != 'timestamp']
+    connection = sqlite3.connect(fname)
+    result = connection.execute('SELECT %s FROM signals ORDER BY id' %
+                                ', '.join(columns)).fetchall()
+    connection.close()
+    return result
+
+
+def measure(func, number):
+    start = time()
+    func()
+    return number / (time() - start)
+
+
+def main(number=100000):
+    tmp = tempfile.mkdtemp()
+    try:
+        raw = os.path.join(tmp, 'raw.log')
+        write_synthetic_log(raw, number)
+        legacy_db = LogDataBase(os.path.join(tmp, 'legacy.sqlite'))
+        bulk_db = LogDataBase(os.path.join(tmp, 'bulk.sqlite'))
+        lines = LogTextFile(raw).clean_from_debug_symbols()
+        old = measure(lambda: legacy_add_signals(legacy_db, lines), number)
+        new = measure(lambda: bulk_db.import_log(raw), number)
+        same = rows(legacy_db.db_file_name) == rows(bulk_db.db_file_name)
+        print "Lines        : %d" % number
+        print "Legacy import: %10.0f lines/sec" % old
+        print "Bulk import  : %10.0f lines/sec" % new
+        print "Speed-up     : %10.2fx" % (new / old)
+        print "Same rows    : %s" % same
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,471 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Headless benchmark of the whole telemetry pipeline.
+
+Run from the repository root: "./bench/pipeline.py [options]" (see --help).
+A synthetic recorded log is replayed through every stage a message goes
+through, without GTK, hardware or network (the wifi relay uses loopback):
+
+serial      replay.ReplayBoat at full speed, BareBoat.poll_message
+simulated   simulator.SimulatedBoat at full speed (binary frames, 1% of
+            them corrupted), BareBoat.poll_message
+parse       Boat.parse_log_data
+log         the raw log writing of GeneralControlPanel.do_log
+relay       delta encoding, WifiBridge over loopback, RemoteBoat decoding
+command     RemoteBoat.send_command, WifiBridge over loopback, woken by
+            readability (WifiBridge.wait), CommandReceiver and the ack
+fanout      fanout.TelemetryHub.publish to FANOUT_CLIENTS RemoteBoats over
+            loopback (one of them rate limited, one never reading), until
+            the others have decoded the frame
+import      LogDataBase.add_signals
+stints      LogDataBase.find_stints (full rescan)
+kml         LogDataBase.get_kml, one document per stint
+
+For each stage the throughput (frames/sec), the latency percentiles of its
+unit of work and the peak RSS (each stage runs in its own process) are
+reported. Results can be saved as JSON and compared against a baseline:
+the exit status is 1 if any stage regressed beyond the tolerance, 2 if
+there is no baseline to compare with (save one with --save-baseline, or
+skip the comparison with --no-compare).
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os
+import os.path
+import sys
+import json
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from commons import *
+import boat
+import commandlink
+import fanout
+import log
+import relay
+import rawlog
+import replay
+import simulator
+import wifibridge
+from log import LogDataBase, LogTextFile
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+LOG_BATCH = 10          # messages per do_log call
+IMPORT_BATCH = 1000     # signals per add_signals call
+FANOUT_CLIENTS = 4      # subscribers of the fanout stage
+MOVING_FRAMES = 450     # the synthetic boat sails 45 s...
+STILL_FRAMES = 150      # ...then stays still 15 s (stints are found)
+
+
+def write_track_log(fname, number):
+    '''
+    Write a 10 Hz raw log of "number" log messages, with debug messages.
+
+    The boat alternates between sailing (at about 1 m/s) and standing still,
+    so that the log holds a stint every MOVING_FRAMES + STILL_FRAMES frames.
+    '''
+    out = open(fname, 'w')
+    start = 1288000000.0
+    latitude, longitude = 57.7, 11.9
+    for i in xrange(number):
+        stamp = start + i * 0.1
+        if i % (MOVING_FRAMES + STILL_FRAMES) < MOVING_FRAMES:
+            latitude += 1e-6
+            longitude += 1e-6
+        if i % 100 == 0:
+            out.write('%.3f Debug message number %d\n' % (stamp, i))
+        out.write('%.3f !B:600 I:100 H:%d P:1 R:%d S:%d T:%d W:%d '
+                  'Y:%.6f X:%.6f n:0 x:1 y:2 z:3\n' %
+                  (stamp, i % 360, i % 200 - 100, i % 100, i * 100, i % 360,
+                   latitude, longitude))
+    out.close()
+
+
+def load_messages(fname):
+    '''
+    Return the log messages of a raw log (without their timestamps).
+    '''
+    return [msg for stamp, msg in LogTextFile(fname).iter_records()
+            if msg[:1] == '!']
+
+
+def percentiles(latencies):
+    '''
+    Return the p50, p95, p99 and max of "latencies" (seconds) in ms.
+    '''
+    latencies = sorted(latencies)
+    result = {}
+    for key, percentile in (('p50', 50), ('p95', 95), ('p99', 99),
+                            ('max', 100)):
+        result[key] = latencies[(len(latencies) - 1) * percentile // 100] * \
+                      1000 if latencies else None
+    return result
+
+
+# ----------------------------------------------------------------------------
+# Stages: each one takes the work directory and returns (frames, seconds,
+# latencies), the latencies being those of its unit of work in seconds.
+# ----------------------------------------------------------------------------
+
+def stage_serial(tmp):
+    the_boat = replay.ReplayBoat(os.path.join(tmp, 'raw.log'), speed=None)
+    ser = the_boat.ser
+    frames = 0
+    latencies = []
+    start = time()
+    while True:
+        t0 = time()
+        msg = the_boat.poll_message()
+        if msg != None:
+            latencies.append(time() - t0)
+            frames += 1
+        elif ser.finished and not the_boat.reader.ring.frames:
+            break
+    elapsed = time() - start
+    the_boat.close()
+    return frames, elapsed, latencies
+
+
+def stage_simulated(tmp):
+    number = len(load_messages(os.path.join(tmp, 'raw.log')))
+    the_boat = simulator.SimulatedBoat(binary=True, corruption=0.01,
+                                       paced=False, seed=1)
+    ser = the_boat.ser
+    frames = 0
+    latencies = []
+    start = time()
+    while ser.frames < number:
+        t0 = time()
+        if the_boat.poll_message() != None:
+            latencies.append(time() - t0)
+            frames += 1
+    the_boat.reader.stop()    # then drain what it left behind
+    while the_boat.reader.ring.frames:
+        t0 = time()
+        if the_boat.poll_message() != None:
+            latencies.append(time() - t0)
+            frames += 1
+    elapsed = time() - start
+    the_boat.close()
+    return frames, elapsed, latencies
+
+
+def stage_parse(tmp):
+    the_boat = boat.Boat()
+    messages = [msg[1:] for msg in load_messages(os.path.join(tmp, 'raw.log'))]
+    latencies = []
+    append = latencies.append
+    start = time()
+    for data in messages:
+        t0 = time()
+        the_boat.parse_log_data(data)
+        append(time() - t0)
+    return len(messages), time() - start, latencies
+
+
+def stage_log(tmp):
+    messages = load_messages(os.path.join(tmp, 'raw.log'))
+    logfile = rawlog.AsyncLogWriter(rawlog.RawLogWriter(
+                                    os.path.join(tmp, 'segments')))
+    last_log_time = 0
+    latencies = []
+    start = time()
+    for i in xrange(0, len(messages), LOG_BATCH):
+        t0 = time()
+        # Same as GeneralControlPanel.do_log, with a single writer
+        for msg in messages[i:i + LOG_BATCH]:
+            last_log_time = max(time(), last_log_time + 0.001)
+            logfile.write(last_log_time, msg)
+        latencies.append(time() - t0)
+    logfile.close()
+    elapsed = time() - start
+    return logfile.writer.records, elapsed, latencies
+
+
+def stage_relay(tmp):
+    messages = load_messages(os.path.join(tmp, 'raw.log'))
+    server = wifibridge.WifiBridge(port=0)
+    remote = boat.RemoteBoat(('127.0.0.1', server.socket.getsockname()[1]),
+                             port=0)
+    while server.read() == None:    # the client registers by subscribing
+        pass
+    source = boat.Boat()
+    encoder = relay.DeltaEncoder()
+    frames = 0
+    latencies = []
+    start = time()
+    for msg in messages:
+        t0 = time()
+        source.parse_log_data(msg[1:])
+        frame = encoder.encode(source)
+        if frame == None:
+            continue
+        server.write(frame)
+        deadline = t0 + 1
+        while not remote.poll_messages() and time() < deadline:
+            pass
+        latencies.append(time() - t0)
+        frames += 1
+        if server.read() == WIFI_RESYNC:
+            encoder.request_keyframe()
+    elapsed = time() - start
+    server.close()
+    remote.close()
+    return frames - remote.relay.lost, elapsed, latencies
+
+
+def stage_command(tmp, number=2000):
+    server = wifibridge.WifiBridge(port=0)
+    remote = boat.RemoteBoat(('127.0.0.1', server.socket.getsockname()[1]),
+                             port=0)
+    receiver = commandlink.CommandReceiver()
+    server.wait(1)
+    server.read()
+    frames = 0
+    latencies = []
+    start = time()
+    for i in xrange(number):
+        t0 = time()
+        remote.send_command(SET_HEADING, i % 360)
+        if server.wait(1):
+            ack, command = receiver.receive(server.read())
+            server.write(ack)
+            if command:
+                latencies.append(time() - t0)
+                frames += 1
+        remote.poll_messages()    # collect the ack
+    elapsed = time() - start
+    server.close()
+    remote.close()
+    return frames, elapsed, latencies
+
+
+def stage_fanout(tmp):
+    messages = load_messages(os.path.join(tmp, 'raw.log'))
+    hub = fanout.TelemetryHub(port=0)
+    address = ('127.0.0.1', hub.socket.getsockname()[1])
+    clients = [boat.RemoteBoat(address, port=0)
+               for i in xrange(FANOUT_CLIENTS)]
+    clients[-2].subscribe(0.1)
+    while len(hub.subscribers) < FANOUT_CLIENTS or hub.inbox:
+        hub.wait(1)
+        hub.inbox.clear()
+    readers = clients[:-2]    # the last one never reads
+    source = boat.Boat()
+    frames = 0
+    latencies = []
+    start = time()
+    for msg in messages:
+        t0 = time()
+        source.parse_log_data(msg[1:])
+        hub.publish(msg, source)
+        deadline = t0 + 1
+        for client in readers:
+            while not client.poll_messages() and time() < deadline:
+                pass
+        clients[-2].poll_messages()
+        latencies.append(time() - t0)
+        frames += 1
+        hub.drain()
+    elapsed = time() - start
+    hub.close()
+    for client in clients:
+        client.close()
+    return frames - readers[0].relay.lost, elapsed, latencies
+
+
+def stage_import(tmp):
+    db = LogDataBase(os.path.join(tmp, 'log.sqlite'), overwrite=True)
+    signals = list(LogTextFile(os.path.join(tmp, 'raw.log')).iter_signals())
+    latencies = []
+    start = time()
+    for i in xrange(0, len(signals), IMPORT_BATCH):
+        t0 = time()
+        db.add_signals(signals[i:i + IMPORT_BATCH])
+        latencies.append(time() - t0)
+    return len(signals), time() - start, latencies
+
+
+def stage_stints(tmp, runs=3):
+    db = LogDataBase(os.path.join(tmp, 'log.sqlite'))
+    frames = db.store.find(log.Signal).count() * runs
+    latencies = []
+    start = time()
+    for i in xrange(runs):
+        t0 = time()
+        stints = db.find_stints(from_id=0)
+        latencies.append(time() - t0)
+    elapsed = time() - start
+    json.dump(stints, open(os.path.join(tmp, 'stints.json'), 'w'))
+    return frames, elapsed, latencies
+
+
+def stage_kml(tmp):
+    db = LogDataBase(os.path.join(tmp, 'log.sqlite'))
+    stints = [tuple(stint) for stint in
+              json.load(open(os.path.join(tmp, 'stints.json')))]
+    latencies = []
+    start = time()
+    for stint in stints:
+        t0 = time()
+        db.get_kml(stint)
+        latencies.append(time() - t0)
+    elapsed = time() - start
+    return sum(stop - start + 1 for start, stop in stints), elapsed, latencies
+
+
+STAGES = (('serial', stage_serial), ('simulated', stage_simulated),
+          ('parse', stage_parse),
+          ('log', stage_log), ('relay', stage_relay),
+          ('command', stage_command), ('fanout', stage_fanout),
+          ('import', stage_import), ('stints', stage_stints),
+          ('kml', stage_kml))
+
+
+def _run_stage(stage, tmp, queue):
+    try:
+        frames, elapsed, latencies = stage(tmp)
+    except Exception as e:
+        queue.put({'error': '%s: %s' % (e.__class__.__name__, e)})
+        return
+    result = {'frames': frames, 'seconds': elapsed,
+              'fps': frames / elapsed if elapsed else None,
+              'peak_rss_kb': resource.getrusage(
+                             resource.RUSAGE_SELF).ru_maxrss}
+    result.update(percentiles(latencies))
+    queue.put(result)
+
+
+def run_stage(stage, tmp):
+    '''
+    Run a stage in a child process, return its results as a dictionary.
+    '''
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_stage,
+                                      args=(stage, tmp, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+# ----------------------------------------------------------------------------
+# Baseline comparison
+# ----------------------------------------------------------------------------
+
+def compare(results, baseline, tolerance):
+    '''
+    Return the list of regressions of "results" against "baseline".
+
+    A stage regresses if its throughput dropped, or its p95 latency or peak
+    RSS grew, by more than "tolerance" (a fraction).
+    '''
+    regressions = []
+    for name, result in sorted(results.iteritems()):
+        reference = baseline.get(name)
+        if not reference or 'error' in reference:
+            continue
+        if 'error' in result:
+            regressions.append('%s: %s' % (name, result['error']))
+            continue
+        if reference['fps'] and result['fps'] < \
+           reference['fps'] * (1 - tolerance):
+            regressions.append('%s: %.0f frames/sec (baseline %.0f)' %
+                               (name, result['fps'], reference['fps']))
+        if reference['p95'] and result['p95'] > \
+           reference['p95'] * (1 + tolerance):
+            regressions.append('%s: p95 %.3f ms (baseline %.3f ms)' %
+                               (name, result['p95'], reference['p95']))
+        if result['peak_rss_kb'] > reference['peak_rss_kb'] * (1 + tolerance):
+            regressions.append('%s: peak RSS %d KiB (baseline %d KiB)' %
+                               (name, result['peak_rss_kb'],
+                                reference['peak_rss_kb']))
+    return regressions
+
+
+def print_results(results, names):
+    print '%-9s %9s %11s %9s %9s %9s %9s %10s' % ('stage', 'frames',
+          'frames/sec', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'RSS KiB')
+    for name in names:
+        result = results[name]
+        if 'error' in result:
+            print '%-9s %s' % (name, result['error'])
+            continue
+        print '%-9s %9d %11.0f %9.3f %9.3f %9.3f %9.3f %10d' % (name,
+              result['frames'], result['fps'], result['p50'], result['p95'],
+              result['p99'], result['max'], result['peak_rss_kb'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the telemetry '
+                                     'pipeline on a synthetic log.')
+    parser.add_argument('-n', '--frames', type=int, default=20000,
+                        help='number of log messages in the synthetic log')
+    parser.add_argument('-s', '--stages', nargs='+', metavar='STAGE',
+                        choices=[name for name, stage in STAGES],
+                        help='stages to run (default: all; "stints" and '
+                        '"kml" need "import", "kml" needs "stints")')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='save the results as JSON')
+    parser.add_argument('-b', '--baseline', metavar='FILE',
+                        default=DEFAULT_BASELINE,
+                        help='baseline to compare with (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='save the results as the new baseline')
+    parser.add_argument('--no-compare', action='store_true',
+                        help='only report the results')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2,
+                        help='accepted regression, as a fraction '
+                        '(default: %(default)s)')
+    args = parser.parse_args()
+    compare_baseline = not args.save_baseline and not args.no_compare
+    if compare_baseline and not os.path.exists(args.baseline):
+        parser.exit(2, 'No baseline at %s: save one with --save-baseline, '
+                    'or run with --no-compare\n' % args.baseline)
+    names = [name for name, stage in STAGES
+             if not args.stages or name in args.stages]
+    tmp = tempfile.mkdtemp()
+    try:
+        write_track_log(os.path.join(tmp, 'raw.log'), args.frames)
+        results = {}
+        for name, stage in STAGES:
+            if name in names:
+                results[name] = run_stage(stage, tmp)
+    finally:
+        shutil.rmtree(tmp)
+    print_results(results, names)
+    report = {'frames': args.frames, 'python': platform.python_version(),
+              'machine': platform.platform(), 'stages': results}
+    if args.output:
+        json.dump(report, open(args.output, 'w'), indent=2, sort_keys=True)
+    if args.save_baseline:
+        json.dump(report, open(args.baseline, 'w'), indent=2, sort_keys=True)
+        print 'Baseline saved to', args.baseline
+    elif compare_baseline:
+        baseline = json.load(open(args.baseline))
+        if baseline['frames'] != args.frames:
+            print 'Cannot compare: the baseline was run on %d frames' % \
+                  baseline['frames']
+            return 2
+        regressions = compare(results, baseline['stages'], args.tolerance)
+        for regression in regressions:
+            print 'REGRESSION', regression
+        if regressions:
+            return 1
+        print 'No regression against', args.baseline
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
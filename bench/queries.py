@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the time- and ID-range queries on the signals table.
+
+Run from the repository root: "./bench/queries.py [lines] [repeat]". Each
+window query is timed without the range indexes, then with them. Finally,
+loading a range of signals as ORM objects is compared with signals_between.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os
+import os.path
+import sys
+import shutil
+import sqlite3
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from commons import *
+from log import LogDataBase, Signal
+from import_log import write_synthetic_log
+
+INDEXES = (('signals_timestamp', 'signals (timestamp)'),
+           ('signals_ardu_millis', 'signals (ardu_millis)'))
+START = 1288000000.0
+
+
+def window_queries(number):
+    '''
+    Return (name, query, parameters) for windows of 1% of the signals.
+    '''
+    span = number // 100
+    queries = []
+    for i in xrange(10):
+        first = i * number // 10
+        queries.append(('timestamp', 'SELECT * FROM signals WHERE timestamp '
+                        'BETWEEN ? AND ?', (START + first * 0.1,
+                        START + (first + span) * 0.1)))
+        queries.append(('ardu_millis', 'SELECT * FROM signals WHERE '
+                        'ardu_millis BETWEEN ? AND ?',
+                        (first * 100, (first + span) * 100)))
+    return queries
+
+
+def measure(func, repeat):
+    start = time()
+    for i in xrange(repeat):
+        func()
+    return (time() - start) / repeat * 1000
+
+
+def time_windows(fname, number, repeat):
+    '''
+    Return {column: milliseconds per window query}.
+    '''
+    connection = sqlite3.connect(fname)
+    result = {}
+    for name, query, parameters in window_queries(number):
+        result[name] = result.get(name, 0) + measure(
+            lambda: connection.execute(query, parameters).fetchall(), repeat)
+    connection.close()
+    return dict((k, v / 10) for k, v in result.iteritems())
+
+
+def main(number=100000, repeat=5):
+    tmp = tempfile.mkdtemp()
+    try:
+        raw = os.path.join(tmp, 'raw.log')
+        write_synthetic_log(raw, number)
+        db = LogDataBase(os.path.join(tmp, 'queries.sqlite'))
+        db.import_log(raw)
+        connection = sqlite3.connect(db.db_file_name)
+        for name, target in INDEXES:
+            connection.execute('DROP INDEX %s' % name)
+        connection.close()
+        before = time_windows(db.db_file_name, number, repeat)
+        connection = sqlite3.connect(db.db_file_name)
+        for name, target in INDEXES:
+            connection.execute('CREATE INDEX %s ON %s' % (name, target))
+        connection.close()
+        after = time_windows(db.db_file_name, number, repeat)
+        span = number // 100
+        low, high = number // 2, number // 2 + span
+        orm = measure(lambda: list(db.store.find(Signal,
+                      Signal.id >= low, Signal.id < high)), repeat)
+        tuples = measure(lambda: db.signals_between(START + low * 0.1,
+                         START + (high - 1) * 0.1), repeat)
+        print "Signals           : %d (windows of %d)" % (number, span)
+        for name in ('timestamp', 'ardu_millis'):
+            print "%-12s window: %8.2f ms -> %8.2f ms (%.1fx)" % \
+                  (name, before[name], after[name], before[name] / after[name])
+        print "ORM objects       : %8.2f ms" % orm
+        print "signals_between   : %8.2f ms (%.1fx)" % (tuples, orm / tuples)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the raw log recorders.
+
+Run from the repository root: "./bench/recorder.py [messages]". Compares the
+legacy line-buffered text log (one write syscall per message) with the
+buffered text and binary writers of the rawlog module. On Linux, the write
+syscalls are counted too (from /proc/self/io).
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os
+import os.path
+import sys
+import shutil
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from commons import *
+import rawlog
+
+MESSAGE = '!B:600 I:100 H:%d P:1 R:12 S:34 T:%d W:56 Y:57.700000 X:11.900000'
+
+
+class LegacyWriter(object):
+
+    '''
+    Replica of the original raw log (a line-buffered text file).
+    '''
+
+    def __init__(self, fname):
+        self.file = open(fname, 'a', 1)
+
+    def write(self, stamp, msg):
+        self.file.write('%.3f %s\n' % (stamp, msg))
+
+    def sync(self):
+        pass
+
+    def close(self):
+        self.file.close()
+
+
+def write_syscalls():
+    '''
+    Return the number of write syscalls done by the process (or None).
+    '''
+    try:
+        for line in open('/proc/self/io'):
+            if line.startswith('syscw:'):
+                return int(line.split()[1])
+    except IOError:
+        return None
+
+
+def record(writer, number, batch=10):
+    '''
+    Record "number" messages in batches, as GeneralControlPanel.do_log does.
+
+    Return (messages/sec, write syscalls).
+    '''
+    syscalls = write_syscalls()
+    start = time()
+    for i in xrange(number):
+        writer.write(1288000000 + i * 0.01, MESSAGE % (i % 360, i * 10))
+        if i % batch == batch - 1:
+            writer.sync()
+    writer.close()
+    elapsed = time() - start
+    if syscalls != None:
+        syscalls = write_syscalls() - syscalls
+    return number / elapsed, syscalls
+
+
+def main(number=200000):
+    tmp = tempfile.mkdtemp()
+    try:
+        writers = (
+            ('Line-buffered text', LegacyWriter(os.path.join(tmp, 'a.log'))),
+            ('Buffered text',
+             rawlog.TextLogWriter(os.path.join(tmp, 'b.log'))),
+            ('Binary segments', rawlog.RawLogWriter(os.path.join(tmp, 'c'))),
+        )
+        print "Messages           : %d" % number
+        for name, writer in writers:
+            print "%-19s: %10.0f messages/sec, %s write syscalls" % \
+                  ((name,) + record(writer, number))
+        sizes = [os.path.getsize(os.path.join(tmp, f)) for f in
+                 ('a.log', 'b.log')] + [sum(os.path.getsize(s) for s in
+                 rawlog.list_segments(os.path.join(tmp, 'c')))]
+        print "Sizes (bytes)      : %d / %d / %d" % tuple(sizes)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
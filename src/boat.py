@@ -13,6 +13,11 @@ from commons import *
 from math import degrees, atan2
 from time import sleep, time
 import wifibridge
+import telemetry
+import serialreader
+import relay
+import commandlink
+from collections import deque
 
 class MockSerial(object):
 
@@ -23,8 +28,14 @@ class MockSerial(object):
     are not connected to the Arduino board.
     '''
 
-    def __init__(self):
+    def __init__(self, binary=False):
+        '''
+        If "binary" is True, read() returns binary frames (see
+        telemetry.BinaryCodec) instead of text messages.
+        '''
         print "Arduino device not found - starting MOCK SERIAL COMMUNICATION!"
+        self.binary = binary
+        self.seq = 0
         self.values = {
             "B" : 600,
             "I" : 0,
@@ -49,6 +60,7 @@ class MockSerial(object):
             'y' : 3,
         }
         self.last_inwaiting = 0
+        self.timeout = None
 
     def _step(self, key, lo, hi, fish):
         '''Rotate or swing arduino values progressively.
@@ -113,6 +125,28 @@ class MockSerial(object):
             return False
         return True if (time() - self.last_inwaiting) > self.values['I'] else False
 
+    def read(self, size=1):
+        '''
+        Return the next log message, waiting for it up to "timeout" seconds.
+
+        Like serial.Serial, an empty string is returned on timeout. "size" is
+        ignored: messages are always returned whole.
+        '''
+        timeout = self.timeout if self.timeout is not None else 0.01
+        if self.values['I'] != 0:
+            due = self.last_inwaiting + self.values['I'] - time()
+            timeout = max(0, min(timeout, due))
+        sleep(timeout)
+        if not self.inWaiting():
+            return ''
+        msg = self.readline()
+        if self.binary:
+            self.seq += 1
+            return telemetry.codec.encode(
+                    dict((k, int(v)) for k, v in self.values.items()),
+                    self.seq)
+        return msg
+
 
 class Boat(object):
 
@@ -122,10 +156,11 @@ class Boat(object):
 
     def __init__(self):
         for a in LOG_SIGNALS.itervalues():
-            setattr(self, a[0], 0)
+            setattr(self, a[0], telemetry.DEFAULTS[a[2]])
         self.coordinates = None
         self.last_log_message_time = 0
         self.last_msg = ''
+        self.malformed_frames = 0
 
     def _format_command(self, *args):
         '''
@@ -136,16 +171,62 @@ class Boat(object):
     def send_command(self, *args):
         pass
 
+    def close(self):
+        '''
+        Release the resources held by the boat (threads, devices...).
+        '''
+        pass
+
     def parse_log_data(self, data):
         '''
         Update internal data on the boat
+
+        "data" is a log message without its leading exclamation mark. Values
+        are converted according to the type declared in LOG_SIGNALS.
         '''
-        for value in data.split():
-            key, value = value.split(":")
-#            print data # @DEBUG
-            setattr(self, LOG_SIGNALS[key][0], int(float(value)))
+        telemetry.decoder.decode(data, self)
         self.last_log_message_time = time()
 
+    def _process_messages(self, messages, auto_parse=True):
+        '''
+        Update the boat from a batch of messages, oldest first.
+
+        Only the newest log message is parsed, as it supersedes all the
+        others. Return the batch itself.
+        '''
+        if not messages:
+            return messages
+        if auto_parse == True:
+            for msg in reversed(messages):
+                if msg[0] == '!' and self._safe_parse(msg):
+                    break
+        self.last_msg = messages[-1]
+        return messages
+
+    def _safe_parse(self, msg):
+        '''
+        Parse a log message, return False (and count it) if it is malformed.
+        '''
+        try:
+            self.parse_log_data(msg[1:])
+        except telemetry.MalformedFrameError:
+            self.malformed_frames += 1
+            return False
+        return True
+
+    def _to_text(self, msg):
+        '''
+        Return a received message in text form, or None if it is corrupted.
+
+        Binary frames are converted to the equivalent text log message, so
+        that the rest of the program only ever deals with text.
+        '''
+        try:
+            return telemetry.to_text(msg)
+        except telemetry.MalformedFrameError:
+            self.malformed_frames += 1
+            return None
+
     def get_magnetic_vector(self):
         '''
         Helper funtion to get the 3d magnetometer reading as a tuple.
@@ -175,13 +256,67 @@ class BareBoat(Boat):
     client. Provides access to all the Arduino-controlled devices and data.
     '''
 
-    def __init__(self, port='/dev/ttyUSB0', rate=115200):
+    def __init__(self, port='/dev/ttyUSB0', rate=115200, threaded=True):
+        '''
+        "port" is either the name of the serial device or an object with the
+        same interface (e.g. a MockSerial, or a replay.ReplaySerial).
+
+        If "threaded" is True, the serial line is drained by a background
+        serialreader.SerialReader and poll_message pops from its buffer,
+        otherwise poll_message reads the serial line directly.
+        '''
         super(BareBoat, self).__init__()
-        try:
-            self.ser = serial.Serial(port, rate)
-            sleep(2)   # Arduino reset (use 120m resistor to prevent this)
-        except serial.SerialException:
-            self.ser = MockSerial()
+        if not isinstance(port, basestring):
+            self.ser = port
+        else:
+            try:
+                self.ser = serial.Serial(port, rate)
+                sleep(2)   # Arduino reset (use 120m resistor to prevent this)
+            except serial.SerialException:
+                self.ser = MockSerial()
+        self.reader = None
+        if threaded:
+            self.reader = serialreader.SerialReader(self.ser)
+            self.reader.start()
+
+    @property
+    def dropped_frames(self):
+        '''
+        Number of telemetry frames skipped by coalescing.
+        '''
+        return self.reader.ring.dropped if self.reader else 0
+
+    @property
+    def overflowed_frames(self):
+        '''
+        Number of frames lost because the reader buffer was full.
+        '''
+        return self.reader.ring.overflowed if self.reader else 0
+
+    def close(self):
+        '''
+        Stop the background reader (if any) and close the serial port.
+        '''
+        if self.reader:
+            self.reader.stop()
+            self.reader = None
+        if hasattr(self.ser, 'close'):
+            self.ser.close()
+
+    def _read_message(self, coalesce=False):
+        '''
+        Return the next message from the serial line, or None.
+
+        Binary frames are only understood when using the background reader.
+        '''
+        if self.reader:
+            msg = self.reader.ring.pop(coalesce)
+            if msg == None:
+                return None
+            return self._to_text(msg) or ''
+        if not self.ser.inWaiting():
+            return None
+        return self.ser.readline().strip()
 
     def send_command(self, *args):
         '''
@@ -194,7 +329,7 @@ class BareBoat(Boat):
         '''
         self.ser.write(self._format_command(*args))
 
-    def poll_message(self, auto_parse=True):
+    def poll_message(self, auto_parse=True, coalesce=False):
         '''
         Retrieve and process a message from the ship (if available).
 
@@ -202,20 +337,37 @@ class BareBoat(Boat):
         Messages can either be human readable (for debugging or informative
         purposes) or raw data for the logging system. The latter are prefixed
         with an exclamation mark ("!").
+
+        If "coalesce" is True and several log messages are waiting in a row,
+        only the newest one is returned (see "dropped_frames").
         '''
-        # Early exit if no message is waiting
-        if not self.ser.inWaiting():
-            return None
-        # Early exit if the message is empty
-        msg = self.ser.readline().strip()
+        # Early exit if no message is waiting or if the message is empty
+        msg = self._read_message(coalesce)
         if msg in (None, ""):
             return None
         # If the message is there
         if msg[0] == '!' and auto_parse == True:
-            self.parse_log_data(msg[1:])
+            self._safe_parse(msg)
         self.last_msg = msg
         return msg
 
+    def poll_messages(self, max_frames=None, auto_parse=True):
+        '''
+        Retrieve all the messages waiting from the ship, oldest first.
+
+        At most "max_frames" messages are retrieved (all of them if None).
+        The boat is updated from the newest log message only. Return a
+        (possibly empty) list of messages.
+        '''
+        messages = []
+        while max_frames is None or len(messages) < max_frames:
+            msg = self._read_message()
+            if msg is None:
+                break
+            if msg != "":
+                messages.append(msg)
+        return self._process_messages(messages, auto_parse)
+
 
 class FreeBoat(BareBoat):
 
@@ -227,11 +379,12 @@ class FreeBoat(BareBoat):
     is controlled by both the Arduino and the FreeRunner.
     '''
 
-    def __init__(self, port='/dev/ttyUSB0', rate=115200, freerunner=None):
-        super(FreeBoat, self).__init__(port, rate)
+    def __init__(self, port='/dev/ttyUSB0', rate=115200, freerunner=None,
+                 threaded=True):
+        super(FreeBoat, self).__init__(port, rate, threaded)
         self.fr = freerunner
 
-    def poll_message(self, subsystems, auto_parse=True):
+    def poll_message(self, subsystems, auto_parse=True, coalesce=False):
         '''
         Add to the log messages the data provided by the FreeRunner.
 
@@ -240,28 +393,68 @@ class FreeBoat(BareBoat):
         are active on the FreeRunner (and should be therefore appended to
         the log message).
         '''
-        # The auto_parse is left on because the accelerometer subsystem
-        # needs the data from the magnetometer on the Arduino.
-        msg = super(FreeBoat, self).poll_message(auto_parse=True)
+        # The message is parsed even without auto_parse if the accelerometer
+        # subsystem is active, as it needs the data from the magnetometer on
+        # the Arduino. Only the FreeRunner data is parsed afterwards.
+        msg = super(FreeBoat, self).poll_message(auto_parse=auto_parse == True
+                                or 'accelerometer' in subsystems,
+                                coalesce=coalesce)
         if msg != None and msg[0] == '!' :
-            if 'accelerometer' in subsystems:
-                self.north = self._compute_north_with_acc_data()
-                msg += " N:" + str(self.north)
-                msg += " a:" + str(self.accelerometer_x)
-                msg += " b:" + str(self.accelerometer_y)
-                msg += " c:" + str(self.accelerometer_z)
-            if 'GPS' in subsystems:
-                lat, lon = self.fr.get_gps()
-                msg += " Y:" + str(lat)
-                msg += " X:" + str(lon)
-            if 'battery_info' in subsystems:
-                msg += " A:" + str(self.fr.bat_absorption)
-                msg += " B:" + str(self.fr.bat_timeleft)
-            if auto_parse == True:
-                self.parse_log_data(msg[1:])
+            extra = self._freerunner_data(subsystems)
+            msg += extra
+            if auto_parse == True and extra:
+                self.parse_log_data(extra)
             self.last_msg = msg
         return msg
 
+    def poll_messages(self, subsystems, max_frames=None, auto_parse=True):
+        '''
+        Batch version of poll_message.
+
+        The FreeRunner subsystems are sampled only once per batch, after the
+        newest log message has been parsed, and their data is appended to
+        every log message of the batch. Each message is parsed at most once:
+        only the FreeRunner data is parsed after sampling.
+        '''
+        messages = super(FreeBoat, self).poll_messages(max_frames,
+                                                       auto_parse=False)
+        # The accelerometer subsystem needs the magnetometer data of the
+        # Arduino, hence the parsing even without auto_parse
+        if auto_parse == True or 'accelerometer' in subsystems:
+            for msg in reversed(messages):
+                if msg[0] == '!' and self._safe_parse(msg):
+                    break
+        if not any(msg[0] == '!' for msg in messages):
+            return messages
+        extra = self._freerunner_data(subsystems)
+        messages = [msg + extra if msg[0] == '!' else msg for msg in messages]
+        if auto_parse == True and extra:
+            self.parse_log_data(extra)
+        self.last_msg = messages[-1]
+        return messages
+
+    def _freerunner_data(self, subsystems):
+        '''
+        Return the log message fragment with the data of the FreeRunner.
+
+        "subsystems" is the set of active subsystems (see poll_message).
+        '''
+        msg = ''
+        if 'accelerometer' in subsystems:
+            self.north = self._compute_north_with_acc_data()
+            msg += " N:" + str(self.north)
+            msg += " a:" + str(self.accelerometer_x)
+            msg += " b:" + str(self.accelerometer_y)
+            msg += " c:" + str(self.accelerometer_z)
+        if 'GPS' in subsystems:
+            lat, lon = self.fr.get_gps()
+            msg += " Y:" + str(lat)
+            msg += " X:" + str(lon)
+        if 'battery_info' in subsystems:
+            msg += " A:" + str(self.fr.bat_absorption)
+            msg += " B:" + str(self.fr.bat_timeleft)
+        return msg
+
     def _compute_north_with_acc_data(self):
         '''
         Compensate 3D magnetomer reading for tilt, via accelerometer.
@@ -293,22 +486,129 @@ class RemoteBoat(Boat):
 
     '''
     Wireless wrapper for any remote boat that is connected via wireless.
+
+    Binary frames relayed by the FreeRunner are delta-encoded: "relay"
+    rebuilds the full state from them (see relay.DeltaDecoder). Commands
+    are retransmitted until acknowledged (see commandlink.CommandSender):
+    "commands" holds the metrics of the link.
     '''
 
-    def __init__(self, address):
+    def __init__(self, address, port=0):
+        '''
+        "address" is the (host, port) of the FreeRunner, "port" the local
+        UDP port (see wifibridge.WifiBridge): any free one by default, so
+        that several clients may run on the same computer.
+        '''
         super(RemoteBoat, self).__init__()
-        self.wifi = wifibridge.WifiBridge(address)
-        self.send_command(SET_LOG_INTERVAL, 0)
+        self.wifi = wifibridge.WifiBridge(address, port)
+        self.relay = relay.DeltaDecoder()
+        self.commands = commandlink.CommandSender()
+        self.received = deque()
+        self.wifi.status = self._link_status
+        self.subscribe(0)
+
+    def close(self):
+        '''
+        Unsubscribe from the FreeRunner (see fanout.TelemetryHub).
+        '''
+        self.wifi.write(WIFI_UNSUBSCRIBE)
+        self.wifi.close()
+
+    def subscribe(self, interval):
+        '''
+        Ask for at most one telemetry frame every "interval" seconds.
+        '''
+        self.wifi.write('%s:%s' % (WIFI_SUBSCRIBE, interval))
+
+    def take_control(self):
+        '''
+        Ask for the control of the boat: until granted, commands are refused
+        (see fanout.TelemetryHub).
+        '''
+        self.wifi.write(WIFI_TAKE_CONTROL)
+
+    def release(self):
+        '''
+        Give up the control of the boat, so that another client can take it.
+        '''
+        self.wifi.write(WIFI_RELEASE)
+
+    def watch(self):
+        '''
+        Handle the datagrams as they arrive, from the GTK main loop.
+
+        Acknowledgements are then processed right away, which keeps the RTT
+        measurements accurate; other messages wait for poll_messages.
+        '''
+        self.wifi.watch(self._on_datagram)
+
+    def _link_status(self):
+        # Sent back with the pongs, see linkquality.LinkEstimator
+        return '%d:%d' % (self.relay.decoded, self.relay.lost)
+
+    def _on_datagram(self, msg):
+        if commandlink.is_ack(msg):
+            self.commands.on_ack(msg)
+        elif commandlink.is_nack(msg):
+            self.commands.on_nack(msg)
+        else:
+            self.received.append(msg)
+
+    def _next_datagram(self):
+        if not self.received:
+            self.wifi.drain()
+            while self.wifi.inbox:
+                self._on_datagram(self.wifi.inbox.popleft())
+        return self.received.popleft() if self.received else None
+
+    def _retransmit(self):
+        for datagram in self.commands.retransmissions():
+            self.wifi.write(datagram)
+
+    def _receive(self):
+        '''
+        Return the next message from the wifi bridge in text form.
+
+        Return None if no message is waiting, '' if the message has been
+        discarded (corrupted or stale frames).
+        '''
+        msg = self._next_datagram()
+        if msg == None or msg[0] != telemetry.BINARY_MAGIC:
+            return msg
+        try:
+            msg = self.relay.decode(msg)
+        except telemetry.MalformedFrameError:
+            self.malformed_frames += 1
+            msg = None
+        if self.relay.resync_due():
+            self.wifi.write(WIFI_RESYNC)
+        return msg or ''
 
     def poll_message(self, auto_parse=True):
-        msg = self.wifi.read()
-        if msg == None:
+        msg = self._receive()
+        if not msg:
             return
         if msg[0] == '!' and auto_parse == True:
-            self.parse_log_data(msg[1:])
+            self._safe_parse(msg)
         self.last_msg = msg
         return msg
 
+    def poll_messages(self, max_frames=None, auto_parse=True):
+        '''
+        Retrieve all the messages waiting on the wifi bridge, oldest first.
+
+        See BareBoat.poll_messages. Overdue commands are retransmitted.
+        '''
+        self._retransmit()
+        messages = []
+        while max_frames is None or len(messages) < max_frames:
+            msg = self._receive()
+            if msg == None:
+                break
+            if msg != '':
+                messages.append(msg)
+        return self._process_messages(messages, auto_parse)
+
     def send_command(self, *args):
-        self.wifi.write(self._format_command(*args))
+        self.wifi.write(self.commands.send(self._format_command(*args)))
 
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+'''
+Acknowledged delivery of the commands sent to the FreeRunner over wifi.
+
+Telemetry is fire-and-forget, but a lost command (e.g. SET_PILOT_MODE)
+must not go unnoticed. Each command travels in a datagram
+"cmd:<session>:<seq>:<command>" which the FreeRunner acknowledges with
+"ack:<session>:<seq>". Unacknowledged commands are retransmitted after a
+timeout derived from the measured round trip time (as TCP does, RFC 6298);
+the FreeRunner executes each command once, whatever the number of copies
+it receives. The session number changes every time a client starts, so
+that its sequence numbers are never mistaken for those of a previous one.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import random
+from collections import deque
+from commons import *
+from time import time
+
+CLOCK_GRANULARITY = 0.01   # in seconds (retransmissions run on a 10 ms timer)
+
+
+def is_command(msg):
+    return msg.startswith(WIFI_COMMAND + ':')
+
+
+def is_ack(msg):
+    return msg.startswith(WIFI_ACK + ':')
+
+
+def is_nack(msg):
+    return msg.startswith(WIFI_NACK + ':')
+
+
+def nack(msg):
+    '''
+    Return the refusal of a command datagram, or of its acknowledgement
+    (see fanout.TelemetryHub and groundstation).
+    '''
+    return ':'.join([WIFI_NACK] + msg.split(':', 3)[1:3])
+
+
+def _newer(seq, other):
+    # Sequence numbers are 16 bits and wrap around
+    return 0 < (seq - other) & 0xFFFF < 0x8000
+
+
+class CommandSender(object):
+
+    '''
+    Client side: number the commands and retransmit them until acknowledged.
+
+    After WIFI_COMMAND_RETRIES retransmissions a command is given up (and
+    counted as "failed"). Commands the FreeRunner refuses (another client
+    is in control) are not retransmitted. Counters: commands "sent",
+    "acked", "failed", "refused", "retransmitted" datagrams.
+
+    If set, "on_result" is called with the sequence number of each command
+    and True once acknowledged, or False once refused or given up.
+    '''
+
+    def __init__(self, retries=WIFI_COMMAND_RETRIES):
+        self.retries = retries
+        self.session = random.getrandbits(16)
+        self.seq = 0
+        self.pending = {}     # seq: [datagram, first sent, due, transmissions]
+        self.srtt = None
+        self.rttvar = None
+        self.rto = WIFI_RTO_INITIAL
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.refused = 0
+        self.retransmitted = 0
+        self.lost = 0         # datagrams (or their acks) lost, as far as known
+        self.on_result = None
+
+    def send(self, command):
+        '''
+        Return the datagram carrying "command" (to be sent right away).
+        '''
+        self.seq = (self.seq + 1) & 0xFFFF
+        datagram = '%s:%d:%d:%s' % (WIFI_COMMAND, self.session, self.seq,
+                                    command)
+        now = time()
+        self.pending[self.seq] = [datagram, now, now + self.rto, 1]
+        self.sent += 1
+        return datagram
+
+    def _sample(self, rtt):
+        if self.srtt == None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(WIFI_RTO_MAX, max(WIFI_RTO_MIN, self.srtt +
+                       max(CLOCK_GRANULARITY, 4 * self.rttvar)))
+
+    def _pop(self, msg):
+        # Return the sequence number and pending entry a (n)ack is about,
+        # the entry being None if there is none
+        try:
+            prefix, session, seq = msg.split(':')
+            session, seq = int(session), int(seq)
+        except ValueError:
+            return None, None
+        if session != self.session:
+            return None, None
+        return seq, self.pending.pop(seq, None)
+
+    def _result(self, seq, delivered):
+        if self.on_result:
+            self.on_result(seq, delivered)
+
+    def on_nack(self, msg):
+        '''
+        Process a refusal received from the FreeRunner.
+        '''
+        seq, entry = self._pop(msg)
+        if entry != None:
+            self.refused += 1
+            self._result(seq, False)
+
+    def on_ack(self, msg):
+        '''
+        Process an acknowledgement received from the FreeRunner.
+        '''
+        seq, entry = self._pop(msg)
+        if entry == None:
+            return    # acknowledgement of a retransmitted copy
+        datagram, first_sent, due, transmissions = entry
+        if transmissions == 1:    # Karn: ambiguous samples are not used
+            self._sample(time() - first_sent)
+        self.acked += 1
+        self.lost += transmissions - 1
+        self._result(seq, True)
+
+    def retransmissions(self):
+        '''
+        Return the datagrams whose acknowledgement is overdue.
+
+        Each retransmission of a command doubles its timeout, as the link
+        is likely congested or down.
+        '''
+        now = time()
+        result = []
+        for seq, entry in sorted(self.pending.items()):
+            if entry[2] > now:
+                continue
+            if entry[3] > self.retries:
+                del self.pending[seq]
+                self.failed += 1
+                self.lost += entry[3]
+                self._result(seq, False)
+                continue
+            entry[2] = now + min(WIFI_RTO_MAX, self.rto * 2 ** entry[3])
+            entry[3] += 1
+            self.retransmitted += 1
+            result.append(entry[0])
+        return result
+
+    def stats(self):
+        '''
+        Return a dictionary with the metrics of the command channel.
+
+        Keys:
+        rtt, rttvar, rto    smoothed RTT, its variation and the current
+                            retransmission timeout in seconds (RTT and its
+                            variation are None until measured)
+        sent, acked, failed, refused
+                            commands
+        pending             commands waiting for an acknowledgement
+        retransmitted       datagrams retransmitted
+        loss                fraction of the datagrams lost (either way),
+                            over the commands acknowledged or failed
+        '''
+        delivered = self.lost + self.acked
+        return dict(rtt=self.srtt, rttvar=self.rttvar, rto=self.rto,
+                    sent=self.sent, acked=self.acked, failed=self.failed,
+                    refused=self.refused, pending=len(self.pending),
+                    retransmitted=self.retransmitted,
+                    loss=float(self.lost) / delivered if delivered else 0.0)
+
+
+class CommandReceiver(object):
+
+    '''
+    FreeRunner side: acknowledge every command, execute each one only once.
+
+    The last WIFI_DEDUP_WINDOW sequence numbers are remembered to discard
+    "duplicates". A command older than the last one executed with the same
+    name (e.g. a retransmitted rudder position overtaken by a newer one) is
+    "stale": it is acknowledged but not executed.
+    '''
+
+    def __init__(self, window=WIFI_DEDUP_WINDOW):
+        self.window = window
+        self.session = None
+        self.received = 0
+        self.duplicates = 0
+        self.stale = 0
+        self.malformed = 0
+
+    def _reset(self, session):
+        self.session = session
+        self.seen = set()
+        self.seen_order = deque()
+        self.last_by_name = {}
+
+    def receive(self, msg):
+        '''
+        Return (acknowledgement, command) for a command datagram.
+
+        "command" is None if it must not be executed, both are None if the
+        datagram is malformed.
+        '''
+        try:
+            prefix, session, seq, command = msg.split(':', 3)
+            session, seq = int(session), int(seq)
+        except ValueError:
+            self.malformed += 1
+            return None, None
+        if session != self.session:
+            self._reset(session)
+        ack = '%s:%d:%d' % (WIFI_ACK, session, seq)
+        if seq in self.seen:
+            self.duplicates += 1
+            return ack, None
+        self.seen.add(seq)
+        self.seen_order.append(seq)
+        if len(self.seen_order) > self.window:
+            self.seen.discard(self.seen_order.popleft())
+        name = command.split()[0] if command.split() else ''
+        last = self.last_by_name.get(name)
+        if last != None and _newer(last, seq):
+            self.stale += 1
+            return ack, None
+        self.last_by_name[name] = seq
+        self.received += 1
+        return ack, command
@@ -43,18 +43,110 @@ LS_TEXT = ("Slide to unlock", "Slide to lock")
 
 # Others
 ON                        = 1
+RUN_LOG_INTERVAL          = 3      # log interval set on the Arduino in run mode
 WIFI_MAYBE_LOST           = 5      # in seconds
 WIFI_CONSIDER_LOST        = 10     # in seconds
 WIFI_PORT                 = 5000
+WIFI_DATAGRAM_SIZE        = 4096   # in bytes (longer datagrams are truncated)
+WIFI_BINARY_RELAY         = True   # relay log messages as binary frames
+WIFI_KEYFRAME_INTERVAL    = 2      # in seconds (0 = no delta frames)
+WIFI_RESYNC_INTERVAL      = 0.5    # in seconds
+WIFI_RESYNC               = "resync"
+WIFI_COMMAND              = "cmd"    # prefix of the acknowledged commands
+WIFI_ACK                  = "ack"    # prefix of their acknowledgements
+WIFI_NACK                 = "nack"   # prefix of their refusals (see lease)
+WIFI_SUBSCRIBE            = "sub"    # followed by the interval requested
+WIFI_UNSUBSCRIBE          = "unsub"
+WIFI_TAKE_CONTROL         = "take"   # ask for the control lease
+WIFI_RELEASE              = "release"  # give up the control lease
+WIFI_RTO_INITIAL          = 0.2    # in seconds (before any RTT is measured)
+WIFI_RTO_MIN              = 0.02   # in seconds
+WIFI_RTO_MAX              = 2      # in seconds
+WIFI_COMMAND_RETRIES      = 6      # retransmissions before giving up
+WIFI_DEDUP_WINDOW         = 256    # commands remembered by the FreeRunner
+WIFI_METRICS_INTERVAL     = 1000   # in ms (refresh of the link metrics)
+WIFI_PING_INTERVAL        = 0.5    # in seconds (link quality probes)
+WIFI_PING_TIMEOUT         = 2      # in seconds (later pongs count as lost)
+WIFI_EWMA_WEIGHT          = 0.125  # of each new sample in the link estimates
+WIFI_RELAY_INTERVALS      = (0, 0.1, 0.25, 0.5, 1, 2)  # in seconds, by level
+WIFI_ADAPT_INTERVAL       = 1      # in seconds (between level changes)
+WIFI_UPGRADE_DELAY        = 5      # in seconds of good link before upgrading
+WIFI_LOSS_HIGH            = 0.1    # loss rate degrading the link level
+WIFI_LOSS_LOW             = 0.02   # loss rate allowing to upgrade it
+WIFI_RTT_HIGH             = 0.5    # in seconds (RTT degrading the level)
+WIFI_RTT_LOW              = 0.1    # in seconds (RTT allowing to upgrade)
+WIFI_ADAPT_LOG_INTERVAL   = False  # slow the Arduino log down with the relay
+WIFI_MAX_SUBSCRIBERS      = 8      # clients served at once by the FreeRunner
+WIFI_SUBSCRIBER_TIMEOUT   = 30     # in seconds (silent clients are dropped)
+WIFI_LEASE_TIME           = WIFI_CONSIDER_LOST  # in seconds (control lease)
+GROUND_UDP_PORT           = 5003   # clients of the ground station...
+GROUND_TCP_PORT           = 5001   # ...also over TCP (0 = no TCP server)
+GROUND_MULTICAST_GROUP    = "239.192.0.1"
+GROUND_MULTICAST_PORT     = 5002
+GROUND_MULTICAST_TTL      = 1      # hops (1 = the local network only)
+GROUND_TCP_QUEUE          = 1024   # messages waiting for a slow TCP client
+GROUND_TCP_MAX_CLIENTS    = 32
+GROUND_TICK               = 0.05   # in seconds (timers of the event loop)
+GROUND_STATS_INTERVAL     = 10     # in seconds (printed with --verbose)
+SERIAL_RING_SIZE          = 1024   # in frames
+SERIAL_READ_TIMEOUT       = 0.1    # in seconds
+REPLAY_MAX_GAP            = 5      # in seconds (longer pauses are skipped)
+REPLAY_MAX_BATCH          = 256    # records returned at once by ReplaySerial
+SIMULATOR_RATE            = 10     # in frames per second
+SIMULATOR_JITTER          = 0.0005 # in seconds (std. dev. of frame timing)
+SIMULATOR_BURST_CHANCE    = 0.0    # probability that a frame starts a burst
+SIMULATOR_BURST_LENGTH    = 20     # in frames (held back, then sent at once)
+SIMULATOR_CORRUPTION      = 0.0    # probability that a frame is corrupted
+SIMULATOR_BUFFER_SIZE     = 65536  # in bytes (more unread data is lost)
+SIMULATOR_GPS_INTERVAL    = 1      # in seconds
+SIMULATOR_GPS_NOISE       = 1.5    # in metres (std. dev. of the GPS fixes)
 LOG_RAW_FNAME             = "../data/raw.log"
 LOG_CLEAN_FNAME           = "../data/clean.log"
 LOG_DB_FNAME              = "../data/log.sqlite"
 LOG_PATH_FNAME            = "../data/path_"   # to append: stint# and extension
+LOG_RAW_SEGMENTS_DIR      = "../data/raw"     # binary raw log segments
+LOG_RAW_BINARY            = True   # record the binary raw log (not raw.log)
+LOG_RAW_INPUT             = LOG_RAW_SEGMENTS_DIR if LOG_RAW_BINARY else \
+                            LOG_RAW_FNAME   # default raw log of log.py
+LOG_RAW_SEGMENT_SIZE      = 16 * 2**20     # in bytes
+LOG_RAW_SEGMENT_TIME      = 3600   # in seconds
+LOG_RAW_FSYNC_INTERVAL    = 1      # in seconds
+LOG_RAW_BUFFER_SIZE       = 65536  # in bytes
+LOG_QUEUE_SIZE            = 4096   # messages waiting for the writer thread
+LOG_QUEUE_POLICY          = 'drop-oldest'  # or 'block' (when queue is full)
+LOG_LATENCY_SAMPLES       = 1000   # batches in the write latency metrics
+LOG_METRICS_INTERVAL      = 1000   # in ms (refresh of the metrics in the GUI)
+LOG_LIVE_DB               = False  # also record into LOG_DB_FNAME while sailing
+LOG_LIVE_BATCH_FRAMES     = 100    # signals committed at once in the live DB
+LOG_LIVE_BATCH_INTERVAL   = 0.5    # in seconds (max delay before a commit)
+LOG_LIVE_STINT_INTERVAL   = 60     # in seconds (between two stint searches)
+LOG_PARTITIONS_DIR        = "../data/partitions"  # one DB per day/session
+LOG_CATALOG_FNAME         = "catalog.sqlite"  # in LOG_PARTITIONS_DIR
+LOG_SESSION_GAP           = 600    # in seconds (longer pauses split sessions)
 STINT_MINIMUM_LENGTH      = 30     # in seconds
 STINT_MAX_STILL_TIME      = 5      # in seconds
 STINT_SPEED_THRESHOLD     = 0.1    # in m/s
 EARTH_RADIUS              = 6371   # in Km
 
+IMPORT_CHUNK_SIZE         = 10000  # signals parsed and inserted at once
+TRACK_CHUNK_SIZE          = 10000  # track points processed at once
+KML_PLACEMARK_EVERY       = 1      # signals per placemark in KML (0 = none)
+
+# Tuning of the sqlite connections used for bulk operations on the log DB
+# (durable commits: the import offsets must survive a crash)
+BULK_PRAGMAS = (
+            'PRAGMA journal_mode = WAL',
+            'PRAGMA synchronous = NORMAL',
+            'PRAGMA temp_store = MEMORY',
+            'PRAGMA cache_size = -65536',  # in KiB
+        )
+
+# Tuning of the sqlite connection recording the log DB live (see LOG_LIVE_DB)
+LIVE_PRAGMAS = (
+            'PRAGMA journal_mode = WAL',
+            'PRAGMA synchronous = NORMAL',
+        )
+
 # Log signals are used to parse log data from the boat into the log system
 # Each entry in the dictionary should be read like this contains:
 # Key:    - the letter used in the string coming from the boat
@@ -92,6 +184,13 @@ LOG_SIGNALS = {
             'e' : ('ardu_energy_counter', 'µJ', 'INTEGER'),
         }
 
+# Struct formats (see telemetry.BinaryCodec) for the signals whose values do
+# not fit the default binary format of their sqlite type.
+LOG_SIGNALS_BINARY = {
+            'T' : 'q',      # MockSerial sends a full epoch in milliseconds
+            'e' : 'q',      # a counter in µJ, beyond 2**31 within hours
+        }
+
 # -----------------------------------------------------------------------------
 # --- HELPER FUNCTIONS
 # -----------------------------------------------------------------------------
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+'''
+Serve the telemetry of the FreeRunner to several clients at once.
+
+Any client sending a datagram to the FreeRunner becomes a subscriber (up to
+WIFI_MAX_SUBSCRIBERS) until it unsubscribes or stays silent for
+WIFI_SUBSCRIBER_TIMEOUT seconds. Each telemetry frame is encoded once and
+sent to every subscriber, at the rate its link supports (see linkquality)
+and it asked for. Subscribers that missed frames get a keyframe instead of
+the delta frame, built once for all of them.
+
+Only one client controls the boat: the lease on it goes to the first one
+asking for it with WIFI_TAKE_CONTROL, until it sends WIFI_RELEASE,
+unsubscribes or stays silent for WIFI_LEASE_TIME seconds. Either way the
+lease is reported lost (see TelemetryHub.service), so that the boat falls
+back to the RC. Commands from the others are refused, so that a client
+merely watching never steers the boat.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import socket
+import struct
+from commons import *
+from time import time
+import commandlink
+import linkquality
+import relay
+import wifibridge
+
+
+class Subscriber(object):
+
+    '''
+    A client of the TelemetryHub, with its own link estimates and rate.
+
+    Counters: frames "sent", "skipped" (rate limit) and "dropped" (the
+    socket refused them).
+    '''
+
+    def __init__(self, address, interval=0):
+        self.address = address
+        self.interval = interval    # requested by the client, in seconds
+        self.link = linkquality.LinkEstimator()
+        self.rate = linkquality.RateController(self.link)
+        self.last_heard = time()
+        self.last_sent = 0
+        self.last_seq = None
+        self.resync = True
+        self.sent = 0
+        self.skipped = 0
+        self.dropped = 0
+
+    @property
+    def relay_interval(self):
+        '''
+        Minimum time between two telemetry frames, in seconds.
+        '''
+        return max(self.interval, self.rate.relay_interval)
+
+
+class TelemetryHub(wifibridge.WifiBridge):
+
+    '''
+    WifiBridge publishing the telemetry to all its subscribers.
+
+    Only the commands of the controller reach the inbox (and "watch"
+    callbacks); "remote_address" is the controller's address (None if no
+    client is in control), so that replies go to it.
+    '''
+
+    def __init__(self, port=WIFI_PORT, max_subscribers=WIFI_MAX_SUBSCRIBERS):
+        super(TelemetryHub, self).__init__(None, port)
+        self.max_subscribers = max_subscribers
+        self.subscribers = {}
+        self.encoder = relay.DeltaEncoder()
+        self.last_wifi_in_time = 0
+        self.rejected = 0    # datagrams of clients beyond max_subscribers
+        self.released = None    # who released the lease (see service)
+        self.unencodable = 0    # log messages relayed as text (see publish)
+
+    def _subscriber(self, address):
+        subscriber = self.subscribers.get(address)
+        if subscriber == None:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            subscriber = self.subscribers[address] = Subscriber(address)
+        return subscriber
+
+    def _unsubscribe(self, address):
+        self.subscribers.pop(address, None)
+        self.release(address)
+
+    def acquire(self, address):
+        '''
+        Give the control lease to "address" if nobody holds it.
+
+        Return True if "address" holds the lease. Addresses need not be
+        those of subscribers (see groundstation).
+        '''
+        if self.remote_address == None:
+            self.remote_address = address
+        return address == self.remote_address
+
+    def release(self, address):
+        '''
+        Take the control lease back from "address", if it holds it.
+
+        The next call to service reports the lease as lost.
+        '''
+        if address == self.remote_address:
+            self.remote_address = None
+            self.released = address
+
+    def write(self, data, server=None):
+        '''
+        Send "data" to "server", by default to the controller.
+
+        If the controller has just released the lease, the replies to the
+        commands it sent before go to it all the same.
+        '''
+        if server == None:
+            server = self.remote_address or self.released
+        super(TelemetryHub, self).write(data, server)
+
+    def drain(self):
+        '''
+        Process every datagram waiting on the socket.
+
+        Subscription, probes and resync requests are handled here; the
+        controller's commands go to the inbox, those of the other clients
+        are refused. Return the number of messages added to the inbox.
+        '''
+        received = 0
+        while True:
+            try:
+                msg, address = self.socket.recvfrom(WIFI_DATAGRAM_SIZE)
+            except socket.error:    # nothing left (or an ICMP error)
+                break
+            if msg == WIFI_UNSUBSCRIBE:
+                self._unsubscribe(address)
+                continue
+            subscriber = self._subscriber(address)
+            if subscriber == None:
+                self.rejected += 1
+                continue
+            subscriber.last_heard = self.last_wifi_in_time = time()
+            if msg == 'ping' or msg.startswith('ping:'):
+                self._send(subscriber, 'pong' + msg[4:])
+            elif msg.startswith('pong:'):
+                subscriber.link.on_pong(msg[5:])
+            elif msg == 'pong':
+                pass
+            elif msg.startswith(WIFI_SUBSCRIBE + ':'):
+                try:
+                    subscriber.interval = float(msg.split(':', 1)[1])
+                except ValueError:
+                    pass
+            elif msg == WIFI_RESYNC:
+                subscriber.resync = True
+            elif msg == WIFI_TAKE_CONTROL:
+                self.acquire(address)
+            elif msg == WIFI_RELEASE:
+                self.release(address)
+            elif address == self.remote_address:
+                self.inbox.append(msg)
+                received += 1
+            elif commandlink.is_command(msg):
+                self._send(subscriber, commandlink.nack(msg))
+        return received
+
+    def _send(self, subscriber, data):
+        # A full socket buffer only costs this subscriber a frame
+        try:
+            self.socket.sendto(data, subscriber.address)
+        except socket.error:
+            subscriber.dropped += 1
+            subscriber.resync = True
+            return False
+        return True
+
+    def service(self):
+        '''
+        Probe the subscribers, adapt their rates and drop the silent ones.
+
+        Return True if the controller has lost its lease since the last
+        call: by releasing it, by unsubscribing or by being silent for
+        WIFI_LEASE_TIME seconds.
+        '''
+        now = time()
+        lost = self.released != None
+        self.released = None
+        for address, subscriber in self.subscribers.items():
+            silence = now - subscriber.last_heard
+            if address == self.remote_address and silence > WIFI_LEASE_TIME:
+                self.remote_address = None
+                lost = True
+            if silence > WIFI_SUBSCRIBER_TIMEOUT:
+                self._unsubscribe(address)
+                continue
+            probe = subscriber.link.ping()
+            if probe:
+                self._send(subscriber, probe)
+            subscriber.rate.update(silence)
+        return lost
+
+    def publish(self, msg, boat):
+        '''
+        Send a message from the boat to the subscribers.
+
+        With WIFI_BINARY_RELAY, log messages are sent as delta-encoded
+        binary frames built from "boat" (which the message has just
+        updated), at the rate of each subscriber. Other messages are sent
+        to everybody, and so are log messages with a value out of the range
+        of its binary format (counted as "unencodable").
+        '''
+        binary = WIFI_BINARY_RELAY and msg[0] == '!'
+        frame = None
+        if binary and self.subscribers:
+            try:
+                frame = self.encoder.encode(boat)
+            except struct.error:
+                self.unencodable += 1
+                binary = False
+        if not binary:
+            for subscriber in self.subscribers.values():
+                self._send(subscriber, msg)
+            return
+        if frame == None:
+            return
+        seq = self.encoder.seq
+        now = time()
+        for subscriber in self.subscribers.values():
+            if now - subscriber.last_sent < subscriber.relay_interval:
+                subscriber.skipped += 1
+                continue
+            if subscriber.resync or \
+               subscriber.last_seq != (seq - 1) & 0xFFFF:
+                data = self.encoder.keyframe()
+            else:
+                data = frame
+            subscriber.resync = False
+            if self._send(subscriber, data):
+                subscriber.last_seq = seq
+                subscriber.last_sent = now
+                subscriber.sent += 1
+
+    def log_interval(self, base):
+        '''
+        Return the Arduino log interval for a requested one of "base".
+
+        The log follows the fastest subscriber (see
+        linkquality.RateController.log_interval).
+        '''
+        if not self.subscribers:
+            return base
+        return min((subscriber.rate.log_interval(base) for subscriber in
+                    self.subscribers.itervalues()), key=linkquality.log_period)
+
+    def stats(self):
+        '''
+        Return a list of dictionaries, one per subscriber.
+
+        Keys: address, controller (True for the lease holder), interval
+        (current relay interval), sent, skipped, dropped, and the link
+        estimates (see linkquality.LinkEstimator.stats).
+        '''
+        result = []
+        for address, subscriber in sorted(self.subscribers.items()):
+            stats = subscriber.link.stats()
+            stats.update(address=address,
+                         controller=address == self.remote_address,
+                         interval=subscriber.relay_interval,
+                         sent=subscriber.sent, skipped=subscriber.skipped,
+                         dropped=subscriber.dropped)
+            result.append(stats)
+        return result
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+'''
+Batch geodesy on whole GPS tracks.
+
+Tracks are given as three sequences of the same length: latitudes and
+longitudes (in degrees) and timestamps (in milliseconds, as ardu_millis).
+Computations use numpy when available, and fall back on pure python
+otherwise. Missing coordinates and timestamps (None) are allowed.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import math
+from commons import *
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _segments_numpy(latitudes, longitudes, millis):
+    lat = numpy.radians(numpy.array(latitudes, dtype=float))
+    lon = numpy.radians(numpy.array(longitudes, dtype=float))
+    ms = numpy.array(millis, dtype=float)
+    d_lat = lat[1:] - lat[:-1]
+    d_lon = lon[1:] - lon[:-1]
+    a = numpy.sin(d_lat / 2.0) ** 2 + \
+        numpy.cos(lat[:-1]) * numpy.cos(lat[1:]) * numpy.sin(d_lon / 2.0) ** 2
+    distances = EARTH_RADIUS * 2000 * numpy.arcsin(numpy.sqrt(a))
+    distances[numpy.isnan(distances)] = 0
+    dt = (ms[1:] - ms[:-1]) / 1000.0
+    dt[numpy.isnan(dt)] = 0
+    valid = dt > 0
+    speeds = numpy.zeros(len(distances))
+    speeds[valid] = distances[valid] / dt[valid]
+    cumulative = numpy.zeros(len(lat))
+    numpy.cumsum(distances, out=cumulative[1:])
+    return distances, speeds, cumulative
+
+
+def _segments_python(latitudes, longitudes, millis):
+    if not latitudes:
+        return [], [], []
+    radians, sin, cos, asin, sqrt = \
+        math.radians, math.sin, math.cos, math.asin, math.sqrt
+    distances, speeds, cumulative = [], [], [0.0]
+    total = 0.0
+    for i in xrange(1, len(latitudes)):
+        a_lat, a_lon = latitudes[i-1], longitudes[i-1]
+        b_lat, b_lon = latitudes[i], longitudes[i]
+        if None in (a_lat, a_lon, b_lat, b_lon):
+            distance = 0.0
+        else:
+            a_lat, a_lon = radians(a_lat), radians(a_lon)
+            b_lat, b_lon = radians(b_lat), radians(b_lon)
+            a = sin((b_lat - a_lat) / 2.0) ** 2 + \
+                cos(a_lat) * cos(b_lat) * sin((b_lon - a_lon) / 2.0) ** 2
+            distance = EARTH_RADIUS * 2000 * asin(sqrt(a))
+        if millis[i] == None or millis[i-1] == None:
+            dt = 0
+        else:
+            dt = (millis[i] - millis[i-1]) / 1000.0
+        distances.append(distance)
+        speeds.append(distance / dt if dt > 0 else 0.0)
+        total += distance
+        cumulative.append(total)
+    return distances, speeds, cumulative
+
+
+def track_segments(latitudes, longitudes, millis, use_numpy=True):
+    '''
+    Return (distances, speeds, cumulative) for a track of N points.
+
+    distances   N-1 distances in metres between consecutive points
+    speeds      N-1 speeds in m/s over the same segments
+    cumulative  N distances in metres from the first point
+
+    Segments with a missing coordinate count as 0 m, segments with no
+    elapsed time (or a missing timestamp) as 0 m/s. Results are numpy
+    arrays if numpy is available (and "use_numpy" is True), lists otherwise.
+    '''
+    if numpy != None and use_numpy:
+        return _segments_numpy(latitudes, longitudes, millis)
+    return _segments_python(latitudes, longitudes, millis)
@@ -0,0 +1,434 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Ground station: relay the telemetry of the boat to any number of clients.
+
+The FreeRunner has little CPU to spare for serving several viewers. The
+ground station runs on the shore laptop instead: it keeps a single wifi
+link to the FreeRunner (as a boat.RemoteBoat) and serves the telemetry
+again to local clients, in three ways:
+
+UDP         the FreeRunner protocol (see fanout): clients connect to the
+            ground station with boat.RemoteBoat as they would to the boat
+TCP         a stream of text messages, one per line
+multicast   every text message in a datagram, to a multicast group
+
+Everything received from the boat is recorded in the raw log. Commands
+reach the boat through one path only: the client holding the control lease
+(see fanout.TelemetryHub) sends them, over UDP or TCP, and the ground
+station forwards them with its own acknowledged link (see commandlink).
+The ground station takes the lease of the FreeRunner when one of its
+clients takes its own, and releases it with it. A command is acknowledged
+to its client only once the boat has acknowledged it: if the boat refuses
+it or never answers, the client gets a refusal instead (a nack datagram
+over UDP, a "nack" line over TCP).
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import errno
+import select
+import socket
+import argparse
+from collections import deque
+from commons import *
+from time import time
+import boat
+import commandlink
+import fanout
+import rawlog
+
+
+class TcpClient(object):
+
+    '''
+    A client of the ground station connected over TCP.
+
+    Messages wait in a queue of GROUND_TCP_QUEUE messages: when the client
+    does not keep up, the oldest ones are "dropped" (and counted), so that
+    it never holds the others back. Lines received are commands, or
+    WIFI_TAKE_CONTROL and WIFI_RELEASE for the control lease.
+    '''
+
+    def __init__(self, sock, address):
+        self.socket = sock
+        self.socket.setblocking(0)
+        self.address = address
+        self.key = ('tcp',) + address    # identifies it for the lease
+        self.queue = deque()
+        self.pending = ''    # data being sent
+        self.incoming = ''   # partial line received
+        self.dropped = 0
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def queue_message(self, msg):
+        if len(self.queue) >= GROUND_TCP_QUEUE:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(msg.rstrip('\r\n') + '\n')
+
+    def wants_write(self):
+        return bool(self.pending or self.queue)
+
+    def flush(self):
+        '''
+        Send as much as the socket takes. Return False if the connection
+        is lost.
+        '''
+        if not self.pending:
+            self.pending = ''.join(self.queue)
+            self.queue.clear()
+        try:
+            sent = self.socket.send(self.pending)
+        except socket.error as e:
+            return e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK)
+        self.pending = self.pending[sent:]
+        return True
+
+    def receive(self):
+        '''
+        Return the complete lines received, or None if the connection has
+        been closed.
+        '''
+        try:
+            data = self.socket.recv(WIFI_DATAGRAM_SIZE)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return []
+            return None
+        if not data:
+            return None
+        lines = (self.incoming + data).split('\n')
+        self.incoming = lines.pop()
+        return [line.strip() for line in lines if line.strip()]
+
+    def close(self):
+        self.socket.close()
+
+
+class GroundStation(object):
+
+    '''
+    Relay between the FreeRunner and the clients on shore.
+
+    "boat_address" is the (host, port) of the FreeRunner. "tcp_port" 0
+    disables the TCP server, "multicast" None the multicast. "log_writer" is
+    a rawlog writer (None not to record). With "watchdog", the boat is sent
+    back to RC mode when the client in control is lost, as the FreeRunner
+    would do if that client were connected to it.
+    '''
+
+    def __init__(self, boat_address, udp_port=GROUND_UDP_PORT,
+                 tcp_port=GROUND_TCP_PORT, multicast=None, log_writer=None,
+                 watchdog=False):
+        self.boat = boat.RemoteBoat(boat_address, port=0)
+        self.hub = fanout.TelemetryHub(udp_port)
+        self.commands = commandlink.CommandReceiver()
+        self.boat.commands.on_result = self.on_boat_result
+        self.replies = {}    # seq sent to the boat: (client, ack or None)
+        self.watchdog = watchdog
+        self.listener = None
+        if tcp_port:
+            self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR,
+                                     1)
+            self.listener.bind(('', tcp_port))
+            self.listener.listen(5)
+            self.listener.setblocking(0)
+        self.tcp_clients = {}
+        self.multicast = multicast
+        if multicast:
+            self.multicast_socket = socket.socket(socket.AF_INET,
+                                                  socket.SOCK_DGRAM)
+            self.multicast_socket.setsockopt(socket.IPPROTO_IP,
+                            socket.IP_MULTICAST_TTL, GROUND_MULTICAST_TTL)
+            self.multicast_socket.setblocking(0)
+        self.logfile = rawlog.AsyncLogWriter(log_writer) if log_writer \
+                       else None
+        self.last_log_time = 0
+        self.last_boat_time = time()
+        self.in_control = False    # holds the lease of the FreeRunner
+        self.relayed = 0
+        self.forwarded = 0
+        self.refused = 0
+        self.multicast_dropped = 0
+
+    # --- Upstream (the boat) ---------------------------------------------
+
+    def pump(self):
+        '''
+        Relay every message waiting from the boat. Return their number.
+        '''
+        count = 0
+        while True:
+            # One message at a time, so that each one is parsed before being
+            # published (the hub encodes the boat, not the message)
+            messages = self.boat.poll_messages(1)
+            if not messages:
+                break
+            self.publish(messages[0])
+            count += 1
+        if count:
+            self.last_boat_time = time()
+        elif time() - self.last_boat_time > WIFI_MAYBE_LOST:
+            self.boat.wifi.ping()    # subscribe again (FreeRunner restarted?)
+        return count
+
+    def publish(self, msg):
+        '''
+        Record a message from the boat and send it to all the clients.
+        '''
+        if self.logfile:
+            self.last_log_time = max(time(), self.last_log_time + 0.001)
+            self.logfile.write(self.last_log_time, msg)
+        self.hub.publish(msg, self.boat)
+        for client in self.tcp_clients.itervalues():
+            client.queue_message(msg)
+        if self.multicast:
+            try:
+                self.multicast_socket.sendto(msg, self.multicast)
+            except socket.error:
+                self.multicast_dropped += 1
+        self.relayed += 1
+
+    def forward(self, address, command):
+        '''
+        Send a command of the client at "address" to the boat, if that
+        client holds the control lease. Return the sequence number of the
+        command sent to the boat, or None if the client is not in control.
+        '''
+        if address != self.hub.remote_address:
+            self.refused += 1
+            return None
+        self.follow_lease()    # the lease may have been taken just now
+        self.boat.send_command(command.strip())
+        self.forwarded += 1
+        return self.boat.commands.seq
+
+    def on_boat_result(self, seq, delivered):
+        '''
+        Answer the client of a command the boat has acknowledged ("delivered"
+        True), refused or never received (see commandlink.CommandSender).
+        '''
+        reply = self.replies.pop(seq, None)
+        if reply == None:
+            return    # not a command of the clients (e.g. the watchdog's)
+        client, ack = reply
+        if ack:
+            self.hub.write(ack if delivered else commandlink.nack(ack), client)
+        elif not delivered and client in self.tcp_clients.values():
+            client.queue_message(WIFI_NACK)
+
+    def lease_lost(self):
+        if self.watchdog:
+            self.boat.send_command(SET_PILOT_MODE, RC)
+
+    def follow_lease(self):
+        '''
+        Hold the lease of the FreeRunner while a client holds ours.
+        '''
+        controlled = self.hub.remote_address != None
+        if controlled == self.in_control:
+            return
+        if controlled:
+            self.boat.take_control()
+        else:
+            self.boat.release()
+        self.in_control = controlled
+
+    # --- Downstream (the clients) ----------------------------------------
+
+    def on_udp_readable(self):
+        self.hub.drain()
+        while self.hub.inbox:
+            msg = self.hub.inbox.popleft()
+            address = self.hub.remote_address
+            if not commandlink.is_command(msg):
+                self.forward(address, msg)
+                continue
+            ack, command = self.commands.receive(msg)
+            if command:
+                # The ack waits for the boat's (see on_boat_result)
+                seq = self.forward(address, command)
+                if seq == None:
+                    self.hub.write(commandlink.nack(msg))
+                else:
+                    self.replies[seq] = address, ack
+            elif ack and (address, ack) not in self.replies.values():
+                self.hub.write(ack)    # copy of an answered command, or stale
+
+    def on_tcp_connection(self):
+        try:
+            sock, address = self.listener.accept()
+        except socket.error:
+            return
+        if len(self.tcp_clients) >= GROUND_TCP_MAX_CLIENTS:
+            sock.close()
+            return
+        client = TcpClient(sock, address)
+        self.tcp_clients[client.fileno()] = client
+
+    def on_tcp_readable(self, client):
+        lines = client.receive()
+        if lines == None:
+            self.disconnect(client)
+            return
+        for line in lines:
+            if line == WIFI_TAKE_CONTROL:
+                self.hub.acquire(client.key)
+            elif line == WIFI_RELEASE:
+                self.hub.release(client.key)
+            else:
+                seq = self.forward(client.key, line)
+                if seq == None:
+                    client.queue_message(WIFI_NACK)
+                else:
+                    self.replies[seq] = client, None
+
+    def disconnect(self, client):
+        del self.tcp_clients[client.fileno()]
+        client.close()
+        self.hub.release(client.key)    # reported by service
+
+    # --- Event loop ------------------------------------------------------
+
+    def step(self, timeout=GROUND_TICK):
+        '''
+        Wait up to "timeout" seconds for data, then handle everything due.
+        '''
+        readers = [self.boat.wifi, self.hub] + self.tcp_clients.values()
+        if self.listener:
+            readers.append(self.listener)
+        writers = [client for client in self.tcp_clients.itervalues()
+                   if client.wants_write()]
+        try:
+            readable, writable, errors = select.select(readers, writers, [],
+                                                       timeout)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return
+            raise
+        if self.hub in readable:
+            self.on_udp_readable()
+        if self.listener in readable:
+            self.on_tcp_connection()
+        for client in readable:
+            if isinstance(client, TcpClient) and \
+               client.fileno() in self.tcp_clients:
+                self.on_tcp_readable(client)
+        self.pump()
+        for client in writable:
+            if client.fileno() in self.tcp_clients and not client.flush():
+                self.disconnect(client)
+        if self.hub.service():
+            self.lease_lost()
+        self.follow_lease()
+
+    def run(self, verbose=False):
+        '''
+        Relay until interrupted (KeyboardInterrupt).
+        '''
+        last_stats = time()
+        try:
+            while True:
+                self.step()
+                if verbose and time() - last_stats > GROUND_STATS_INTERVAL:
+                    self.print_stats()
+                    last_stats = time()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        for client in self.tcp_clients.values():
+            client.close()
+        self.tcp_clients.clear()
+        if self.listener:
+            self.listener.close()
+        if self.multicast:
+            self.multicast_socket.close()
+        self.hub.close()
+        self.boat.close()
+        if self.logfile:
+            self.logfile.close()
+
+    def stats(self):
+        '''
+        Return a dictionary with the metrics of the ground station.
+
+        Keys:
+        relayed             messages received from the boat
+        forwarded, refused  commands of the clients (refused: not in control)
+        controller          address of the client in control (or None)
+        udp                 the stats of the hub (see fanout.TelemetryHub)
+        tcp                 {address: messages dropped} of the TCP clients
+        multicast_dropped   messages the multicast socket refused
+        boat                the stats of the commands sent to the boat (see
+                            commandlink.CommandSender)
+        '''
+        return dict(relayed=self.relayed, forwarded=self.forwarded,
+                    refused=self.refused, controller=self.hub.remote_address,
+                    udp=self.hub.stats(),
+                    tcp=dict((client.address, client.dropped) for client in
+                             self.tcp_clients.itervalues()),
+                    multicast_dropped=self.multicast_dropped,
+                    boat=self.boat.commands.stats())
+
+    def print_stats(self):
+        stats = self.stats()
+        print '%d relayed, %d UDP and %d TCP clients, controller %s, ' \
+              '%d commands forwarded (%d refused), %d failed upstream' % \
+              (stats['relayed'], len(stats['udp']), len(stats['tcp']),
+               stats['controller'], stats['forwarded'], stats['refused'],
+               stats['boat']['failed'])
+
+
+# -----------------------------------------------------------------------------
+# --- MAIN PROGRAM
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='''Relay the telemetry of
+                                     the boat to the clients on shore.''')
+    parser.add_argument('host', help='Address of the FreeRunner')
+    parser.add_argument('-p', '--port',
+        help='UDP port of the FreeRunner (default: %(default)s)', type=int,
+        default=WIFI_PORT)
+    parser.add_argument('-u', '--udp-port',
+        help='UDP port for the clients (default: %(default)s)', type=int,
+        default=GROUND_UDP_PORT)
+    parser.add_argument('-t', '--tcp-port',
+        help='TCP port for the clients, 0 for none (default: %(default)s)',
+        type=int, default=GROUND_TCP_PORT)
+    parser.add_argument('-g', '--multicast',
+        help='''Also send the messages to the multicast GROUP (port
+                %d)''' % GROUND_MULTICAST_PORT, nargs='?', metavar='GROUP',
+        const=GROUND_MULTICAST_GROUP)
+    parser.add_argument('-l', '--log-dir',
+        help='''Directory of the raw log segments (default:
+                %(default)s)''', default=LOG_RAW_SEGMENTS_DIR)
+    parser.add_argument('-n', '--no-log',
+        help='Do not record the raw log', action='store_true')
+    parser.add_argument('-w', '--watchdog',
+        help='Send the boat back to RC mode when the controller is lost',
+        action='store_true')
+    parser.add_argument('-v', '--verbose',
+        help='Print the metrics every %d seconds' % GROUND_STATS_INTERVAL,
+        action='store_true')
+    args = parser.parse_args()
+    writer = None
+    if not args.no_log:
+        writer = rawlog.RawLogWriter(args.log_dir)
+    multicast = (args.multicast, GROUND_MULTICAST_PORT) if args.multicast \
+                else None
+    station = GroundStation((args.host, args.port), args.udp_port,
+                            args.tcp_port, multicast, writer, args.watchdog)
+    station.run(args.verbose)
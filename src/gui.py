@@ -10,7 +10,7 @@ __license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
 
 
 import gobject, pango, gtk
-import boat, wifibridge
+import boat, rawlog, commandlink, fanout
 from commons import *
 from graphics import Scene, LockScreen
 from time import time
@@ -99,18 +99,82 @@ class GeneralControlPanel(object):
         self.builder.add_from_file(self.gui_file)
         self.builder.connect_signals(self)
         self.window = self.builder.get_object("window")
-        self.logfile = open(LOG_RAW_FNAME, 'a', 1)
-        self.last_logged_msg = None
+        if LOG_RAW_BINARY:
+            writer = rawlog.RawLogWriter(LOG_RAW_SEGMENTS_DIR)
+        else:
+            writer = rawlog.TextLogWriter(LOG_RAW_FNAME)
+        self.logfile = rawlog.AsyncLogWriter(writer)
+        self.log_writers = [self.logfile]
+        if LOG_LIVE_DB:
+            import log    # needs Storm, which is not required otherwise
+            self.db_sink = rawlog.AsyncLogWriter(log.LiveDatabaseWriter())
+            self.log_writers.append(self.db_sink)
+        else:
+            self.db_sink = None
+        self.last_log_time = 0
+        gobject.timeout_add(LOG_METRICS_INTERVAL, self.show_log_metrics)
+
+    def do_log(self, messages):
+        '''
+        Append a batch of messages to the raw log (and to the live DB).
+
+        Timestamps are kept strictly increasing (1 ms apart at least) as
+        they identify the signals once imported in the log database. Messages
+        are only queued: background threads write them to disk.
+        '''
+        for msg in messages:
+            self.last_log_time = max(time(), self.last_log_time + 0.001)
+            for writer in self.log_writers:
+                writer.write(self.last_log_time, msg)
 
-    def do_log(self):
-        if self.boat.last_msg != self.last_logged_msg:
-            self.logfile.write(str(time()) + " " + self.boat.last_msg + "\n")
-            self.last_logged_msg = self.boat.last_msg
+    def sync_log(self):
+        '''
+        Have everything logged so far written to disk.
+        '''
+        for writer in self.log_writers:
+            writer.sync(force=True)
+
+    def show_log_metrics(self):
+        '''
+        Show the metrics of the logging subsystem on the logging button.
+
+        A summary goes on the second line of the label, the details in the
+        tooltip.
+        '''
+        stats = self.logfile.stats()
+        details = ['Queue: %d/%d messages (max %d)' % (stats['depth'],
+                   self.logfile.queue_size, stats['max_depth']),
+                   'Written: %d messages, %.1f KiB' % (stats['records'],
+                   stats['bytes'] / 1024.0),
+                   'Dropped: %d messages' % stats['dropped']]
+        summary = 'q %d, %.0f KiB, %d dropped' % (stats['depth'],
+                  stats['bytes'] / 1024.0, stats['dropped'])
+        if stats['p50'] != None:
+            details.append('Write latency: p50 %.1f ms, p95 %.1f ms, '
+                           'p99 %.1f ms, max %.1f ms' %
+                           tuple(stats[k] * 1000 for k in
+                                 ('p50', 'p95', 'p99', 'max')))
+            summary += ', p95 %.0f ms' % (stats['p95'] * 1000)
+        if self.db_sink:
+            db_stats = self.db_sink.stats()
+            details.append('Database: %d signals, %d dropped' %
+                           (db_stats['records'], db_stats['dropped']))
+        for writer in self.log_writers:
+            if writer.error:
+                details.append('Error: %s' % writer.error)
+                summary = 'ERROR'
+        button = self.builder.get_object(self.log_button)
+        button.set_label(button.get_label().split('\n')[0] + '\n' + summary)
+        button.set_tooltip_text('\n'.join(details))
+        return True    #Necessary to keep it being scheduled by GObject
 
     def on_window_destroy(self, widget):
         '''
         Works as far as you follow conventions...
         '''
+        self.boat.close()
+        for writer in self.log_writers:
+            writer.close()
         gtk.main_quit()
 
 
@@ -120,9 +184,13 @@ class ComputerControlPanel(GeneralControlPanel):
     Provide the visual environment for interacting with the boat from the PC.
     '''
 
-    def __init__(self):
-        self.boat = boat.BareBoat()
+    def __init__(self, port=None):
+        '''
+        "port" is passed to the boat (default: the Arduino serial device).
+        '''
+        self.boat = boat.BareBoat(port) if port else boat.BareBoat()
         self.gui_file = "../data/computer-gui.xml"
+        self.log_button = "logg_on_off_button"
         super(ComputerControlPanel, self).__init__()
 
         self.messages = self.builder.get_object("messages")
@@ -144,26 +212,29 @@ class ComputerControlPanel(GeneralControlPanel):
 
         gobject.timeout_add(10, self.serial_monitor)
         gobject.timeout_add(30, self.scene.redraw)
+        gobject.timeout_add(WIFI_METRICS_INTERVAL, self.show_link_metrics)
         self.on_ms_radio_toggled(None) # Initialise the values
 
         # Other varaibles
         self.logging_mode = False
+        self.debug_mode = False
         self.nm = None
 
         self.window.resize(900, 640)
         self.window.show_all()
 
     def serial_monitor(self):
-        msg = self.boat.poll_message()
-        if msg != None and msg[0] != '!':
-            self.messages.set_text(str(msg))
-            if self.debug_mode:
-                print ">>> ", msg
+        messages = self.boat.poll_messages()
+        for msg in messages:
+            if msg[0] != '!':
+                self.messages.set_text(str(msg))
+                if self.debug_mode:
+                    print ">>> ", msg
         if self.boat.pilot_mode != COMPUTER:   # Avoid infinite loop
             self.sail_adjustment.set_value(self.boat.sail_position)
             self.rudder_adjustment.set_value(self.boat.rudder_position)
         if self.logging_mode == True:
-            self.do_log()
+            self.do_log(messages)
         if self.nm:
             self.nm.update_values()
         return True    #Necessary to keep it being scheduled by GObject
@@ -224,9 +295,40 @@ class ComputerControlPanel(GeneralControlPanel):
             return # Avoid an infinite loop
         self.boat.send_command(SET_RUDDER, widget.get_value())
 
+    def show_link_metrics(self):
+        '''
+        Show the metrics of the wifi link on the remote boat button.
+
+        RTT and loss go on the second line of the label, the details in the
+        tooltip.
+        '''
+        if not isinstance(self.boat, boat.RemoteBoat):
+            return True
+        stats = self.boat.commands.stats()
+        rtt = '%.1f ms' % (stats['rtt'] * 1000) if stats['rtt'] != None \
+              else 'n/a'
+        details = ['RTT: %s (timeout %.0f ms)' % (rtt, stats['rto'] * 1000),
+                   'Commands: %d sent, %d acked, %d pending, %d failed' %
+                   (stats['sent'], stats['acked'], stats['pending'],
+                    stats['failed']),
+                   'Retransmitted: %d datagrams' % stats['retransmitted'],
+                   'Loss: %.1f%%' % (stats['loss'] * 100),
+                   'Refused: %d (another client is in control)' %
+                   stats['refused'],
+                   'Telemetry: %d frames lost' % self.boat.relay.lost]
+        summary = 'RTT %s, loss %.0f%%' % (rtt, stats['loss'] * 100)
+        if stats['failed']:
+            summary += ', %d failed' % stats['failed']
+        button = self.builder.get_object("connect_remote_button")
+        button.set_label(button.get_label().split('\n')[0] + '\n' + summary)
+        button.set_tooltip_text('\n'.join(details))
+        return True    #Necessary to keep it being scheduled by GObject
+
     def on_logg_on_off_button_toggled(self, widget):
         state = widget.get_active()
         self.logging_mode = state
+        if not state:
+            self.sync_log()
         widget.set_label("Logging in ON" if state else "Logging is OFF")
 
     def on_connect_remote_button_clicked(self, widget):
@@ -248,10 +350,29 @@ class ComputerControlPanel(GeneralControlPanel):
         except Exception as e:
             print "Failed to connect: ", e
         else:
+            remote_boat.watch()
+            # The old boat holds its serial port or socket until closed
+            self.boat.close()
             self.boat = remote_boat
+            control = self.builder.get_object("control_button")
+            control.set_active(False)
+            control.set_sensitive(True)
             self.remote_uri_dialogue.hide()
             self.scene.change_boat(self.boat)
 
+    def on_control_button_toggled(self, widget):
+        '''
+        Take or release the control of the remote boat (see fanout).
+        '''
+        if not isinstance(self.boat, boat.RemoteBoat):
+            return
+        if widget.get_active():
+            self.boat.take_control()
+            widget.set_label("In control")
+        else:
+            self.boat.release()
+            widget.set_label("Take control")
+
     def on_disconnect_menu_item_activate(self, widget):
         print "disconnect"
 
@@ -289,10 +410,15 @@ class ComputerControlPanel(GeneralControlPanel):
 
 class FreeRunnerControlPanel(GeneralControlPanel):
 
-    def __init__(self):
+    def __init__(self, port=None):
+        '''
+        "port" is passed to the boat (default: the Arduino serial device).
+        '''
         self.fr = FreeRunner()
-        self.boat = boat.FreeBoat(freerunner=self.fr)
+        self.boat = boat.FreeBoat(port, freerunner=self.fr) if port else \
+                    boat.FreeBoat(freerunner=self.fr)
         self.gui_file = "../data/freerunner-gui.xml"
+        self.log_button = "log_data"
         super(FreeRunnerControlPanel, self).__init__()
         # Collect all buttons in order to be able to gray them out later on
         self.all_buttons=[]
@@ -317,6 +443,7 @@ class FreeRunnerControlPanel(GeneralControlPanel):
         self.run_mode = False
         self.logging_mode = False
         self.wifi = None
+        self.log_interval = None    # last one sent to the Arduino
         self.watchdog = False
         gobject.timeout_add(10, self.loop)
         self.window.maximize()
@@ -334,28 +461,53 @@ class FreeRunnerControlPanel(GeneralControlPanel):
         Executes callbacks if the program is in runmode (button on the GUI)
         '''
         if self.run_mode == True:
-            # WiFi ops (including Watchdog)
+            # Poll messages
+            messages = self.boat.poll_messages(self.active_systems)
+            # WiFi ops (including Watchdog), commands are handled as they
+            # arrive by on_wifi_message
             if self.wifi:
-                wifi_msg = self.wifi.read()
-                if wifi_msg:
-                    self.boat.send_command(wifi_msg)
-                if self.wifi.remote_address:
-                    if self.last_sent_wifi_message != self.boat.last_msg:
-                        self.wifi.write(self.boat.last_msg)
-                        self.last_sent_wifi_message = self.boat.last_msg
-                    elapsed = time() - self.wifi.last_wifi_in_time
-                    if self.watchdog and WIFI_MAYBE_LOST < elapsed:
-                        self.wifi.ping()
-                        if WIFI_CONSIDER_LOST < elapsed:
-                            self.boat.send_command(SET_PILOT_MODE, RC)
-                            self.wifi = None
+                if self.wifi.service() and self.watchdog:
+                    # The controlling client has left: back to the RC
+                    self.boat.send_command(SET_PILOT_MODE, RC)
+                if self.last_sent_wifi_message != self.boat.last_msg:
+                    self.wifi.publish(self.boat.last_msg, self.boat)
+                    self.last_sent_wifi_message = self.boat.last_msg
+                self._send_log_interval()
             # Logging ops
             if self.logging_mode:
-                self.do_log()
-            # Pll message
-            self.boat.poll_message(self.active_systems)
+                self.do_log(messages)
         return True    #Necessary to keep it being scheduled by GObject
 
+    def _send_log_interval(self):
+        '''
+        Set the Arduino log interval for run mode, given the wifi clients.
+        '''
+        interval = RUN_LOG_INTERVAL
+        if self.wifi:
+            interval = self.wifi.log_interval(RUN_LOG_INTERVAL)
+        if interval != self.log_interval:
+            self.boat.send_command(SET_LOG_INTERVAL, interval)
+            self.log_interval = interval
+
+    def on_wifi_message(self, msg):
+        '''
+        Forward a command from the controlling wifi client to the boat (in
+        run mode).
+
+        Acknowledged commands are executed once (see commandlink), plain
+        ones as they come.
+        '''
+        if not self.run_mode:
+            return
+        if commandlink.is_command(msg):
+            ack, command = self.commands.receive(msg)
+            if ack:
+                self.wifi.write(ack)
+            if command:
+                self.boat.send_command(command.strip())
+        else:
+            self.boat.send_command(msg)
+
     def _subsystem(self, subsystem, widget):
         '''
         Helper function to manage the self.active_systems record
@@ -368,9 +520,10 @@ class FreeRunnerControlPanel(GeneralControlPanel):
     def on_run_button_toggled(self, widget):
         self.run_mode = widget.get_active()
         if self.run_mode:
-            self.boat.send_command(SET_LOG_INTERVAL, 3)
+            self._send_log_interval()
         else:
             self.boat.send_command(SET_LOG_INTERVAL, 0)
+            self.log_interval = None
 
     def on_use_accelerometer_toggled(self, widget):
         self._subsystem('accelerometer', widget)
@@ -390,10 +543,17 @@ class FreeRunnerControlPanel(GeneralControlPanel):
 
     def on_wireless_bridge_toggled(self, widget):
         if widget.get_active():
-            self.wifi = wifibridge.WifiBridge()
+            self.wifi = fanout.TelemetryHub()
+            self.wifi.watch(self.on_wifi_message)
+            self.commands = commandlink.CommandReceiver()
             self.last_sent_wifi_message = ''
-        else:
+        elif self.wifi:
+            self.wifi.close()
             self.wifi = None
+            if self.run_mode:
+                self._send_log_interval()
 
     def on_log_data_toggled(self, widget):
         self.logging_mode = widget.get_active()
+        if not self.logging_mode:
+            self.sync_log()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+'''
+Streaming writer for KML documents.
+
+Documents are written incrementally, so that tracks of any length can be
+exported without ever holding the whole document in memory.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+from xml.sax.saxutils import escape
+
+
+class KmlWriter(object):
+
+    '''
+    Write a KML document to a file-like object, one element at a time.
+
+    Elements must be written in document order: start_document, any number
+    of styles, points and tracks, end_document.
+    '''
+
+    def __init__(self, out):
+        self.out = out
+        self.track_started = False
+
+    def start_document(self, name):
+        self.out.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                       '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+                       '<Document>\n<name>%s</name>\n' % escape(name))
+
+    def line_style(self, style_id, color, width):
+        '''
+        Add a line style ("color" is aabbggrr, as in KML).
+        '''
+        self.out.write('<Style id="%s"><LineStyle><color>%s</color>'
+                       '<width>%s</width></LineStyle></Style>\n' %
+                       (escape(style_id), color, width))
+
+    def point(self, name, description, latitude, longitude):
+        '''
+        Add a placemark for a single point.
+        '''
+        self.out.write('<Placemark><name>%s</name><description>%s'
+                       '</description><Point><coordinates>%r,%r</coordinates>'
+                       '</Point></Placemark>\n' % (escape(name),
+                       escape(description), longitude, latitude))
+
+    def start_track(self, name, style_url=None):
+        '''
+        Start a placemark with a (tessellated) line string.
+        '''
+        style = '<styleUrl>%s</styleUrl>' % escape(style_url) \
+                if style_url else ''
+        self.out.write('<Placemark><name>%s</name>%s<LineString>'
+                       '<tessellate>1</tessellate><coordinates>\n' %
+                       (escape(name), style))
+
+    def track_points(self, points):
+        '''
+        Add (latitude, longitude) points to the current track.
+
+        Points with missing coordinates are skipped.
+        '''
+        self.out.write(''.join('%r,%r\n' % (lon, lat) for lat, lon in points
+                               if lat != None and lon != None))
+
+    def end_track(self):
+        self.out.write('</coordinates></LineString></Placemark>\n')
+
+    def end_document(self):
+        self.out.write('</Document>\n</kml>\n')
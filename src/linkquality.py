@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+'''
+Estimate the quality of the wifi link and adapt the telemetry rate to it.
+
+The FreeRunner probes the link every WIFI_PING_INTERVAL seconds with
+"ping:<id>" datagrams, which the client echoes as "pong:<id>" followed by
+the number of telemetry frames it decoded and lost (see wifibridge). From
+them the LinkEstimator keeps exponentially weighted moving averages of the
+round trip time, its jitter, the probe loss and the telemetry loss. The
+RateController turns those estimates into a link level, slowing the relay
+(and optionally the Arduino log) down when the link weakens and speeding
+it up again once the link has been good for a while.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+from commons import *
+from time import time
+
+
+def _ewma(average, sample, weight=WIFI_EWMA_WEIGHT):
+    if average == None:
+        return sample
+    return average + weight * (sample - average)
+
+
+def log_period(interval):
+    '''
+    Return the period in seconds of a SET_LOG_INTERVAL argument.
+
+    As for the Arduino, positive intervals are in seconds and negative ones
+    in milliseconds (0 stops the log).
+    '''
+    return interval if interval >= 0 else -interval / 1000.0
+
+
+class LinkEstimator(object):
+
+    '''
+    Keep the estimates of the link quality, from the pings and their pongs.
+
+    Estimates (None until measured): "rtt" and "jitter" (mean deviation of
+    successive RTTs, as in RFC 3550) in seconds, "loss" (of the probes,
+    either way) and "telemetry_loss" (of the relayed frames, as seen by the
+    client).
+    '''
+
+    def __init__(self, interval=WIFI_PING_INTERVAL,
+                 timeout=WIFI_PING_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self.probe = 0
+        self.in_flight = {}    # probe id: time sent
+        self.last_ping_time = 0
+        self.last_rtt = None
+        self.rtt = None
+        self.jitter = None
+        self.loss = None
+        self.telemetry_loss = None
+        self.client_counters = None    # (decoded, lost) at the last pong
+        self.pings = 0
+        self.pongs = 0
+
+    def ping(self):
+        '''
+        Return the next probe if one is due, else None.
+
+        Probes unanswered for "timeout" seconds are counted as lost.
+        '''
+        now = time()
+        for probe, sent in self.in_flight.items():
+            if now - sent > self.timeout:
+                del self.in_flight[probe]
+                self.loss = _ewma(self.loss, 1.0)
+        if now - self.last_ping_time < self.interval:
+            return None
+        self.last_ping_time = now
+        self.probe = (self.probe + 1) & 0xFFFF
+        self.in_flight[self.probe] = now
+        self.pings += 1
+        return 'ping:%d' % self.probe
+
+    def on_pong(self, payload):
+        '''
+        Process a pong ("payload" is what follows "pong:").
+        '''
+        fields = payload.split(':')
+        try:
+            sent = self.in_flight.pop(int(fields[0]))
+        except (ValueError, KeyError):
+            return    # malformed, or too late (already counted as lost)
+        rtt = time() - sent
+        self.pongs += 1
+        self.loss = _ewma(self.loss, 0.0)
+        if self.last_rtt != None:
+            self.jitter = _ewma(self.jitter, abs(rtt - self.last_rtt))
+        self.last_rtt = rtt
+        self.rtt = _ewma(self.rtt, rtt)
+        if len(fields) == 3:
+            self._client_counters(int(fields[1]), int(fields[2]))
+
+    def _client_counters(self, decoded, lost):
+        # One sample per pong, so that the estimate keeps up at low rates
+        # (a pong without new frames is a sample without loss)
+        if self.client_counters != None:
+            new_decoded = decoded - self.client_counters[0]
+            new_lost = lost - self.client_counters[1]
+            if new_decoded >= 0 and new_lost >= 0:    # not a new client
+                self.telemetry_loss = _ewma(self.telemetry_loss,
+                        float(new_lost) / max(1, new_decoded + new_lost))
+        self.client_counters = decoded, lost
+
+    def reset_loss(self):
+        '''
+        Forget the loss estimates (e.g. when the telemetry rate changes).
+        '''
+        self.loss = None
+        self.telemetry_loss = None
+
+    def stats(self):
+        '''
+        Return the estimates, and the probe counters, as a dictionary.
+        '''
+        return dict(rtt=self.rtt, jitter=self.jitter, loss=self.loss,
+                    telemetry_loss=self.telemetry_loss, pings=self.pings,
+                    pongs=self.pongs)
+
+
+class RateController(object):
+
+    '''
+    Choose the telemetry rate from the estimates of a LinkEstimator.
+
+    The link "level" indexes WIFI_RELAY_INTERVALS (0 is the fastest). It is
+    degraded as soon as the loss exceeds WIFI_LOSS_HIGH or the RTT
+    WIFI_RTT_HIGH, and upgraded after WIFI_UPGRADE_DELAY seconds below
+    WIFI_LOSS_LOW and WIFI_RTT_LOW; in between it stays put, so that the
+    rate does not oscillate. Levels change at most every
+    WIFI_ADAPT_INTERVAL seconds, and the loss is measured afresh after each
+    change.
+    '''
+
+    def __init__(self, estimator, intervals=WIFI_RELAY_INTERVALS):
+        self.estimator = estimator
+        self.intervals = intervals
+        self.level = 0
+        self.last_change = 0
+        self.good_since = None
+
+    @property
+    def relay_interval(self):
+        '''
+        Minimum time between two relayed telemetry frames, in seconds.
+        '''
+        return self.intervals[self.level]
+
+    def log_interval(self, base):
+        '''
+        Return the Arduino log interval for a requested one of "base".
+
+        Both are SET_LOG_INTERVAL arguments (see log_period). Unless
+        WIFI_ADAPT_LOG_INTERVAL, only the relay is slowed down and "base"
+        is returned as is; otherwise the log is not run faster than the
+        relay.
+        '''
+        if not WIFI_ADAPT_LOG_INTERVAL or not base or \
+           log_period(base) >= self.relay_interval:
+            return base
+        return -int(round(self.relay_interval * 1000))
+
+    def update(self, silence=0):
+        '''
+        Revise the level, "silence" being the seconds since the client was
+        last heard. Return True if the level has changed.
+        '''
+        now = time()
+        estimator = self.estimator
+        loss = max(estimator.loss or 0, estimator.telemetry_loss or 0)
+        rtt = estimator.rtt or 0
+        if silence > WIFI_MAYBE_LOST:
+            bad = good = False
+            target = len(self.intervals) - 1    # keep the link barely alive
+        else:
+            bad = loss > WIFI_LOSS_HIGH or rtt > WIFI_RTT_HIGH
+            good = loss < WIFI_LOSS_LOW and rtt < WIFI_RTT_LOW
+            target = self.level
+        if not good:
+            self.good_since = None
+        elif self.good_since == None:
+            self.good_since = now
+        if bad:
+            target = min(self.level + 1, len(self.intervals) - 1)
+        elif good and now - self.good_since >= WIFI_UPGRADE_DELAY:
+            target = max(self.level - 1, 0)
+            self.good_since = now    # one level per delay
+        if target == self.level:
+            return False
+        if now - self.last_change < WIFI_ADAPT_INTERVAL and \
+           silence <= WIFI_MAYBE_LOST:
+            return False
+        self.level = target
+        self.last_change = now
+        estimator.reset_loss()
+        return True
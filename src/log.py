@@ -13,17 +13,84 @@ __license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
 
 import os.path
 import sys
+import sqlite3
+import multiprocessing
 import getopt
 import re
 import datetime
 import argparse
 import textwrap
 import zipfile
-import kmlbase
-import kmldom
-import kmlengine
+from itertools import izip, islice, groupby
+from time import strftime, strptime, localtime, mktime
+from cStringIO import StringIO
 from storm.locals import *
 from commons import *
+import telemetry
+import geodesy
+import keyhole
+import rawlog
+
+
+# Names of the pilot modes, used in the statistics
+PILOT_MODES = {
+    OFF      : 'off',
+    AUTO     : 'auto',
+    RC       : 'rc',
+    COMPUTER : 'computer',
+}
+
+# Columns of the stint_stats table (times in pilot modes sorted by mode code)
+STINT_STATS_COLUMNS = ('stint', 'start_signal', 'stop_signal', 'signals',
+                       'duration', 'distance', 'avg_speed', 'max_speed') + \
+                      tuple('time_' + PILOT_MODES[mode]
+                            for mode in sorted(PILOT_MODES))
+
+
+# Columns of the signals table
+SIGNAL_COLUMNS = ('id', 'time', 'timestamp') + \
+                 tuple(sorted(entry[0] for entry in LOG_SIGNALS.values()))
+
+# Formats of the partition names (local time of their first signal), by period
+PARTITION_FORMATS = {
+    'day'     : '%Y-%m-%d',
+    'session' : '%Y-%m-%d_%H%M%S',
+}
+
+# Schema migrations: MIGRATIONS[N] brings the schema from version N to N+1.
+# Version 0 is the schema created by LogDataBase._generate_schema. Never
+# modify a migration once released: append a new one instead.
+MIGRATIONS = [
+    (
+        # IMPORTS (byte offset reached in each imported raw log)
+        'CREATE TABLE IF NOT EXISTS imports \
+                (source VARCHAR PRIMARY KEY, offset INTEGER)',
+        # STINT_DETECTOR (state of find_stints, in a single row with id 1)
+        'CREATE TABLE IF NOT EXISTS stint_detector \
+                (id INTEGER PRIMARY KEY, previous INTEGER, \
+                start_signal INTEGER, last_positive INTEGER)',
+        # STINT_STATS (cache of get_stint_stats, see refresh_stats)
+        'CREATE TABLE IF NOT EXISTS stint_stats \
+                (stint INTEGER PRIMARY KEY, start_signal INTEGER, \
+                stop_signal INTEGER, signals INTEGER, duration REAL, \
+                distance REAL, avg_speed REAL, max_speed REAL, \
+                time_off REAL, time_auto REAL, time_rc REAL, \
+                time_computer REAL)',
+    ),
+    (
+        # Numeric unix timestamp of the signals ("time" is local time text)
+        'ALTER TABLE signals ADD COLUMN timestamp REAL',
+        "UPDATE signals SET timestamp = \
+                CAST(strftime('%s', time, 'utc') AS REAL) + \
+                CAST('0' || substr(time, 20) AS REAL)",
+        'CREATE INDEX IF NOT EXISTS signals_timestamp ON signals (timestamp)',
+        'CREATE INDEX IF NOT EXISTS signals_ardu_millis \
+                ON signals (ardu_millis)',
+        # Finding the stint of a signal
+        'CREATE INDEX IF NOT EXISTS stints_range \
+                ON stints (start_signal, stop_signal)',
+    ),
+]
 
 
 class LogDataBase(object):
@@ -32,9 +99,20 @@ class LogDataBase(object):
     Provide the interface for manipulating the Log DataBase.
     '''
 
-    def __init__(self, fname=LOG_DB_FNAME, overwrite=False):
+    def __init__(self, fname=LOG_DB_FNAME, overwrite=False, read_only=False):
+        '''
+        A "read_only" DB must exist, and is never modified through this
+        instance (the sqlite connection refuses any write).
+        '''
         self.db_file_name = fname
+        self.malformed = 0    # messages skipped by the imports
         new_db = not os.path.isfile(fname)
+        if read_only:
+            if new_db:
+                raise IOError("No such log database: %s" % fname)
+            self.store = Store(create_database('sqlite:' + fname))
+            self.store.execute('PRAGMA query_only = ON', noresult=True)
+            return
         if not new_db and overwrite:
             os.unlink(fname)
             new_db = True
@@ -42,6 +120,7 @@ class LogDataBase(object):
         self.store = Store(database)
         if new_db:
             self._generate_schema()
+        self._upgrade_schema()
 
     def _generate_schema(self):
         '''
@@ -64,52 +143,211 @@ class LogDataBase(object):
         self.store.execute(query_stint_table, noresult=True)
         self.store.commit()
 
+    def _upgrade_schema(self):
+        '''
+        Bring the schema of the DB up to date.
+
+        The version of the schema is kept in sqlite's "user_version", and is
+        the number of MIGRATIONS already applied. Each migration is applied
+        in its own transaction.
+        '''
+        version = self.store.execute('PRAGMA user_version').get_one()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+            for statement in migration:
+                self.store.execute(statement, noresult=True)
+            self.store.execute('PRAGMA user_version = %d' % number,
+                               noresult=True)
+            self.store.commit()
+
+    def signals_between(self, t0, t1, columns=None):
+        '''
+        Return the signals logged between times t0 and t1 (included).
+
+        Times are unix timestamps. "columns" is a sequence of column names of
+        the signals table (by default: all of them). The result is a list of
+        tuples with the requested columns, sorted by time.
+        '''
+        if columns == None:
+            columns = SIGNAL_COLUMNS
+        for column in columns:
+            if column not in SIGNAL_COLUMNS:
+                raise ValueError("No such signal column: %s" % column)
+        return self.store.execute('SELECT %s FROM signals WHERE timestamp \
+                BETWEEN ? AND ? ORDER BY timestamp' % ', '.join(columns),
+                (float(t0), float(t1))).get_all()
+
     def _delta_t_signals(self, signal_a, signal_b):
         '''
-        Returns the delta time in seconds between two signals.
+        Returns the delta time in seconds between two track points.
+
+        Track points are (id, latitude, longitude, ardu_millis) tuples.
+        '''
+        return (signal_b[3] - signal_a[3]) / 1000.0
+
+    def _bulk_connection(self):
+        '''
+        Return a raw sqlite connection tuned for bulk operations.
+
+        Pending ORM changes are committed first, so that the ORM does not
+        hold any lock on the database.
         '''
-        return (signal_b.ardu_millis - signal_a.ardu_millis) / 1000.0
+        self.store.commit()
+        connection = sqlite3.connect(self.db_file_name)
+        for pragma in BULK_PRAGMAS:
+            connection.execute(pragma)
+        return connection
 
-    def _check_if_moved(self, from_signal, to_signal):
+    def _insert_signals(self, connection, signals, chunk_size):
         '''
-        Return True if the boat has moved beyond threshold between the two
-        points.
+        Parse and insert signals in chunks of "chunk_size" signals.
+
+        Only one chunk at a time is held in memory. No commit is done, so
+        the caller controls the transaction. Signals whose time is already
+        in the DB (e.g. recorded live by a LiveDatabaseWriter) are skipped,
+        malformed messages too (they are counted in self.malformed).
+        Return the number of signals added.
         '''
-        space = gps_distance_between(from_signal, to_signal)
-        time = self._delta_t_signals(from_signal, to_signal)
-        return True if space / time > STINT_SPEED_THRESHOLD else False
+        number = 0
+        query = SignalColumns.insert_query()
+        iterator = iter(signals)
+        while True:
+            columns = SignalColumns()
+            read = 0
+            for signal in islice(iterator, chunk_size):
+                read += 1
+                if isinstance(signal, tuple):
+                    stamp, msg = signal
+                else:
+                    stamp, msg = signal.split(None, 1)
+                try:
+                    fields = telemetry.message_fields(msg)
+                except telemetry.MalformedFrameError:
+                    self.malformed += 1
+                    continue
+                columns.append(stamp, fields)
+            if not read:
+                return number
+            if len(columns):
+                number += connection.executemany(query,
+                                                 columns.rows()).rowcount
 
-    def add_signals(self, signals):
+    def add_signals(self, signals, chunk_size=IMPORT_CHUNK_SIZE):
         '''
         Add signals into the DB.
 
-        Input signals are a list of strings.
-        '''
-        for signal in signals:
-            tmp = Signal()
-            signal = signal.replace('!', '')
-            bits = signal.split()
-            tmp.time = datetime.datetime.fromtimestamp(float(bits[0]))
-            for bit in bits[1:]:
-                k, v = bit.split(':')
-                v = int(v) if v.find('.') == -1 else float(v)
-                setattr(tmp, LOG_SIGNALS[k][0], v)
-            self.store.add(tmp)
-        self.store.commit()
+        Input signals are an iterable of either raw log lines ("timestamp
+        !K:V ...") or (timestamp, message) tuples, where message can also be
+        a binary frame (see telemetry.BinaryCodec).
+
+        Signals are parsed into SignalColumns buffers of "chunk_size" signals
+        and inserted in a single transaction. Return the number of signals
+        added.
+        '''
+        connection = self._bulk_connection()
+        try:
+            with connection:
+                return self._insert_signals(connection, signals, chunk_size)
+        finally:
+            connection.close()
 
-    def import_log(self, infile):
+    def get_import_offset(self, infile):
+        '''
+        Return the byte offset up to which "infile" has already been imported.
         '''
-        Parse a text log and add all it's signals to the DB.
+        source = unicode(os.path.abspath(infile))
+        offset = self.store.execute('SELECT offset FROM imports WHERE '
+                                    'source = ?', (source,)).get_one()
+        return offset[0] if offset else 0
+
+    def import_log(self, infile, chunk_size=IMPORT_CHUNK_SIZE, resume=True):
         '''
-        self.add_signals(LogTextFile(infile).clean_from_debug_symbols())
+        Parse a raw log and add all it's signals to the DB.
+
+        The log is either a text log or a binary segment (see rawlog). It is
+        streamed from disk in chunks of "chunk_size" signals. The
+        byte offset reached is saved in the same transaction as the signals,
+        so that if "resume" is True only the lines appended to the log since
+        the last import are processed. Return the number of signals added.
+        '''
+        offset = self.get_import_offset(infile) if resume else 0
+        if offset > os.path.getsize(infile):
+            offset = 0    # the log has been truncated or replaced
+        log = open_raw_log(infile)
+        try:
+            return self._import_signals(infile, log.iter_signals(offset),
+                                        lambda: log.offset, chunk_size)
+        finally:
+            log.input.close()
+
+    def _import_signals(self, infile, signals, get_offset, chunk_size):
+        '''
+        Insert the signals read from "infile" and save the offset reached.
+
+        "get_offset" is called once all signals have been inserted, and its
+        result is saved in the same transaction. Return the number of signals.
+        '''
+        connection = self._bulk_connection()
+        try:
+            with connection:
+                number = self._insert_signals(connection, signals, chunk_size)
+                connection.execute('INSERT OR REPLACE INTO imports '
+                                   '(source, offset) VALUES (?, ?)',
+                                   (unicode(os.path.abspath(infile)),
+                                    get_offset()))
+        finally:
+            connection.close()
+        return number
+
+    def get_signal_range(self, t0, t1):
+        '''
+        Return the (first ID, last ID) of the signals between times t0 and t1.
+
+        Return None if there are no signals in the range.
+        '''
+        row = self.store.execute('SELECT MIN(id), MAX(id) FROM signals \
+                WHERE timestamp BETWEEN ? AND ?', (float(t0),
+                float(t1))).get_one()
+        return row if row[0] != None else None
+
+    def _get_track_point(self, signal_id):
+        '''
+        Return the track point of a signal (see _delta_t_signals).
+        '''
+        if signal_id == None:
+            return None
+        return self.store.execute('SELECT id, latitude, longitude, \
+                ardu_millis FROM signals WHERE id = ?', (signal_id,)).get_one()
+
+    def _load_stint_detector(self):
+        '''
+        Return the saved state of the stint detector.
+
+        The state is a (previous, start_signal, last_positive) tuple of track
+        points (or None). DBs that predate the saved state resume from the
+        last signal known to belong to a stint.
+        '''
+        state = self.store.execute('SELECT previous, start_signal, \
+                last_positive FROM stint_detector WHERE id = 1').get_one()
+        if state == None:
+            state = (self.store.find(Stint).max(Stint.stop_signal), None, None)
+        return tuple(self._get_track_point(i) for i in state)
+
+    def _save_stint_detector(self, previous, start_signal, last_positive):
+        ids = tuple(p[0] if p else None
+                    for p in (previous, start_signal, last_positive))
+        self.store.execute('INSERT OR REPLACE INTO stint_detector \
+                (id, previous, start_signal, last_positive) \
+                VALUES (1, ?, ?, ?)', ids, noresult=True)
 
     def find_stints(self, from_id=None, to_id=None, db_save=False):
         '''
         Find stints in a record set.
 
-        from_id and to_id identify the search pool. They default to the signal
-        id following the last signal already belonging to a stint and to the
-        last signal in the database respectively.
+        from_id and to_id identify the search pool. If from_id is omitted,
+        the search resumes exactly where the last saved search stopped (the
+        state of the detector is saved in the DB together with the stints),
+        so that results are identical to those of a full rescan. to_id
+        defaults to the last signal in the database.
 
         If db_save is set to True, stints are saved with canned names in
         the database.
@@ -120,50 +358,70 @@ class LogDataBase(object):
         which the boat kept on moving at at least STINT_SPEED_THRESHOLD m/s
         within units of time of the duration of STINT_TIME_SAMPLE s.
         '''
-
-        # If not passed, the range is all signals after last recorded stint.
+        track_query = 'SELECT id, latitude, longitude, ardu_millis \
+                FROM signals WHERE id %s ? AND id <= ? ORDER BY id'
+        # Resume from the saved state, or start afresh from from_id.
         if from_id == None:
-            from_id = self.store.find(Stint).max(Stint.stop_signal)
-            from_id = from_id if from_id else 0  # If no stints found...
+            previous, start_signal, last_positive = self._load_stint_detector()
+        else:
+            previous, start_signal, last_positive = None, None, None
         if to_id == None:
             to_id = self.store.find(Signal).max(Signal.id)
             if to_id == None:  # DB is empty
                 return []
-        result = self.store.find(Signal, Signal.id >= from_id,
-                                 Signal.id <= to_id).order_by(Signal.id)
-        # Start looking for stints
+        if previous == None:
+            previous = self.store.execute(track_query % '>=' + ' LIMIT 1',
+                                          (from_id or 0, to_id)).get_one()
+            if previous == None:
+                return []
+        # Stream the track points in chunks and look for stints. The boat
+        # is moving between two points if its speed exceeds the threshold.
         stints = []
-        start_signal = None
-        last_positive = None
-        previous = result[0]
-        for current in result[1:]:
-            if self._check_if_moved(previous, current):
-                if not start_signal:
-                    start_signal = previous
-                last_positive = current
-            else:
-                if start_signal:
-                    if self._delta_t_signals(last_positive, current) > \
-                       STINT_MAX_STILL_TIME:
-                        if self._delta_t_signals(start_signal, last_positive) \
-                           > STINT_MINIMUM_LENGTH:
-                            stints.append((start_signal.id, last_positive.id))
-                        start_signal = None
-                        last_positive = None
-            previous = current
+        result = iter(self.store.execute(track_query % '>',
+                                         (previous[0], to_id)))
+        while True:
+            chunk = list(islice(result, TRACK_CHUNK_SIZE))
+            if not chunk:
+                break
+            points = [previous] + chunk
+            speeds = geodesy.track_segments([p[1] for p in points],
+                                            [p[2] for p in points],
+                                            [p[3] for p in points])[1]
+            for current, speed in izip(chunk, speeds):
+                if speed > STINT_SPEED_THRESHOLD:
+                    if not start_signal:
+                        start_signal = previous
+                    last_positive = current
+                else:
+                    if start_signal:
+                        if self._delta_t_signals(last_positive, current) > \
+                           STINT_MAX_STILL_TIME:
+                            if self._delta_t_signals(start_signal,
+                                    last_positive) > STINT_MINIMUM_LENGTH:
+                                stints.append((start_signal[0],
+                                               last_positive[0]))
+                            start_signal = None
+                            last_positive = None
+                previous = current
         if db_save == True:
-            print "hei!"
             for stint in stints:
                 self.store.add(Stint(stint[0], stint[1]))
+            if from_id == None:
+                self._save_stint_detector(previous, start_signal,
+                                          last_positive)
             self.store.commit()
         return stints
 
-    def get_kml(self, param):
+    def write_kml(self, param, out, placemark_every=KML_PLACEMARK_EVERY):
         '''
-        Return the kml file of a given range.
+        Write the kml file of a given range to the file-like object "out".
 
         It is possible to pass either a range (signal_first_id, signal_last_id)
-        or a stint ID.
+        or a stint ID. A placemark with the details of the signal is added
+        every "placemark_every" signals (never, if 0).
+
+        The document is streamed: signals are read and written in chunks, so
+        memory use does not depend on the length of the range.
         '''
         if not isinstance(param, tuple):
             stint = self.store.get(Stint, param)
@@ -172,58 +430,153 @@ class LogDataBase(object):
         else:
             stint = None
             start, stop = param
-        signals = self.store.find(Signal,
-                                  And(Signal.id >= start, Signal.id <= stop))
-        factory = kmldom.KmlFactory_GetFactory()
-        # Create the embedding document
-        document = factory.CreateDocument()
-        document.set_name("MagellanMachine sailing")
-        # Create the style
-        line_style = factory.CreateLineStyle()
-        line_style.set_color(kmlbase.Color32('7f00ffff'))
-        line_style.set_width(4)
-        style = factory.CreateStyle()
-        style.set_id("mmstyle")
-        style.set_linestyle(line_style)
-        document.add_styleselector(style)
-        # Create the placemarks
-        placemark = factory.CreatePlacemark()
-        placemark.set_name("Name Foo Bar!")
-        placemark.set_styleurl("#mmstyle")
-        coordinates = factory.CreateCoordinates()
+        writer = keyhole.KmlWriter(out)
+        writer.start_document("MagellanMachine sailing")
+        writer.line_style("mmstyle", '7f00ffff', 4)
+        self._write_kml_range(writer, start, stop, placemark_every,
+                              "Name Foo Bar!")
+        writer.end_document()
+
+    def _write_kml_range(self, writer, start, stop, placemark_every, name):
+        '''
+        Write the placemarks and the track of signals start to stop (included).
+        '''
+        query = 'SELECT %s FROM signals WHERE id >= ? AND id <= ? ORDER BY id'
+        # Individual signals
+        if placemark_every:
+            result = iter(self.store.execute(query % 'id, latitude, \
+                    longitude, ardu_millis, north, rudder_position, \
+                    sail_position', (start, stop)))
+            prev = None
+            index = 0
+            while True:
+                chunk = list(islice(result, TRACK_CHUNK_SIZE))
+                if not chunk:
+                    break
+                points = [prev] + chunk if prev else chunk
+                speeds = geodesy.track_segments([p[1] for p in points],
+                                                [p[2] for p in points],
+                                                [p[3] for p in points])[1]
+                if not prev:
+                    speeds = [None] + list(speeds)
+                for signal, speed in izip(chunk, speeds):
+                    if index % placemark_every == 0 and \
+                       None not in signal[1:3]:
+                        msg = ''
+                        msg += 'North: ' + str(signal[4])
+                        msg += '\nRudder: ' + str(signal[5])
+                        msg += '\nSail: ' + str(signal[6])
+                        if speed != None:    # in m/s
+                            msg += '\nSpeed (cm/s): ' + str(int(speed * 100))
+                            msg += '\nSpeed (km/h): ' + \
+                                   str('%.2f' % (speed * 3.6))
+                        writer.point("#" + str(signal[0]), msg,
+                                     signal[1], signal[2])
+                    index += 1
+                prev = chunk[-1]
+        # The track
+        writer.start_track(name, "#mmstyle")
+        result = iter(self.store.execute(query % 'latitude, longitude',
+                                         (start, stop)))
+        while True:
+            chunk = list(islice(result, TRACK_CHUNK_SIZE))
+            if not chunk:
+                break
+            writer.track_points(chunk)
+        writer.end_track()
+
+    def get_kml(self, param, placemark_every=KML_PLACEMARK_EVERY):
+        '''
+        Return the kml file of a given range as a string (see write_kml).
+        '''
+        out = StringIO()
+        self.write_kml(param, out, placemark_every)
+        return out.getvalue()
+
+    def _compute_stint_stats(self, stint):
+        '''
+        Compute the statistics of a stint in one streaming pass.
+
+        Return the values of the stint_stats columns, in table order.
+        '''
+        number = distance = max_speed = 0
+        first_millis = last_millis = None
+        mode_times = dict((mode, 0.0) for mode in PILOT_MODES)
+        result = iter(self.store.execute('SELECT latitude, longitude, \
+                ardu_millis, pilot_mode FROM signals WHERE id >= ? AND \
+                id <= ? ORDER BY id', (stint.start_signal, stint.stop_signal)))
         prev = None
-        for signal in signals:
-            coordinates.add_latlng(signal.latitude, signal.longitude)
-            # Individual signals
-            tmp = factory.CreatePlacemark()
-            tmp.set_name("#" + str(signal.id))
-            msg = ''
-            msg += 'North: ' + str(signal.north)
-            msg += '\nRudder: ' + str(signal.rudder_position)
-            msg += '\nSail: ' + str(signal.sail_position)
-            if prev:
-                m = gps_distance_between(prev, signal)
-                ms = signal.ardu_millis - prev.ardu_millis
-                speed = m / ms
-                msg += '\nSpeed (cm/s): ' + str(int(speed * 100000))
-                msg += '\nSpeed (km/h): ' + str('%.2f' % (speed * 3600))
-            tmp.set_description(msg)
-            point = factory.CreatePoint()
-            pcoord = factory.CreateCoordinates()
-            pcoord.add_latlng(signal.latitude, signal.longitude)
-            point.set_coordinates(pcoord)
-            tmp.set_geometry(point)
-            document.add_feature(tmp)
-            prev = signal
-        document.add_feature(placemark)
-        linestring = factory.CreateLineString()
-        linestring.set_tessellate(True)
-        linestring.set_coordinates(coordinates)
-        placemark.set_geometry(linestring)
-        # Create the KML file
-        kml = factory.CreateKml()
-        kml.set_feature(document)
-        return kmldom.SerializePretty(kml)
+        while True:
+            chunk = list(islice(result, TRACK_CHUNK_SIZE))
+            if not chunk:
+                break
+            number += len(chunk)
+            points = [prev] + chunk if prev else chunk
+            distances, speeds, cumulative = geodesy.track_segments(
+                    [p[0] for p in points], [p[1] for p in points],
+                    [p[2] for p in points])
+            if len(speeds):
+                distance += cumulative[-1]
+                max_speed = max(max_speed, max(speeds))
+            for a, b in izip(points, points[1:]):
+                if a[2] != None and b[2] != None and a[3] in mode_times:
+                    mode_times[a[3]] += (b[2] - a[2]) / 1000.0
+            for point in chunk:
+                if point[2] != None:
+                    if first_millis == None:
+                        first_millis = point[2]
+                    last_millis = point[2]
+            prev = chunk[-1]
+        duration = (last_millis - first_millis) / 1000.0 \
+                   if first_millis != None else 0.0
+        avg_speed = distance / duration if duration else 0.0
+        return ((stint.id, stint.start_signal, stint.stop_signal, number,
+                duration, distance, avg_speed, max_speed) +
+                tuple(mode_times[mode] for mode in sorted(PILOT_MODES)))
+
+    def refresh_stats(self):
+        '''
+        Update the stint statistics cache, return the number of stints updated.
+
+        Only the stints that are new, or whose signal range has changed since
+        their statistics were computed, are processed.
+        '''
+        stale = self.store.execute('SELECT stints.id FROM stints LEFT JOIN \
+                stint_stats ON stints.id = stint_stats.stint WHERE \
+                stint_stats.stint IS NULL OR \
+                stint_stats.start_signal != stints.start_signal OR \
+                stint_stats.stop_signal != stints.stop_signal').get_all()
+        query = 'INSERT OR REPLACE INTO stint_stats VALUES (%s)' % \
+                ', '.join('?' * len(STINT_STATS_COLUMNS))
+        for stint_id, in stale:
+            values = self._compute_stint_stats(self.store.get(Stint, stint_id))
+            self.store.execute(query, values, noresult=True)
+        # Forget the statistics of the stints that have been deleted
+        self.store.execute('DELETE FROM stint_stats WHERE stint NOT IN \
+                (SELECT id FROM stints)', noresult=True)
+        self.store.commit()
+        return len(stale)
+
+    def get_stint_stats(self, stint_id):
+        '''
+        Return a dictionary containing statistics about a stint.
+
+        Keys:
+        stint               the stint ID
+        start_signal        first signal of the stint
+        stop_signal         last signal of the stint
+        signals             number of signals in the stint
+        duration            duration in seconds
+        distance            distance sailed in metres
+        avg_speed           average speed in m/s
+        max_speed           maximum speed in m/s
+        time_<mode>         seconds spent in each pilot mode (off, auto, rc
+                            and computer)
+        '''
+        self.refresh_stats()
+        row = self.store.execute('SELECT * FROM stint_stats WHERE stint = ?',
+                                 (stint_id,)).get_one()
+        return dict(zip(STINT_STATS_COLUMNS, row)) if row else None
 
     def get_db_stats(self):
         '''
@@ -235,13 +588,21 @@ class LogDataBase(object):
         stint_number        number of stints
         orphans             number of log_signals not belonging to a stint
         stints              a list of "get_stint_stats" dictionaries
+
+        Stint statistics come from a cache, refreshed only for the stints
+        whose signal range has changed.
         '''
+        self.refresh_stats()
         result = {}
         result['size'] = os.path.getsize(self.db_file_name)
-        result['signal_number'] = None
-        result['stint_number'] = None
-        result['orphans'] = None
-        result['stints'] = None
+        result['signal_number'] = self.store.execute(
+                'SELECT COUNT(*) FROM signals').get_one()[0]
+        result['stints'] = [dict(zip(STINT_STATS_COLUMNS, row)) for row in
+                self.store.execute('SELECT * FROM stint_stats ORDER BY stint')]
+        result['stint_number'] = len(result['stints'])
+        result['orphans'] = result['signal_number'] - \
+                sum(stint['signals'] for stint in result['stints'])
+        return result
 
 
 class StormIntrospective(type):
@@ -269,6 +630,7 @@ class Signal(object):
     __storm_table__ = "signals"
     id = Int(primary=True)
     time = DateTime()
+    timestamp = Float()
     moreattrs = {}
     for entry in LOG_SIGNALS.values():
         if entry[2] == 'INTEGER':
@@ -297,6 +659,62 @@ class Stint(object):
         self.description = description
 
 
+class SignalColumns(object):
+
+    '''
+    Columnar buffer of signals, ready to be bulk-inserted in table 'signals'.
+
+    There is one list per column, in schema order. Values are converted to
+    the type declared in LOG_SIGNALS, and missing ones are None (NULL).
+    Timestamps are rounded to the millisecond, the precision of the text
+    raw log (see rawlog.TextLogWriter), so that a signal recorded live, in
+    a binary segment or in a text log is always stored with the same time,
+    and imported only once.
+    '''
+
+    COLUMNS = list(SIGNAL_COLUMNS[1:])
+    GROWTH = 4096    # rows allocated at once
+
+    def __init__(self):
+        self.columns = [[] for column in self.COLUMNS]
+        self.index = dict((key, self.COLUMNS.index(entry[0]))
+                          for key, entry in LOG_SIGNALS.iteritems())
+        self.size = 0
+        self.capacity = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, stamp, fields):
+        '''
+        Add a signal, given its timestamp and its [(key, value), ...] list.
+        '''
+        if self.size == self.capacity:
+            for column in self.columns:
+                column.extend([None] * self.GROWTH)
+            self.capacity += self.GROWTH
+        columns = self.columns
+        index = self.index
+        row = self.size
+        stamp = float('%.3f' % float(stamp))
+        columns[0][row] = str(datetime.datetime.fromtimestamp(stamp))
+        columns[1][row] = stamp
+        for key, value in fields:
+            columns[index[key]][row] = value
+        self.size += 1
+
+    @classmethod
+    def insert_query(cls):
+        return 'INSERT OR IGNORE INTO signals (%s) VALUES (%s)' % \
+               (', '.join(cls.COLUMNS), ', '.join('?' * len(cls.COLUMNS)))
+
+    def rows(self):
+        '''
+        Return an iterator over the buffered signals, as tuples.
+        '''
+        return islice(izip(*self.columns), self.size)
+
+
 class LogTextFile(object):
 
     '''
@@ -304,22 +722,53 @@ class LogTextFile(object):
     '''
 
     def __init__(self, input_file=LOG_RAW_FNAME):
-        self.input = open(input_file, 'r')
+        self.input = open(input_file, 'rb')
+        self.offset = 0
 
-    def clean_from_debug_symbols(self):
+    def iter_signals(self, offset=0):
         '''
-        Remove all non-logging signals from the raw_log.
+        Yield the logging signals of the raw_log, starting at byte "offset".
 
         It uses a regex to do this: all log messages are identified as those
         lines beginning with a timestamp, followed by a space, followed by an
-        exclamation mark.
+        exclamation mark. A last line with no newline is still being written
+        and is ignored. "self.offset" is kept at the byte following the last
+        line read.
         '''
         cregex = re.compile('^\d+\.\d+ !')
-        output = []
-        for line in self.input.readlines():
+        self.input.seek(offset)
+        self.offset = offset
+        for line in iter(self.input.readline, ''):
+            if not line.endswith('\n'):
+                break
+            self.offset += len(line)
             if cregex.match(line):
-                output.append(line)
-        return output
+                yield line
+
+    def clean_from_debug_symbols(self):
+        '''
+        Remove all non-logging signals from the raw_log.
+
+        Return the list of the logging signals (see iter_signals).
+        '''
+        return list(self.iter_signals())
+
+    def iter_records(self):
+        '''
+        Yield all the (timestamp, message) records of the log.
+
+        Lines without a timestamp are skipped, as well as a last line with
+        no newline (see iter_signals).
+        '''
+        self.input.seek(0)
+        for line in self.input:
+            if not line.endswith('\n'):
+                break
+            bits = line.rstrip('\r\n').split(' ', 1)
+            try:
+                yield float(bits[0]), bits[1] if len(bits) > 1 else ''
+            except ValueError:
+                pass
 
     def manipulate(self, output_file=None, clean_only=False, stints=False,
                    verbose=False, overwrite=False, **kwargs):
@@ -359,6 +808,508 @@ class LogTextFile(object):
                         % len(stints)
 
 
+def open_raw_log(fname):
+    '''
+    Return a reader for a raw log: a rawlog.RawLogReader for a binary
+    segment, a LogTextFile otherwise.
+    '''
+    if rawlog.is_segment(fname):
+        return rawlog.RawLogReader(fname)
+    return LogTextFile(fname)
+
+
+def signal_stamp(signal):
+    '''
+    Return the timestamp of a signal, as yielded by the raw log readers.
+    '''
+    if isinstance(signal, tuple):
+        return float(signal[0])
+    return float(signal.split(None, 1)[0])
+
+
+class PartitionedLog(object):
+
+    '''
+    Provide the interface for a log split into one DB per day or per session.
+
+    Each partition is a regular LogDataBase file in the log directory. A
+    small catalog DB lists the partitions with the time range of their
+    signals, so that queries only open the partitions overlapping the range
+    they are asked about. Stint IDs are local to their partition.
+
+    With the 'day' period a new partition starts at local midnight, with
+    the 'session' period whenever nothing has been logged for
+    LOG_SESSION_GAP seconds. Stints never span two partitions.
+    '''
+
+    def __init__(self, directory=LOG_PARTITIONS_DIR, period=None,
+                 overwrite=False, read_only=False):
+        '''
+        "period" is either 'day' or 'session'. It is saved in the catalog of
+        a new log (default: 'day') and, if given, must match it afterwards.
+        '''
+        if period != None and period not in PARTITION_FORMATS:
+            raise ValueError("No such partition period: %s" % period)
+        self.directory = directory
+        self.read_only = read_only
+        self.databases = {}
+        self.catalog_file_name = os.path.join(directory, LOG_CATALOG_FNAME)
+        if read_only and not os.path.isfile(self.catalog_file_name):
+            raise IOError("No such log catalog: %s" % self.catalog_file_name)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if overwrite and os.path.isfile(self.catalog_file_name):
+            self.catalog = Store(create_database('sqlite:' +
+                                                 self.catalog_file_name))
+            for name in self.get_partitions():
+                os.unlink(self._partition_file(name))
+            self.catalog.close()
+            os.unlink(self.catalog_file_name)
+        new_catalog = not os.path.isfile(self.catalog_file_name)
+        self.catalog = Store(create_database('sqlite:' +
+                                             self.catalog_file_name))
+        if read_only:
+            self.catalog.execute('PRAGMA query_only = ON', noresult=True)
+        if new_catalog:
+            self._generate_catalog(period or 'day')
+        self.period = self.catalog.execute("SELECT value FROM settings \
+                WHERE name = 'period'").get_one()[0]
+        if period != None and period != self.period:
+            raise ValueError("The log in %s is partitioned by %s" %
+                             (directory, self.period))
+
+    def _generate_catalog(self, period):
+        # SETTINGS (name/value pairs, e.g. the partition period)
+        self.catalog.execute('CREATE TABLE settings \
+                (name VARCHAR PRIMARY KEY, value VARCHAR)', noresult=True)
+        # PARTITIONS (time range and number of signals of each partition)
+        self.catalog.execute('CREATE TABLE partitions \
+                (name VARCHAR PRIMARY KEY, first_time REAL, last_time REAL, \
+                signals INTEGER)', noresult=True)
+        # IMPORTS (byte offset reached in each imported raw log, and the
+        # partition being written to, if the import has been interrupted)
+        self.catalog.execute('CREATE TABLE imports \
+                (source VARCHAR PRIMARY KEY, offset INTEGER, \
+                pending VARCHAR)', noresult=True)
+        self.catalog.execute("INSERT INTO settings (name, value) \
+                VALUES ('period', ?)", (unicode(period),), noresult=True)
+        self.catalog.commit()
+
+    def _partition_file(self, name):
+        return os.path.join(self.directory, name + '.sqlite')
+
+    def get_database(self, name):
+        '''
+        Return the LogDataBase of a partition (opened once, then cached).
+        '''
+        db = self.databases.get(name)
+        if db == None:
+            db = LogDataBase(self._partition_file(name),
+                             read_only=self.read_only)
+            self.databases[name] = db
+        return db
+
+    def get_partitions(self, t0=None, t1=None):
+        '''
+        Return the names of the partitions with signals between t0 and t1.
+
+        Times are unix timestamps (None for no bound). Names are sorted by
+        the time of the first signal of the partition.
+        '''
+        query = 'SELECT name FROM partitions WHERE signals > 0'
+        parameters = []
+        if t0 != None:
+            query += ' AND last_time >= ?'
+            parameters.append(float(t0))
+        if t1 != None:
+            query += ' AND first_time <= ?'
+            parameters.append(float(t1))
+        query += ' ORDER BY first_time'
+        return [row[0] for row in self.catalog.execute(query, parameters)]
+
+    def _update_catalog(self, name):
+        '''
+        Refresh the catalog entry of a partition (the caller commits).
+        '''
+        store = self.get_database(name).store
+        row = store.execute('SELECT MIN(timestamp), MAX(timestamp), \
+                COUNT(*) FROM signals').get_one()
+        store.commit()    # do not keep the partition locked
+        self.catalog.execute('INSERT OR REPLACE INTO partitions \
+                (name, first_time, last_time, signals) VALUES (?, ?, ?, ?)',
+                (name,) + tuple(row), noresult=True)
+
+    def rebuild_catalog(self):
+        '''
+        Rebuild the list of partitions from the DB files in the directory.
+
+        Useful after partition files have been restored or removed by hand.
+        '''
+        self.catalog.execute('DELETE FROM partitions', noresult=True)
+        for fname in sorted(os.listdir(self.directory)):
+            if fname.endswith('.sqlite') and fname != LOG_CATALOG_FNAME:
+                self._update_catalog(unicode(fname[:-len('.sqlite')]))
+        self.catalog.commit()
+
+    def _partition_namer(self):
+        '''
+        Return a function giving the partition of a signal from its timestamp.
+
+        The function must be called on signals in log order.
+        '''
+        format = PARTITION_FORMATS[self.period]
+        if self.period == 'day':
+            return lambda stamp: unicode(strftime(format, localtime(stamp)))
+        # A session goes on (possibly from the previous import) until a gap
+        # longer than LOG_SESSION_GAP is found.
+        session = list(self.catalog.execute('SELECT name, last_time FROM \
+                partitions ORDER BY last_time DESC LIMIT 1').get_one() or
+                (None, None))
+        def namer(stamp):
+            if session[1] == None or \
+               not 0 <= stamp - session[1] <= LOG_SESSION_GAP:
+                session[0] = unicode(strftime(format, localtime(stamp)))
+            session[1] = stamp
+            return session[0]
+        return namer
+
+    def _set_import_offset(self, source, offset, pending):
+        self.catalog.execute('INSERT OR REPLACE INTO imports \
+                (source, offset, pending) VALUES (?, ?, ?)',
+                (source, offset, pending), noresult=True)
+        self.catalog.commit()
+
+    def get_import_offset(self, infile):
+        '''
+        Return the byte offset up to which "infile" has already been imported.
+
+        If the last import was interrupted, the offset saved in the partition
+        it was writing to is authoritative, and the catalog is fixed.
+        '''
+        source = unicode(os.path.abspath(infile))
+        row = self.catalog.execute('SELECT offset, pending FROM imports \
+                WHERE source = ?', (source,)).get_one()
+        if row == None:
+            return 0
+        offset, pending = row
+        if pending != None and not self.read_only and \
+           os.path.isfile(self._partition_file(pending)):
+            offset = max(offset,
+                         self.get_database(pending).get_import_offset(infile))
+            self._update_catalog(pending)
+            self._set_import_offset(source, offset, None)
+        return offset
+
+    def import_log(self, infile, chunk_size=IMPORT_CHUNK_SIZE, resume=True):
+        '''
+        Parse a raw log and add its signals to the partitions they belong to.
+
+        Each run of consecutive signals of the same partition is imported in
+        one transaction of that partition, together with the byte offset
+        reached (see LogDataBase.import_log). The catalog records which
+        partition is being written to, so that an interrupted import resumes
+        correctly. Return the number of signals added.
+        '''
+        source = unicode(os.path.abspath(infile))
+        offset = self.get_import_offset(infile) if resume else 0
+        if offset > os.path.getsize(infile):
+            offset = 0    # the log has been truncated or replaced
+        log = open_raw_log(infile)
+        namer = self._partition_namer()
+        number = 0
+        reached = [offset]
+        def signals(run):
+            for line, end in run:
+                reached[0] = end
+                yield line
+        try:
+            # log.offset is at the end of each signal when it is yielded
+            lines = ((line, log.offset) for line in log.iter_signals(offset))
+            for name, run in groupby(lines, lambda line:
+                                     namer(signal_stamp(line[0]))):
+                self._set_import_offset(source, reached[0], name)
+                number += self.get_database(name)._import_signals(infile,
+                        signals(run), lambda: reached[0], chunk_size)
+                self._update_catalog(name)
+                self._set_import_offset(source, reached[0], None)
+        finally:
+            log.input.close()
+        return number
+
+    def signals_between(self, t0, t1, columns=None):
+        '''
+        Return the signals logged between times t0 and t1 (included).
+
+        See LogDataBase.signals_between.
+        '''
+        result = []
+        for name in self.get_partitions(t0, t1):
+            result.extend(self.get_database(name).signals_between(t0, t1,
+                                                                  columns))
+        return result
+
+    def find_stints(self, db_save=False, t0=None, t1=None):
+        '''
+        Find stints in the partitions with signals between t0 and t1.
+
+        The search resumes where the last saved search of each partition
+        stopped (see LogDataBase.find_stints). Return a list of stints in
+        the form [(partition, start_id, end_id), ...]
+        '''
+        stints = []
+        for name in self.get_partitions(t0, t1):
+            db = self.get_database(name)
+            stints.extend((name,) + stint for stint in
+                          db.find_stints(db_save=db_save))
+            if db_save:
+                db.refresh_stats()
+        return stints
+
+    def get_stints(self, t0=None, t1=None):
+        '''
+        Return the saved stints overlapping the time range t0 to t1.
+
+        The result is a list of (partition, stint ID, start time, stop time)
+        tuples, sorted by time.
+        '''
+        t0 = float('-inf') if t0 == None else float(t0)
+        t1 = float('inf') if t1 == None else float(t1)
+        stints = []
+        for name in self.get_partitions(t0, t1):
+            stints.extend((name,) + tuple(row) for row in
+                    self.get_database(name).store.execute('SELECT stints.id, \
+                    a.timestamp, b.timestamp FROM stints \
+                    JOIN signals AS a ON a.id = stints.start_signal \
+                    JOIN signals AS b ON b.id = stints.stop_signal \
+                    WHERE b.timestamp >= ? AND a.timestamp <= ? \
+                    ORDER BY a.timestamp', (t0, t1)))
+        return stints
+
+    def write_kml(self, t0, t1, out, placemark_every=KML_PLACEMARK_EVERY):
+        '''
+        Write the kml file of the signals between times t0 and t1 to "out".
+
+        There is one track per partition (see LogDataBase.write_kml).
+        '''
+        writer = keyhole.KmlWriter(out)
+        writer.start_document("MagellanMachine sailing")
+        writer.line_style("mmstyle", '7f00ffff', 4)
+        for name in self.get_partitions(t0, t1):
+            db = self.get_database(name)
+            signal_range = db.get_signal_range(t0, t1)
+            if signal_range:
+                db._write_kml_range(writer, signal_range[0], signal_range[1],
+                                    placemark_every, name)
+        writer.end_document()
+
+    @property
+    def malformed(self):
+        '''
+        Number of messages skipped by the imports, over all the partitions.
+        '''
+        return sum(db.malformed for db in self.databases.itervalues())
+
+    def get_db_stats(self, t0=None, t1=None):
+        '''
+        Return statistics about the partitions with signals between t0 and t1.
+
+        Keys are those of LogDataBase.get_db_stats, summed over the
+        partitions (the size includes the catalog), plus "partitions", the
+        list of the partition names. Each stint has a "partition" key.
+        '''
+        result = dict(size=os.path.getsize(self.catalog_file_name),
+                      signal_number=0, stint_number=0, orphans=0, stints=[],
+                      partitions=self.get_partitions(t0, t1))
+        for name in result['partitions']:
+            stats = self.get_database(name).get_db_stats()
+            for key in ('size', 'signal_number', 'stint_number', 'orphans'):
+                result[key] += stats[key]
+            for stint in stats['stints']:
+                stint['partition'] = name
+            result['stints'].extend(stats['stints'])
+        return result
+
+
+class LiveDatabaseWriter(object):
+
+    '''
+    Raw log writer (see rawlog) recording the log messages straight into a
+    LogDataBase, so that no import is needed after the session.
+
+    Meant to run behind a rawlog.AsyncLogWriter, off the UI thread. Signals
+    are committed in one transaction every "batch_frames" signals or
+    "batch_interval" seconds, on a WAL connection (LIVE_PRAGMAS), so the DB
+    can be read meanwhile. Every "stint_interval" seconds, and on close,
+    stints are searched among the new signals only (the detector resumes
+    from its saved state) and their statistics computed, so that closing
+    never costs more than one interval of signals.
+    '''
+
+    def __init__(self, fname=LOG_DB_FNAME, batch_frames=LOG_LIVE_BATCH_FRAMES,
+                 batch_interval=LOG_LIVE_BATCH_INTERVAL,
+                 stint_interval=LOG_LIVE_STINT_INTERVAL):
+        LogDataBase(fname).store.close()    # create or upgrade the schema
+        self.fname = fname
+        self.batch_frames = batch_frames
+        self.fsync_interval = batch_interval
+        self.stint_interval = stint_interval
+        self.connection = None    # opened by the thread using the writer
+        self.db = None            # idem, for the stint search
+        self.last_stint_search = time()
+        self.columns = SignalColumns()
+        self.pending_bytes = 0
+        self.records = 0
+        self.bytes_written = 0
+        self.malformed = 0
+        self.last_sync = time()
+
+    def write(self, stamp, msg):
+        '''
+        Buffer a message received at unix time "stamp" (if it carries data).
+        '''
+        if not msg or not telemetry.is_log_message(msg):
+            return
+        try:
+            fields = telemetry.message_fields(msg)
+        except telemetry.MalformedFrameError:
+            self.malformed += 1
+            return
+        self.columns.append(stamp, fields)
+        self.pending_bytes += len(msg)
+
+    def sync(self, force=False):
+        '''
+        Commit the buffered signals if the batch is complete or due.
+
+        Return True if a transaction has been committed.
+        '''
+        if not len(self.columns):
+            self.last_sync = time()
+            return False
+        if not force and len(self.columns) < self.batch_frames and \
+           time() - self.last_sync < self.fsync_interval:
+            return False
+        if self.connection == None:
+            self.connection = sqlite3.connect(self.fname)
+            for pragma in LIVE_PRAGMAS:
+                self.connection.execute(pragma)
+        with self.connection:
+            self.connection.executemany(SignalColumns.insert_query(),
+                                        self.columns.rows())
+        self.records += len(self.columns)
+        self.bytes_written += self.pending_bytes
+        self.columns = SignalColumns()
+        self.pending_bytes = 0
+        self.last_sync = time()
+        if time() - self.last_stint_search >= self.stint_interval:
+            self.find_stints()
+        return True
+
+    def find_stints(self):
+        '''
+        Search stints among the signals committed since the last search.
+        '''
+        if self.db == None:
+            self.db = LogDataBase(self.fname)
+        if self.db.find_stints(db_save=True):
+            self.db.refresh_stats()
+        self.last_stint_search = time()
+
+    def close(self):
+        self.sync(force=True)
+        if self.connection != None:
+            self.connection.close()
+        if self.records:
+            self.find_stints()
+        if self.db != None:
+            self.db.store.close()
+
+
+# -----------------------------------------------------------------------------
+# --- EXPORT WORKERS (module level, as they run in a multiprocessing pool)
+# -----------------------------------------------------------------------------
+
+_export_db = None    # the read-only log (LogDataBase or PartitionedLog)
+                     # of the worker process
+
+def _init_export_worker(infile):
+    global _export_db
+    if os.path.isdir(infile):
+        _export_db = PartitionedLog(infile, read_only=True)
+    else:
+        _export_db = LogDataBase(infile, read_only=True)
+
+def _stint_name(stint):
+    '''
+    Return the name of a stint: its ID, or "partition:ID" in a partitioned
+    log.
+    '''
+    return '%s:%d' % stint if isinstance(stint, tuple) else str(stint)
+
+def _stint_kml_writer(stint, placemarks):
+    '''
+    Return a function writing the KML of a stint to a file-like object.
+
+    Raise LookupError if the stint is not in the log of the worker.
+    '''
+    if isinstance(_export_db, PartitionedLog):
+        if not isinstance(stint, tuple):
+            raise LookupError("stints of a partitioned log are given as "
+                              "PARTITION:ID")
+        for name, stint_id, t0, t1 in _export_db.get_stints():
+            if (name, stint_id) == stint:
+                return lambda out: _export_db.write_kml(t0, t1, out,
+                                                        placemarks)
+    elif isinstance(stint, tuple):
+        raise LookupError("not a partitioned log: %s" %
+                          _export_db.db_file_name)
+    elif _export_db.store.get(Stint, stint) != None:
+        return lambda out: _export_db.write_kml(stint, out, placemarks)
+    raise LookupError("no stint %s" % _stint_name(stint))
+
+def _export_stint(args):
+    '''
+    Export a stint as a KML or KMZ file.
+
+    Return a (stint, file name, size in bytes, seconds, error) tuple, where
+    error is None on success and a description of the problem otherwise.
+    '''
+    stint, outfile, zip, placemarks = args
+    basename = outfile + _stint_name(stint).replace(':', '_')
+    fname = basename + ('.kmz' if zip else '.kml')
+    start = time()
+    try:
+        write_kml = _stint_kml_writer(stint, placemarks)
+        if zip:
+            # The KML is streamed to a temporary file, then compressed
+            kml_fname = fname + '.tmp'
+            try:
+                file = open(kml_fname, 'w')
+                try:
+                    write_kml(file)
+                finally:
+                    file.close()
+                archive = zipfile.ZipFile(fname, 'w', zipfile.ZIP_DEFLATED)
+                try:
+                    archive.write(kml_fname,
+                                  os.path.basename(basename + '.kml'))
+                finally:
+                    archive.close()
+            finally:
+                if os.path.exists(kml_fname):
+                    os.remove(kml_fname)
+        else:
+            file = open(fname, 'w')
+            try:
+                write_kml(file)
+            finally:
+                file.close()
+    except Exception as e:
+        return stint, fname, 0, time() - start, '%s: %s' % \
+               (e.__class__.__name__, e)
+    return stint, fname, os.path.getsize(fname), time() - start, None
+
+
 class CommandLine(object):
 
     '''
@@ -375,7 +1326,9 @@ class CommandLine(object):
         # Create main parser
         parser = argparse.ArgumentParser(
             description='''Utility for processing logs generated by the
-                           MagellanMachine project.''',
+                           MagellanMachine project. A log DB is either a
+                           sqlite file or a directory of partitions (see
+                           "import --partition").''',
             epilog='''Try "./log.py <command> -h" for specific help on
                       individual commands.''')
         parser.add_argument('infile',
@@ -385,21 +1338,35 @@ class CommandLine(object):
         subparsers = parser.add_subparsers(title='subcommands')
         # CLEAN
         parser_clean = subparsers.add_parser('clean',
-            help='Remove debug messages from a text log file',
+            help='''Remove debug messages from a raw log (a text file, a
+                    binary segment or a directory of segments), writing a
+                    text log''',
             formatter_class=argparse.RawDescriptionHelpFormatter,
             epilog=textwrap.dedent('''\
             Defaults:
               infile   :  %s
-              outfile  :  %s''' % (LOG_RAW_FNAME, LOG_CLEAN_FNAME)))
+              outfile  :  %s''' % (LOG_RAW_INPUT, LOG_CLEAN_FNAME)))
         parser_clean.set_defaults(func=self.clean_raw)
+        # CONVERT
+        parser_convert = subparsers.add_parser('convert',
+            help='''Convert a text log into binary segments, or binary
+                    segments (a file or a directory) into a text log''',
+            formatter_class=argparse.RawDescriptionHelpFormatter,
+            epilog=textwrap.dedent('''\
+            Defaults:
+              infile   :  %s
+              outfile  :  %s (from text), <infile>.txt (from binary)''' %
+                                   (LOG_RAW_FNAME, LOG_RAW_SEGMENTS_DIR)))
+        parser_convert.set_defaults(func=self.convert_raw)
         # IMPORT
         parser_import = subparsers.add_parser('import',
-            help='Import a text log file into the DB',
+            help='''Import a raw log into the DB (a text file, a binary
+                    segment or a directory of segments)''',
             formatter_class=argparse.RawDescriptionHelpFormatter,
             epilog=textwrap.dedent('''\
             Defaults:
               infile   :  %s
-              outfile  :  %s''' % (LOG_RAW_FNAME, LOG_DB_FNAME)))
+              outfile  :  %s''' % (LOG_RAW_INPUT, LOG_DB_FNAME)))
         parser_import.add_argument('-a', '--auto',
             help='''Automatically identify stints (equivalent to running
                     "stints --auto" after the import)''',
@@ -407,6 +1374,18 @@ class CommandLine(object):
         parser_import.add_argument('--overwrite',
             help='Overwrite DB instead of appending data to it',
             action='store_const', const=True)
+        parser_import.add_argument('--no-resume',
+            help='''Import the whole file, even if part of it has already
+                    been imported''',
+            dest='resume', action='store_const', const=False, default=True)
+        parser_import.add_argument('-c', '--chunk-size',
+            help='Number of signals parsed and inserted at once (default: %d)'
+                 % IMPORT_CHUNK_SIZE,
+            type=int, default=IMPORT_CHUNK_SIZE, metavar='N')
+        parser_import.add_argument('-p', '--partition',
+            help='''Import into a log partitioned by day or by session (a
+                    directory, default: %s)''' % LOG_PARTITIONS_DIR,
+            choices=sorted(PARTITION_FORMATS))
         parser_import.set_defaults(func=self.import_raw)
         # STINTS
         parser_stints = subparsers.add_parser('stints',
@@ -420,9 +1399,8 @@ class CommandLine(object):
                                    LOG_DB_FNAME))
         parser_stints.add_argument('-f', '--from',
             help='''Process only signals from and including ID. If omitted, the
-                    command will search for stings starting from signal
-                    following the last signal known to already belong to a
-                    stint''',
+                    command resumes the search exactly where the last saved
+                    search stopped''',
             type=int, dest='from_id', metavar='ID')
         parser_stints.add_argument('-t', '--to',
             help='Process only signals up to and including ID',
@@ -438,14 +1416,24 @@ class CommandLine(object):
             epilog=textwrap.dedent('''\
             Defaults:
               infile   :  %s
-              outfile  :  %s<ID>.kml [.kmz if -z option used]''' % \
+              outfile  :  %s<ID>.kml [.kmz if -z option used]
+
+            In a partitioned log, stints are given as PARTITION:ID (see
+            "stats") and exported to <outfile><PARTITION>_<ID>.kml.''' % \
                                    (LOG_DB_FNAME, LOG_PATH_FNAME)))
         parser_export.add_argument('-z', '--zip',
             help='Produce a KMZ file instead of a KML',
             action='store_const', const=True)
+        parser_export.add_argument('-p', '--placemarks',
+            help='''Add a placemark with the signal details every N signals
+                    (0 for none, default: %d)''' % KML_PLACEMARK_EVERY,
+            type=int, default=KML_PLACEMARK_EVERY, metavar='N')
+        parser_export.add_argument('-j', '--jobs',
+            help='Number of stints exported in parallel (default: 1)',
+            type=int, default=1, metavar='N')
         parser_export.add_argument('stints',
             help='The stints IDs for which to create the file',
-            type=int, metavar='ID', nargs='+')
+            type=self.parse_stint, metavar='ID', nargs='+')
         parser_export.set_defaults(func=self.export_to_keyhole_files)
         # STATS
         parser_stats = subparsers.add_parser('stats',
@@ -455,51 +1443,216 @@ class CommandLine(object):
             Defaults:
               infile   :  %s
               outfile  :  <stdout>''' % LOG_DB_FNAME))
-        parser_stats.set_defaults(func=self.not_implemented)
+        parser_stats.add_argument('-s', '--since',
+            help='''Only the partitions with signals logged since TIME (a
+                    partitioned log only)''',
+            type=self.parse_time, metavar='TIME')
+        parser_stats.add_argument('-u', '--until',
+            help='''Only the partitions with signals logged until TIME (a
+                    partitioned log only)''',
+            type=self.parse_time, metavar='TIME')
+        parser_stats.set_defaults(func=self.print_stats)
         # Do parsing of commandline
         args = parser.parse_args()
         func = args.func
         del args.func
         func(**args.__dict__)
 
-    def clean_raw(self, infile=LOG_RAW_FNAME, outfile=LOG_CLEAN_FNAME):
-        raw = LogTextFile(infile)
-        lines = raw.clean_from_debug_symbols()
+    @staticmethod
+    def raw_logs(infile):
+        '''
+        Return the raw log files of "infile", a file or a directory of
+        segments.
+        '''
+        if os.path.isdir(infile):
+            return rawlog.list_segments(infile)
+        return [infile]
+
+    def clean_raw(self, infile=LOG_RAW_INPUT, outfile=LOG_CLEAN_FNAME):
         file = open(outfile, 'w')
-        file.writelines(lines)
-        file.close()
-        return lines
-
-    def import_raw(self, infile=LOG_RAW_FNAME, outfile=LOG_DB_FNAME,
-                         overwrite=False, auto=False):
-        db = LogDataBase(outfile, overwrite)
-        db.import_log(infile)
+        number = 0
+        try:
+            for fname in self.raw_logs(infile):
+                log = open_raw_log(fname)
+                try:
+                    for signal in log.iter_signals():
+                        if isinstance(signal, tuple):    # binary segment
+                            signal = '%.3f %s\n' % (signal[0],
+                                     telemetry.to_text(signal[1]))
+                        file.write(signal)
+                        number += 1
+                finally:
+                    log.input.close()
+        finally:
+            file.close()
+        print('%d log messages written to %s' % (number, outfile))
+        return number
+
+    def convert_raw(self, infile=LOG_RAW_FNAME, outfile=None):
+        if os.path.isdir(infile) or rawlog.is_segment(infile):
+            segments = rawlog.list_segments(infile) \
+                       if os.path.isdir(infile) else [infile]
+            outfile = outfile or infile.rstrip(os.sep) + '.txt'
+            out = rawlog.TextLogWriter(outfile)
+            for segment in segments:
+                reader = rawlog.RawLogReader(segment)
+                for stamp, msg in reader.iter_records():
+                    out.write(stamp, msg)
+                if reader.corrupted:
+                    print('%s: corrupted record at byte %d, skipped the rest '
+                          'of the segment' % (segment, reader.offset))
+                reader.close()
+        else:
+            outfile = outfile or LOG_RAW_SEGMENTS_DIR
+            out = rawlog.RawLogWriter(outfile)
+            log = LogTextFile(infile)
+            for stamp, msg in log.iter_records():
+                out.write(stamp, msg)
+            log.input.close()
+        out.close()
+        print('%d records written to %s' % (out.records, outfile))
+
+    @staticmethod
+    def parse_time(text):
+        '''
+        Return the unix timestamp of "YYYY-MM-DD[ HH:MM[:SS]]" (local time).
+        '''
+        for format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+            try:
+                return mktime(strptime(text, format))
+            except ValueError:
+                pass
+        raise argparse.ArgumentTypeError("invalid time: %s" % text)
+
+    @staticmethod
+    def parse_stint(text):
+        '''
+        Return the stint "ID" as an integer, "PARTITION:ID" as a tuple.
+        '''
+        name, sep, stint_id = text.rpartition(':')
+        try:
+            return (name, int(stint_id)) if sep else int(stint_id)
+        except ValueError:
+            raise argparse.ArgumentTypeError("invalid stint: %s" % text)
+
+    def open_db(self, fname, overwrite=False, partition=None):
+        '''
+        Return a PartitionedLog for a directory, a LogDataBase otherwise.
+        '''
+        if partition or os.path.isdir(fname):
+            return PartitionedLog(fname, partition, overwrite)
+        return LogDataBase(fname, overwrite)
+
+    def import_raw(self, infile=LOG_RAW_INPUT, outfile=None,
+                         overwrite=False, auto=False, resume=True,
+                         chunk_size=IMPORT_CHUNK_SIZE, partition=None):
+        if outfile == None:
+            outfile = LOG_PARTITIONS_DIR if partition else LOG_DB_FNAME
+        db = self.open_db(outfile, overwrite, partition)
+        start = time()
+        number = sum(db.import_log(fname, chunk_size, resume)
+                     for fname in self.raw_logs(infile))
+        elapsed = max(time() - start, 1e-6)
+        print('%d signals imported in %.2fs (%d lines/sec)' %
+              (number, elapsed, number / elapsed))
+        if db.malformed:
+            print('%d malformed messages skipped' % db.malformed)
         if auto:
             self.find_stints(infile=outfile, db_save=True)
 
     def find_stints(self, infile=LOG_DB_FNAME, from_id=None,
                     to_id=None, db_save=False):
-        db = LogDataBase(infile)
-        stints = db.find_stints(from_id, to_id, db_save)
+        db = self.open_db(infile)
+        if isinstance(db, PartitionedLog):
+            if from_id != None or to_id != None:
+                print("--from and --to are not supported on partitioned logs")
+                return
+            stints = db.find_stints(db_save)
+        else:
+            stints = db.find_stints(from_id, to_id, db_save)
+            if db_save:
+                db.refresh_stats()
         print('%d stints have been found in the recordset' % len(stints))
         for stint in stints:
-            print(stint[0], stint[1])
+            print(stint)
 
     def export_to_keyhole_files(self, stints, zip=False,
-                                infile=LOG_DB_FNAME, outfile=LOG_PATH_FNAME):
-        db = LogDataBase(infile)
-        for stint in stints:
-            kml_name = outfile + str(stint) + '.kml'
-            kmz_name = outfile + str(stint) + '.kmz'
-            xml = db.get_kml(stint)
-            if zip:
-                file = zipfile.ZipFile(kmz_name, 'w')
-                file.writestr(kml_name, xml)
-                file.close()
+                                infile=LOG_DB_FNAME, outfile=LOG_PATH_FNAME,
+                                placemarks=KML_PLACEMARK_EVERY, jobs=1):
+        '''
+        Export stints, "jobs" at a time in a pool of processes.
+
+        Each process opens its own read-only connection to the DB (or to the
+        partitions of a partitioned log, whose stints are (partition, ID)
+        tuples). Failures are reported and do not stop the export of the
+        other stints.
+        '''
+        tasks = [(stint, outfile, zip, placemarks) for stint in stints]
+        start = time()
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs, _init_export_worker, (infile,))
+            results = pool.imap_unordered(_export_stint, tasks)
+        else:
+            pool = None
+            _init_export_worker(infile)
+            results = (_export_stint(task) for task in tasks)
+        failures = []
+        size = 0
+        for done, (stint, fname, bytes, seconds, error) in \
+                enumerate(results, 1):
+            if error:
+                failures.append((stint, error))
+                print('[%d/%d] stint %s FAILED: %s' %
+                      (done, len(tasks), _stint_name(stint), error))
             else:
-                file = open(kml_name, 'w')
-                file.write(xml)
-                file.close()
+                size += bytes
+                print('[%d/%d] stint %s -> %s (%d bytes, %.2fs)' %
+                      (done, len(tasks), _stint_name(stint), fname, bytes,
+                       seconds))
+        if pool:
+            pool.close()
+            pool.join()
+        elapsed = max(time() - start, 1e-6)
+        print('%d stints exported, %d failed in %.2fs '
+              '(%.1f stints/sec, %.2f MB/sec)' %
+              (len(tasks) - len(failures), len(failures), elapsed,
+               len(tasks) / elapsed, size / elapsed / 2**20))
+        return failures
+
+    def print_stats(self, infile=LOG_DB_FNAME, outfile=None, since=None,
+                    until=None):
+        db = self.open_db(infile)
+        if isinstance(db, PartitionedLog):
+            stats = db.get_db_stats(since, until)
+        elif since != None or until != None:
+            print("--since and --until are only supported on partitioned logs")
+            return
+        else:
+            stats = db.get_db_stats()
+        out = open(outfile, 'w') if outfile else sys.stdout
+        out.write('Database size   : %d bytes\n' % stats['size'])
+        if 'partitions' in stats:
+            out.write('Partitions      : %d\n' % len(stats['partitions']))
+        out.write('Signals         : %d\n' % stats['signal_number'])
+        out.write('Stints          : %d\n' % stats['stint_number'])
+        out.write('Orphan signals  : %d\n' % stats['orphans'])
+        modes = ['time_' + PILOT_MODES[mode] for mode in sorted(PILOT_MODES)]
+        partitioned = 'partitions' in stats
+        if stats['stints']:
+            out.write('\n' + ('%-18s ' % 'partition' if partitioned else '') +
+                      '%6s %8s %9s %10s %9s %9s ' %
+                      ('stint', 'signals', 'duration', 'distance',
+                       'avg speed', 'max speed') +
+                      ' '.join('%9s' % m[5:] for m in modes) + '\n')
+        for stint in stats['stints']:
+            if partitioned:
+                out.write('%-18s ' % stint['partition'])
+            out.write('%6d %8d %8.0fs %9.0fm %7.2fm/s %7.2fm/s ' %
+                      tuple(stint[k] for k in ('stint', 'signals', 'duration',
+                            'distance', 'avg_speed', 'max_speed')) +
+                      ' '.join('%8.0fs' % stint[m] for m in modes) + '\n')
+        if outfile:
+            out.close()
 
     def not_implemented(self, **kwargs):
         print("This functionality hasn't been implemented yet.")
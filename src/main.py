@@ -13,7 +13,9 @@ __license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
 
 
 import gtk
+import gobject
 import platform
+import argparse
 from gui import ComputerControlPanel, FreeRunnerControlPanel
 
 # -----------------------------------------------------------------------------
@@ -22,11 +24,39 @@ from gui import ComputerControlPanel, FreeRunnerControlPanel
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='''Control centre for the
+                                     MagellanMachine sailing robots.''')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('-r', '--replay',
+        help='''Replay a recorded log (text, binary segments or database)
+                instead of connecting to the boat''', metavar='LOG')
+    source.add_argument('-m', '--simulate',
+        help='''Simulate the boat instead of connecting to it, sending RATE
+                frames per second''', type=float, metavar='RATE')
+    parser.add_argument('-s', '--speed',
+        help='''Replay speed, as a multiple of real time (0 for as fast as
+                possible, default: 1)''', type=float, default=1.0)
+    parser.add_argument('-l', '--loop',
+        help='Restart the replay once the end of the log is reached',
+        action='store_true')
+    parser.add_argument('--seed',
+        help='Seed of the simulation (for a reproducible run)', type=int)
+    args = parser.parse_args()
+    port = None
+    if args.replay:
+        import replay
+        port = replay.ReplaySerial(args.replay, args.speed or None, args.loop)
+    elif args.simulate:
+        import simulator
+        port = simulator.SimulatedSerial(args.simulate, seed=args.seed)
+
+    # The serial reader runs in its own thread: let it run during gtk.main()
+    gobject.threads_init()
     if platform.machine() == "armv4tl":     # Freerunner
         host = "freerunner"
         interface = FreeRunnerControlPanel
     else:
         host = "computer"
         interface = ComputerControlPanel
-    interface()
+    interface(port)
     gtk.main()
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+'''
+Append-only binary raw log, written in segments.
+
+A segment starts with a header (SEGMENT_HEADER) followed by records. Each
+record is a RECORD header (payload length, CRC32 of timestamp and payload,
+unix timestamp) followed by the payload: the message as received from the
+boat (text, or a binary frame as defined in the telemetry module).
+
+Records go through a buffered writer and are fsync'ed every
+LOG_RAW_FSYNC_INTERVAL seconds, so that at most that much data can be lost
+on a crash. A segment is never appended to after it has been closed: a
+torn record can therefore only be found at the end of a segment, where
+readers stop.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os
+import os.path
+import struct
+import threading
+import zlib
+from collections import deque
+from commons import *
+import telemetry
+
+SEGMENT_MAGIC = 'MMRAWLOG'
+SEGMENT_VERSION = 1
+SEGMENT_HEADER = struct.Struct('<8sB')
+SEGMENT_EXTENSION = '.rlog'
+RECORD = struct.Struct('<IId')         # length, CRC32, timestamp
+STAMP = struct.Struct('<d')
+MAX_RECORD_LENGTH = 0x10000            # longer records are corrupted
+QUEUE_POLICIES = ('drop-oldest', 'block')
+
+
+def is_segment(fname):
+    '''
+    Return True if "fname" is a binary raw log segment.
+    '''
+    if not os.path.isfile(fname):
+        return False
+    file = open(fname, 'rb')
+    try:
+        header = file.read(SEGMENT_HEADER.size)
+    finally:
+        file.close()
+    return len(header) == SEGMENT_HEADER.size and \
+           SEGMENT_HEADER.unpack(header)[0] == SEGMENT_MAGIC
+
+
+def list_segments(directory):
+    '''
+    Return the segments in "directory", in the order they were written.
+    '''
+    return [os.path.join(directory, fname) for fname in
+            sorted(os.listdir(directory)) if fname.endswith(SEGMENT_EXTENSION)]
+
+
+def _crc(stamp, payload):
+    return zlib.crc32(payload, zlib.crc32(STAMP.pack(stamp))) & 0xffffffff
+
+
+class LogWriter(object):
+
+    '''
+    Base class of the raw log writers: a buffered file fsync'ed periodically.
+    '''
+
+    def sync(self, force=False):
+        '''
+        Flush and fsync the file if "fsync_interval" has elapsed.
+
+        Return True if the file has been synced.
+        '''
+        if not force and time() - self.last_sync < self.fsync_interval:
+            return False
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time()
+        return True
+
+    def close(self):
+        self.sync(force=True)
+        self.file.close()
+
+
+class RawLogWriter(LogWriter):
+
+    '''
+    Record messages into numbered segments in a directory.
+
+    A new segment is started when the current one grows beyond
+    "segment_size" bytes or spans more than "segment_time" seconds, and
+    every time a writer is created.
+    '''
+
+    def __init__(self, directory=LOG_RAW_SEGMENTS_DIR,
+                 segment_size=LOG_RAW_SEGMENT_SIZE,
+                 segment_time=LOG_RAW_SEGMENT_TIME,
+                 fsync_interval=LOG_RAW_FSYNC_INTERVAL,
+                 buffer_size=LOG_RAW_BUFFER_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segment_time = segment_time
+        self.fsync_interval = fsync_interval
+        self.buffer_size = buffer_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        segments = list_segments(directory)
+        self.number = int(os.path.basename(segments[-1]).split('.')[0]) \
+                      if segments else 0
+        self.file = None
+        self.records = 0
+        self.bytes_written = 0
+        self._rotate()
+
+    def _rotate(self):
+        if self.file:
+            self.sync(force=True)
+            self.file.close()
+        self.number += 1
+        self.fname = os.path.join(self.directory,
+                                  '%06d%s' % (self.number, SEGMENT_EXTENSION))
+        self.file = open(self.fname, 'wb', self.buffer_size)
+        self.file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION))
+        self.size = SEGMENT_HEADER.size
+        self.bytes_written += SEGMENT_HEADER.size
+        self.segment_start = None
+        self.last_sync = time()
+
+    def write(self, stamp, msg):
+        '''
+        Append a message received at unix time "stamp".
+        '''
+        if self.segment_start == None:
+            self.segment_start = stamp
+        elif self.size >= self.segment_size or \
+             stamp - self.segment_start >= self.segment_time:
+            self._rotate()
+            self.segment_start = stamp
+        self.file.write(RECORD.pack(len(msg), _crc(stamp, msg), stamp) + msg)
+        self.size += RECORD.size + len(msg)
+        self.bytes_written += RECORD.size + len(msg)
+        self.records += 1
+
+
+class TextLogWriter(LogWriter):
+
+    '''
+    Record messages as lines of a text raw log ("timestamp message").
+
+    Same interface and syncing policy as RawLogWriter, without rotation.
+    '''
+
+    def __init__(self, fname=LOG_RAW_FNAME,
+                 fsync_interval=LOG_RAW_FSYNC_INTERVAL,
+                 buffer_size=LOG_RAW_BUFFER_SIZE):
+        self.fname = fname
+        self.fsync_interval = fsync_interval
+        self.file = open(fname, 'a', buffer_size)
+        self.last_sync = time()
+        self.records = 0
+        self.bytes_written = 0
+
+    def write(self, stamp, msg):
+        line = '%.3f %s\n' % (stamp, msg)
+        self.file.write(line)
+        self.bytes_written += len(line)
+        self.records += 1
+
+
+class AsyncLogWriter(threading.Thread):
+
+    '''
+    Run a raw log writer in a background thread, behind a bounded queue.
+
+    write() and sync() only enqueue, so the caller (the GTK main loop) never
+    waits for the disk; the thread writes the queue in batches and syncs
+    the writer periodically. When the queue is full, "policy" decides:
+    'drop-oldest' evicts the oldest queued message, 'block' makes write()
+    wait for room. If the writer fails, its exception is stored in "error"
+    and the following messages are dropped.
+    '''
+
+    def __init__(self, writer, queue_size=LOG_QUEUE_SIZE,
+                 policy=LOG_QUEUE_POLICY):
+        super(AsyncLogWriter, self).__init__()
+        if policy not in QUEUE_POLICIES:
+            raise ValueError("No such queue policy: %s" % policy)
+        self.daemon = True
+        self.writer = writer
+        self.queue_size = queue_size
+        self.policy = policy
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.force_sync = False
+        self.max_depth = 0
+        self.dropped = 0
+        self.latencies = deque(maxlen=LOG_LATENCY_SAMPLES)
+        self.error = None
+        self.start()
+
+    def write(self, stamp, msg):
+        '''
+        Queue a message received at unix time "stamp".
+        '''
+        with self.condition:
+            if self.policy == 'block':
+                while len(self.queue) >= self.queue_size and self.running:
+                    self.condition.wait()
+            elif len(self.queue) >= self.queue_size:
+                self.queue.popleft()
+                self.dropped += 1
+            if not self.running:
+                self.dropped += 1
+                return
+            self.queue.append((stamp, msg))
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.condition.notify_all()
+
+    def sync(self, force=False):
+        '''
+        Ask the thread to sync the writer as soon as the queue is written.
+
+        Without "force", nothing is done: syncing is already periodic.
+        '''
+        if force:
+            with self.condition:
+                self.force_sync = True
+                self.condition.notify_all()
+
+    def run(self):
+        writer = self.writer
+        records = writer.records
+        while True:
+            with self.condition:
+                if not self.queue and self.running and not self.force_sync:
+                    self.condition.wait(writer.fsync_interval)
+                batch, self.queue = self.queue, deque()
+                force, self.force_sync = self.force_sync, False
+                running = self.running
+                self.condition.notify_all()    # room for blocked writers
+            try:
+                start = time()
+                while batch:
+                    writer.write(*batch[0])
+                    batch.popleft()
+                writer.sync(force)
+                if writer.records != records:
+                    records = writer.records
+                    with self.condition:
+                        self.latencies.append(time() - start)
+                if not running:
+                    writer.close()
+                    return
+            except Exception as e:    # e.g. the disk is full
+                with self.condition:
+                    self.error = e
+                    self.dropped += len(batch) + len(self.queue)
+                    self.queue.clear()
+                    self.running = False
+                    self.condition.notify_all()
+                return
+
+    def close(self):
+        '''
+        Write what is left in the queue, close the writer and the thread.
+        '''
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.is_alive():
+            self.join()
+
+    def stats(self):
+        '''
+        Return a dictionary with the metrics of the logging subsystem.
+
+        Keys:
+        depth               messages in the queue
+        max_depth           maximum number of messages queued so far
+        records             messages written
+        bytes               bytes written
+        dropped             messages dropped
+        p50, p95, p99, max  write latency of a batch in seconds (over the
+                            last LOG_LATENCY_SAMPLES batches, None if none)
+        '''
+        with self.condition:
+            result = dict(depth=len(self.queue), max_depth=self.max_depth,
+                          dropped=self.dropped)
+            latencies = sorted(self.latencies)
+        result['records'] = self.writer.records
+        result['bytes'] = self.writer.bytes_written
+        for key, percentile in (('p50', 50), ('p95', 95), ('p99', 99),
+                                ('max', 100)):
+            result[key] = latencies[(len(latencies) - 1) * percentile // 100] \
+                          if latencies else None
+        return result
+
+
+class RawLogReader(object):
+
+    '''
+    Read the records of a segment.
+
+    The interface mirrors log.LogTextFile: "offset" is kept at the byte
+    following the last record read, so that an import can be resumed.
+    '''
+
+    def __init__(self, fname):
+        self.input = open(fname, 'rb')
+        header = self.input.read(SEGMENT_HEADER.size)
+        if len(header) != SEGMENT_HEADER.size or \
+           SEGMENT_HEADER.unpack(header)[0] != SEGMENT_MAGIC:
+            raise IOError("Not a raw log segment: %s" % fname)
+        version = SEGMENT_HEADER.unpack(header)[1]
+        if version != SEGMENT_VERSION:
+            raise IOError("Unsupported raw log version %d: %s" %
+                          (version, fname))
+        self.offset = SEGMENT_HEADER.size
+        self.corrupted = False
+
+    def iter_records(self, offset=0):
+        '''
+        Yield the (timestamp, message) records, starting at byte "offset".
+
+        Reading stops at the end of the segment, at an incomplete record
+        (still being written) or at a corrupted one (in which case
+        "corrupted" is set to True).
+        '''
+        self.offset = max(offset, SEGMENT_HEADER.size)
+        self.input.seek(self.offset)
+        read = self.input.read
+        while True:
+            header = read(RECORD.size)
+            if len(header) < RECORD.size:
+                return    # end of segment, or a header being written
+            length, crc, stamp = RECORD.unpack(header)
+            if length > MAX_RECORD_LENGTH:
+                self.corrupted = True
+                return
+            payload = read(length)
+            if len(payload) < length:
+                return
+            if _crc(stamp, payload) != crc:
+                self.corrupted = True
+                return
+            self.offset += RECORD.size + length
+            yield stamp, payload
+
+    def iter_signals(self, offset=0):
+        '''
+        Yield the (timestamp, message) records holding log messages.
+        '''
+        is_log_message = telemetry.is_log_message
+        for record in self.iter_records(offset):
+            if record[1] and is_log_message(record[1]):
+                yield record
+
+    def close(self):
+        self.input.close()
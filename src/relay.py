@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+'''
+Delta-encoded telemetry relay between the FreeRunner and a remote client.
+
+The FreeRunner periodically sends keyframes (binary frames carrying every
+signal) and, in between, frames with only the signals that changed. The
+client rebuilds the full state and uses the sequence numbers to detect lost
+frames, asking for a new keyframe (WIFI_RESYNC) when it happens.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+from commons import *
+from time import time
+import telemetry
+
+
+class DeltaEncoder(object):
+
+    '''
+    Build the frames sent by the FreeRunner from the boat state.
+    '''
+
+    def __init__(self, keyframe_interval=WIFI_KEYFRAME_INTERVAL,
+                 codec=telemetry.codec):
+        self.keyframe_interval = keyframe_interval
+        self.codec = codec
+        self.fields = zip(codec.keys, codec.names)
+        self.sent = {}
+        self.seq = 0
+        self.last_keyframe_time = 0
+        self.resync = True
+        self.keyframes = (None, None)    # (seq, keyframe) last built
+
+    def request_keyframe(self):
+        '''
+        Force the next frame to be a keyframe (e.g. on WIFI_RESYNC).
+        '''
+        self.resync = True
+
+    def encode(self, boat):
+        '''
+        Return the next frame for the signals of "boat", or None if nothing
+        changed.
+
+        Raise struct.error, leaving the encoder unchanged, if a value does
+        not fit its binary format.
+        '''
+        values = dict((k, getattr(boat, n)) for k, n in self.fields)
+        now = time()
+        keyframe = self.resync or \
+                   now - self.last_keyframe_time >= self.keyframe_interval
+        if keyframe:
+            changed = values
+        else:
+            sent = self.sent
+            changed = dict((k, v) for k, v in values.iteritems()
+                           if sent[k] != v)
+            if not changed:
+                return None
+        seq = (self.seq + 1) & 0xFFFF
+        frame = self.codec.encode(changed, seq)
+        if keyframe:
+            self.last_keyframe_time = now
+            self.resync = False
+            self.keyframes = (seq, frame)
+        self.sent = values
+        self.seq = seq
+        return frame
+
+    def keyframe(self):
+        '''
+        Return a keyframe of the last state encoded, with the same sequence
+        number as the last frame (for the clients that missed some frames).
+
+        The keyframe is only built once per sequence number.
+        '''
+        if self.keyframes[0] != self.seq:
+            self.keyframes = (self.seq, self.codec.encode(self.sent, self.seq))
+        return self.keyframes[1]
+
+
+class DeltaDecoder(object):
+
+    '''
+    Rebuild the full boat state from the frames sent by a DeltaEncoder.
+
+    Counters: "decoded" frames, "lost" frames (gaps in the sequence
+    numbers) and "stale" frames (duplicated or out of order, which are
+    discarded).
+    '''
+
+    def __init__(self, codec=telemetry.codec):
+        self.codec = codec
+        self.values = {}
+        self.last_seq = None
+        self.synchronised = False
+        self.decoded = 0
+        self.lost = 0
+        self.stale = 0
+        self.last_resync_request = 0
+
+    def decode(self, frame):
+        '''
+        Return the full-state text log message after applying "frame".
+
+        Return None if the frame is stale. Raise
+        telemetry.MalformedFrameError if the frame is corrupted.
+        '''
+        seq, fields = self.codec.decode(frame)
+        keyframe = len(fields) == len(self.codec.keys)
+        if self.last_seq is not None:
+            gap = (seq - self.last_seq) & 0xFFFF
+            if gap == 0 or gap > 0x8000:
+                # Keyframes always apply (e.g. the FreeRunner restarted)
+                if not keyframe:
+                    self.stale += 1
+                    return None
+            elif gap > 1:
+                self.lost += gap - 1
+                self.synchronised = False
+        elif not keyframe:
+            self.synchronised = False    # joined the stream midway
+        if keyframe:
+            self.synchronised = True
+        self.last_seq = seq
+        self.decoded += 1
+        self.values.update(fields)
+        values = self.values
+        return '!' + ' '.join('%s:%s' % (k, values[k])
+                              for k in self.codec.keys if k in values)
+
+    def resync_due(self):
+        '''
+        Return True if a keyframe should be requested to the FreeRunner.
+
+        Requests are rate-limited to one every WIFI_RESYNC_INTERVAL seconds.
+        '''
+        if self.synchronised:
+            return False
+        if time() - self.last_resync_request < WIFI_RESYNC_INTERVAL:
+            return False
+        self.last_resync_request = time()
+        return True
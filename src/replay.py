@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+'''
+Replay recorded logs through the boat objects, as if a boat was connected.
+
+Sources can be text raw logs, binary raw log segments (a file or a
+directory of them) or log databases. Messages are served by a serial-like
+object with their original timing (or faster), so that the GUI, the logging
+and the stint detection can be exercised with real data and no hardware.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sqlite3
+import threading
+from time import sleep, time
+from commons import *
+import boat
+import log
+import rawlog
+import serialreader
+import telemetry
+
+
+def _iter_db_records(fname, start):
+    # Rebuild the text log messages from the columns of the signals table.
+    # The records are read by the serial reader thread, not the one which
+    # started the replay (ReplaySerial serialises the accesses).
+    keys = sorted(LOG_SIGNALS)
+    columns = [LOG_SIGNALS[key][0] for key in keys]
+    connection = sqlite3.connect(fname, check_same_thread=False)
+    try:
+        cursor = connection.execute('SELECT timestamp, %s FROM signals WHERE '
+                                    'timestamp >= ? ORDER BY timestamp' %
+                                    ', '.join(columns), (start,))
+        for row in cursor:
+            yield row[0], '!' + ' '.join('%s:%s' % (key, value)
+                                         for key, value in zip(keys, row[1:])
+                                         if value != None)
+    finally:
+        connection.close()
+
+
+def _is_database(fname):
+    file = open(fname, 'rb')
+    try:
+        return file.read(16) == 'SQLite format 3\x00'
+    finally:
+        file.close()
+
+
+def iter_records(source, start=None):
+    '''
+    Yield the (timestamp, message) records of a recorded log, in order.
+
+    "source" is a text raw log, a binary segment, a directory of segments or
+    a log database. Records logged before "start" (a unix timestamp) are
+    skipped. Databases only hold log messages.
+    '''
+    if start == None:
+        start = float('-inf')
+    if not os.path.isdir(source) and _is_database(source):
+        records = _iter_db_records(source, start)
+    else:
+        records = _iter_file_records(source)
+    try:
+        for record in records:
+            if record[0] >= start:
+                yield record
+    finally:
+        records.close()
+
+
+def _iter_file_records(source):
+    # Segments are opened one at a time, and closed once read (or when the
+    # iteration is abandoned)
+    if os.path.isdir(source):
+        fnames = rawlog.list_segments(source)
+    else:
+        fnames = [source]
+    for fname in fnames:
+        if rawlog.is_segment(fname):
+            reader = rawlog.RawLogReader(fname)
+        else:
+            reader = log.LogTextFile(fname)
+        try:
+            for record in reader.iter_records():
+                yield record
+        finally:
+            reader.input.close()
+
+
+class ReplaySerial(object):
+
+    '''
+    Serial-like object replaying a recorded log.
+
+    It implements the methods of serial.Serial used by the boats (like
+    boat.MockSerial), serving each message when it is due: messages keep
+    their original timing, divided by "speed" (None for as fast as
+    possible). Pauses longer than REPLAY_MAX_GAP seconds are skipped.
+
+    If "loop" is True the replay restarts from the beginning of the log
+    once its end is reached, otherwise "finished" is set and nothing more
+    is read. Commands written to the boat are ignored.
+    '''
+
+    def __init__(self, source, speed=1.0, loop=False, start=None):
+        self.source = source
+        self.speed = speed
+        self.loop = loop
+        self.timeout = None
+        self.lock = threading.Lock()    # seek() is called from the GUI
+        self.loops = 0
+        self.replayed = 0
+        self.records = None
+        self.seek(start)
+
+    def _restart(self, start):
+        self.close()
+        self.records = iter_records(self.source, start)
+        self.pending = next(self.records, None)
+        self.finished = self.pending == None
+        self._anchor()
+
+    def _anchor(self):
+        # The pending record is due now
+        self.log_origin = self.pending[0] if self.pending else 0
+        self.wall_origin = time()
+
+    def _due(self):
+        '''
+        Return the time at which the pending record is due (None if none).
+        '''
+        if self.pending == None:
+            return None
+        if not self.speed:
+            return 0
+        return self.wall_origin + (self.pending[0] - self.log_origin) / \
+               self.speed
+
+    def _next_record(self):
+        self.replayed += 1
+        previous = self.pending
+        self.pending = next(self.records, None)
+        if self.pending != None:
+            gap = self.pending[0] - previous[0]
+            if gap > REPLAY_MAX_GAP or gap < 0:
+                self.log_origin += gap    # skip pauses, and time going back
+        else:
+            if self.loop:
+                self.loops += 1
+                self._restart(None)
+            else:
+                self.finished = True
+
+    def seek(self, stamp=None):
+        '''
+        Restart from the first message logged at or after unix time "stamp"
+        (from the beginning of the log if None).
+        '''
+        with self.lock:
+            self._restart(stamp)
+
+    def set_speed(self, speed):
+        '''
+        Change the replay speed (None for as fast as possible).
+        '''
+        with self.lock:
+            self.speed = speed
+            self._anchor()
+
+    @property
+    def position(self):
+        '''
+        Unix time of the next message to be replayed (None at the end).
+        '''
+        pending = self.pending
+        return pending[0] if pending else None
+
+    def write(self, string):
+        pass
+
+    def close(self):
+        '''
+        Close the log being replayed.
+        '''
+        if self.records != None:
+            self.records.close()
+
+    def inWaiting(self):
+        with self.lock:
+            due = self._due()
+        return due != None and due <= time()
+
+    def readline(self):
+        '''
+        Return the next message if it is due, or an empty string.
+
+        Like on the serial line, text messages end with a carriage return.
+        '''
+        with self.lock:
+            due = self._due()
+            if due == None or due > time():
+                return ''
+            msg = self.pending[1]
+            self._next_record()
+        return msg if msg[:1] == telemetry.BINARY_MAGIC else msg + '\r'
+
+    def read(self, size=1):
+        '''
+        Return the messages due, waiting for them up to "timeout" seconds.
+
+        An empty string is returned on timeout. "size" is ignored: up to
+        REPLAY_MAX_BATCH whole messages are returned at once.
+        '''
+        timeout = self.timeout if self.timeout is not None else 0.01
+        with self.lock:
+            due = self._due()
+        now = time()
+        if due == None:
+            sleep(timeout)
+            return ''
+        if due > now:
+            sleep(min(due - now, timeout))
+        data = []
+        with self.lock:
+            now = time()
+            while len(data) < REPLAY_MAX_BATCH:
+                due = self._due()
+                if due == None or due > now:
+                    break
+                msg = self.pending[1]
+                data.append(msg if msg[:1] == telemetry.BINARY_MAGIC
+                            else msg + '\r')
+                self._next_record()
+        return ''.join(data)
+
+
+class ReplayBoat(boat.BareBoat):
+
+    '''
+    Boat replaying a recorded log (see ReplaySerial).
+    '''
+
+    def __init__(self, source, speed=1.0, loop=False, start=None,
+                 threaded=True):
+        super(ReplayBoat, self).__init__(
+                ReplaySerial(source, speed, loop, start), threaded=threaded)
+
+    def seek(self, stamp=None):
+        '''
+        Continue the replay from unix time "stamp" (see ReplaySerial.seek).
+
+        Messages already read from the log but not polled yet are discarded:
+        the reader thread is stopped meanwhile (for at most
+        SERIAL_READ_TIMEOUT seconds), so that it cannot push any of them.
+        '''
+        if not self.reader:
+            self.ser.seek(stamp)
+            return
+        ring = self.reader.ring
+        self.reader.stop()
+        ring.frames.clear()
+        self.ser.seek(stamp)
+        self.reader = serialreader.SerialReader(self.ser, ring=ring)
+        self.reader.start()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+'''
+Provide a background reader that drains the serial line into a frame buffer.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import threading
+from collections import deque
+from commons import *
+import telemetry
+
+
+class FrameRing(object):
+
+    '''
+    Bounded FIFO of complete frames shared by one producer and one consumer.
+
+    No lock is needed: deque.append and deque.popleft are atomic, and each
+    counter is only ever written by one of the two threads. When the buffer
+    is full, the oldest frame is evicted to make room for the new one.
+    '''
+
+    def __init__(self, size=SERIAL_RING_SIZE):
+        self.size = size
+        self.frames = deque(maxlen=size)
+        self.overflowed = 0    # written by the producer only
+        self.dropped = 0       # written by the consumer only
+
+    def __len__(self):
+        return len(self.frames)
+
+    def push(self, frame):
+        '''
+        Append a frame, evicting the oldest one if the buffer is full.
+        '''
+        if len(self.frames) == self.size:
+            self.overflowed += 1
+        self.frames.append(frame)
+
+    def pop(self, coalesce=False):
+        '''
+        Return the oldest frame in the buffer, or None if it is empty.
+
+        If "coalesce" is True, a run of consecutive telemetry frames is
+        collapsed into its newest element (the skipped ones are counted as
+        dropped). Debug messages are never coalesced away.
+        '''
+        frames = self.frames
+        try:
+            frame = frames.popleft()
+        except IndexError:
+            return None
+        if coalesce:
+            log_message = telemetry.is_log_message
+            while log_message(frame) and frames and log_message(frames[0]):
+                frame = frames.popleft()
+                self.dropped += 1
+        return frame
+
+
+class SerialReader(threading.Thread):
+
+    '''
+    Thread draining a serial device in bulk into a FrameRing.
+
+    Incoming bytes are split into messages by a telemetry.FrameSplitter:
+    text messages (terminated by a carriage return) are pushed into "ring"
+    stripped of surrounding whitespace, binary frames are pushed whole.
+    '''
+
+    def __init__(self, ser, ring_size=SERIAL_RING_SIZE, ring=None):
+        '''
+        "ring" is the FrameRing to fill (a new one of "ring_size" frames if
+        None), e.g. that of a stopped reader of the same line.
+        '''
+        super(SerialReader, self).__init__()
+        self.daemon = True
+        self.ser = ser
+        self.ser.timeout = SERIAL_READ_TIMEOUT   # so that stop() is honoured
+        self.ring = ring if ring != None else FrameRing(ring_size)
+        self.splitter = telemetry.FrameSplitter()
+        self.running = True
+        self.error = None
+
+    def run(self):
+        try:
+            while self.running:
+                data = self.ser.read(max(1, self.ser.inWaiting()))
+                if not data:
+                    continue
+                for msg in self.splitter.feed(data):
+                    self.ring.push(msg)
+        except Exception as e:    # e.g. the device has been unplugged
+            self.error = e
+        self.running = False
+
+    def stop(self):
+        '''
+        Ask the thread to terminate and wait for it.
+        '''
+        self.running = False
+        if self.is_alive():
+            self.join()
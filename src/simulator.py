@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+'''
+Simulate the Arduino of a sailing boat, at any frame rate.
+
+The boat sails in a wind that shifts and gusts, steered by its autopilot or
+by the commands it receives; its GPS fixes, compass, servos and battery are
+derived from the model. Frames are streamed at a configurable rate (up to
+several kHz, well above the real hardware), with timing jitter, bursts and
+corrupted frames on demand, so that the parsers, the relay and the logging
+can be stress-tested without a boat.
+
+Given the same seed (and start time), the simulation produces exactly the
+same frames, whatever the speed at which they are read.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import random
+import threading
+from collections import deque
+from math import sin, cos, sqrt, radians, degrees
+from time import sleep, time
+from commons import *
+import boat
+import telemetry
+
+NO_GO_ANGLE = 40          # in degrees off the wind (no speed closer than it)
+SPEED_TIME_CONSTANT = 5   # in seconds (the boat speed follows the polar)
+WIND_TIME_CONSTANT = 120  # in seconds (gusts die out)
+MAX_TURN_RATE = 15        # in degrees/sec, at full rudder and 1 m/s
+BATTERY_CAPACITY = 10000  # in mAh
+CORRUPTIONS = ('flip', 'drop', 'truncate')
+
+
+class SailingModel(object):
+
+    '''
+    Simple physical model of the boat, its sensors and its autopilot.
+
+    The wind direction follows a random walk, its speed gusts around
+    "wind_speed". The boat speed tends to a polar-like target (nothing in
+    the no-go zone, fastest on a beam reach) scaled by how well the sail is
+    trimmed, and the rudder turns the boat proportionally to its speed. In
+    AUTO pilot mode the rudder steers towards the desired heading and the
+    sail is trimmed to the wind, otherwise they stay where the commands put
+    them.
+    '''
+
+    def __init__(self, rng, latitude=57.7, longitude=11.9, heading=90.0,
+                 wind_direction=225.0, wind_speed=6.0):
+        self.random = rng
+        self.latitude = latitude
+        self.longitude = longitude
+        self.heading = heading
+        self.speed = 0.0
+        self.wind_direction = wind_direction    # where the wind blows from
+        self.wind_speed = wind_speed            # in m/s
+        self.mean_wind_speed = wind_speed
+        self.pilot_mode = AUTO
+        self.desired_heading = int(heading)
+        self.rudder = 0
+        self.sail = 50
+        self.interval = 0
+        self.charge = BATTERY_CAPACITY * 0.9    # in mAh
+        self.current = 150                      # in mA
+        self.voltage = 12000                    # in mV
+        self.energy = 0.0                       # in µJ
+        self.fix = (latitude, longitude)
+        self.fix_age = 0.0
+
+    def command(self, key, value):
+        '''
+        Apply a command received by the Arduino ("key" as in commons).
+        '''
+        if key == SET_PILOT_MODE:
+            self.pilot_mode = value
+        elif key == SET_HEADING:
+            self.desired_heading = value % 360
+        elif key == SET_RUDDER:
+            self.rudder = max(-100, min(100, value))
+        elif key == SET_SAIL:
+            self.sail = max(0, min(100, value))
+        elif key == SET_LOG_INTERVAL:
+            self.interval = value
+
+    def _gps_fix(self):
+        # Metres of noise, converted to degrees
+        noise = SIMULATOR_GPS_NOISE / (EARTH_RADIUS * 1000.0)
+        return (self.latitude + degrees(self.random.gauss(0, noise)),
+                self.longitude + degrees(self.random.gauss(0, noise) /
+                                         cos(radians(self.latitude))))
+
+    def step(self, dt):
+        '''
+        Advance the simulation by "dt" seconds.
+        '''
+        rng = self.random
+        self.wind_direction = (self.wind_direction +
+                               rng.gauss(0, 2 * sqrt(dt))) % 360
+        self.wind_speed = max(0, self.wind_speed + rng.gauss(0, 0.3 * sqrt(dt))
+                              + (self.mean_wind_speed - self.wind_speed) *
+                              dt / WIND_TIME_CONSTANT)
+        relative = (self.wind_direction - self.heading) % 360
+        angle = min(relative, 360 - relative)    # off the wind, either tack
+        if self.pilot_mode == AUTO:
+            error = (self.desired_heading - self.heading + 180) % 360 - 180
+            self.rudder = int(max(-100, min(100, 2 * error)))
+            self.sail = int(angle * 100 / 180)
+        # Polar and trim
+        if angle < NO_GO_ANGLE:
+            target = 0.0
+        else:
+            target = self.wind_speed * 0.25 * (1 + sin(radians(angle)))
+        target *= max(0, 1 - abs(self.sail - angle * 100 / 180.0) / 100.0)
+        self.speed += (target - self.speed) * min(1, dt / SPEED_TIME_CONSTANT)
+        self.heading = (self.heading + self.rudder / 100.0 * MAX_TURN_RATE *
+                        min(self.speed, 1) * dt) % 360
+        # Position (flat earth: steps are tiny)
+        distance = self.speed * dt / (EARTH_RADIUS * 1000.0)
+        heading = radians(self.heading)
+        self.latitude += degrees(distance * cos(heading))
+        self.longitude += degrees(distance * sin(heading) /
+                                  cos(radians(self.latitude)))
+        self.fix_age += dt
+        if self.fix_age >= SIMULATOR_GPS_INTERVAL:
+            self.fix_age = 0.0
+            self.fix = self._gps_fix()
+        # Electrics: the servos draw current when the rudder is over
+        self.current = max(50, 150 + abs(self.rudder) * 3 + rng.gauss(0, 5))
+        self.charge = max(0, self.charge - self.current * dt / 3600)
+        self.voltage = 11000 + 1600 * self.charge / BATTERY_CAPACITY
+        self.energy += self.voltage * self.current / 1000 * dt * 1000
+
+    def values(self, stamp):
+        '''
+        Return the {key: value} log signals at unix time "stamp".
+        '''
+        north = int(self.heading) % 360
+        power = self.voltage * self.current / 1000
+        return {
+            'B' : int(self.charge / self.current * 3600),
+            'H' : int(self.desired_heading),
+            'I' : int(self.interval),
+            'P' : int(self.pilot_mode),
+            'R' : int(self.rudder),
+            'S' : int(self.sail),
+            'T' : int(stamp * 1000),
+            'W' : int((self.wind_direction - self.heading) % 360),
+            'X' : round(self.fix[1], 6),
+            'Y' : round(self.fix[0], 6),
+            # Compass, so that atan2(x, y) gives back the heading
+            'n' : north,
+            'x' : int(round(100 * sin(radians(north - 270)))),
+            'y' : int(round(100 * cos(radians(north - 270)))),
+            'z' : int(round(self.random.gauss(0, 2))),
+            'u' : int(self.voltage),
+            'i' : int(self.current),
+            'p' : int(power),
+            'e' : int(self.energy),
+        }
+
+
+class SimulatedSerial(object):
+
+    '''
+    Serial-like object streaming the frames of a SailingModel.
+
+    It implements the methods of serial.Serial used by the boats (like
+    boat.MockSerial): bytes are buffered as on a real serial line, and read()
+    may return partial frames. Frames are "rate" per second, each delayed by
+    a gaussian "jitter" (in seconds). A frame starts a burst with
+    probability "burst_chance": it and the following "burst_length" - 1
+    frames are held back and arrive together. Frames are corrupted with
+    probability "corruption" (a flipped bit, a dropped byte or a truncated
+    frame). When more than "buffer_size" bytes are waiting, new data is lost
+    (see "overrun").
+
+    If "paced" is False, frames are generated as fast as they are read,
+    otherwise they are due in real time. "seed" makes the stream
+    reproducible: the simulated clock starts at unix time "start" (now if
+    None) and advances 1/rate per frame, independently of the wall clock.
+
+    Commands are applied to "model"; SET_LOG_INTERVAL 0 pauses the stream,
+    any other interval resumes it (the rate does not change, see set_rate).
+    '''
+
+    def __init__(self, rate=SIMULATOR_RATE, jitter=SIMULATOR_JITTER,
+                 burst_chance=SIMULATOR_BURST_CHANCE,
+                 burst_length=SIMULATOR_BURST_LENGTH,
+                 corruption=SIMULATOR_CORRUPTION, binary=False, paced=True,
+                 seed=None, start=None, buffer_size=SIMULATOR_BUFFER_SIZE):
+        self.random = random.Random(seed)
+        self.model = SailingModel(self.random)
+        self.jitter = jitter
+        self.burst_chance = burst_chance
+        self.burst_length = burst_length
+        self.corruption = corruption
+        self.binary = binary
+        self.paced = paced
+        self.buffer_size = buffer_size
+        self.timeout = None
+        self.lock = threading.Lock()
+        self.clock = start if start != None else time()
+        self.seq = 0
+        self.chunks = []       # bytes waiting to be read
+        self.buffered = 0
+        self.held = deque()    # (due, frame) generated, not due yet
+        self.streaming = True
+        self.frames = 0        # frames generated
+        self.corrupted = 0     # frames corrupted on purpose
+        self.bursts = 0
+        self.overrun = 0       # bytes lost because the buffer was full
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        '''
+        Change the number of frames per second.
+        '''
+        with self.lock:
+            self.rate = float(rate)
+            self.wall_origin = time()
+            self.index = 0     # frames scheduled since wall_origin
+            self.last_due = self.wall_origin
+
+    def _corrupt(self, frame):
+        kind = self.random.choice(CORRUPTIONS)
+        position = self.random.randrange(len(frame))
+        self.corrupted += 1
+        if kind == 'flip':
+            bit = 1 << self.random.randrange(8)
+            return frame[:position] + chr(ord(frame[position]) ^ bit) + \
+                   frame[position + 1:]
+        if kind == 'drop':
+            return frame[:position] + frame[position + 1:]
+        return frame[:position]
+
+    def _frame(self):
+        '''
+        Advance the model by one frame and return the frame.
+        '''
+        self.model.step(1 / self.rate)
+        self.clock += 1 / self.rate
+        values = self.model.values(self.clock)
+        if self.binary:
+            self.seq = (self.seq + 1) & 0xFFFF
+            frame = telemetry.codec.encode(values, self.seq)
+        else:
+            frame = '!' + ' '.join('%s:%s' % (key, values[key]) for key
+                                   in sorted(values)) + '\r'
+        self.frames += 1
+        if self.corruption and self.random.random() < self.corruption:
+            frame = self._corrupt(frame)
+        return frame
+
+    def _schedule(self):
+        '''
+        Generate the next frame, or the next burst, into "held".
+        '''
+        if self.burst_chance and self.random.random() < self.burst_chance:
+            self.bursts += 1
+            length = self.burst_length
+        else:
+            length = 1
+        frames = []
+        for i in xrange(length):
+            self.index += 1
+            due = self.wall_origin + self.index / self.rate
+            if self.jitter:
+                due += self.random.gauss(0, self.jitter)
+            self.last_due = max(self.last_due, due)  # bytes keep their order
+            frames.append(self._frame())
+        self.held.extend((self.last_due, frame) for frame in frames)
+
+    def _buffer(self, frame):
+        if self.buffered + len(frame) > self.buffer_size:
+            self.overrun += len(frame)
+            return
+        self.chunks.append(frame)
+        self.buffered += len(frame)
+
+    def _fill(self, wanted=1):
+        '''
+        Move the frames due to the read buffer.
+
+        Unpaced, frames are generated until "wanted" bytes are waiting (or
+        half the buffer, so that the frames generated always fit).
+        '''
+        if not self.streaming:
+            return
+        wanted = min(wanted, self.buffer_size // 2)
+        now = time()
+        while True:
+            if not self.held:
+                if not self.paced and self.buffered >= wanted:
+                    return
+                self._schedule()
+            if self.paced and self.held[0][0] > now:
+                return
+            self._buffer(self.held.popleft()[1])
+
+    def _take(self, size):
+        data = ''.join(self.chunks)
+        if len(data) > size:
+            self.chunks = [data[size:]]
+            data = data[:size]
+        else:
+            self.chunks = []
+        self.buffered -= len(data)
+        return data
+
+    def _next_due(self):
+        if not self.streaming:
+            return None
+        if not self.held:
+            self._schedule()
+        return self.held[0][0]
+
+    def write(self, string):
+        '''
+        Apply a command, in the form "X value" (see boat.Boat.send_command).
+        '''
+        try:
+            key, value = string.split()
+            value = int(float(value))
+        except ValueError:
+            return    # the Arduino ignores malformed commands too
+        with self.lock:
+            self.model.command(key, value)
+            if key == SET_LOG_INTERVAL:
+                self.streaming = value != 0
+                self.held.clear()
+                self.wall_origin = self.last_due = time()
+                self.index = 0
+
+    def inWaiting(self):
+        with self.lock:
+            self._fill()
+            return self.buffered
+
+    def readline(self):
+        '''
+        Return the next text message if it is complete, or an empty string.
+        '''
+        with self.lock:
+            self._fill()
+            data = ''.join(self.chunks)
+            end = data.find('\r') + 1
+            if not end:
+                return ''
+            return self._take(end)
+
+    def read(self, size=1):
+        '''
+        Return up to "size" bytes, waiting for them up to "timeout" seconds.
+
+        Like serial.Serial, an empty string is returned on timeout.
+        '''
+        timeout = self.timeout if self.timeout is not None else 0.01
+        with self.lock:
+            self._fill(size)
+            if not self.buffered:
+                due = self._next_due()
+            else:
+                due = 0
+        if due == None:
+            sleep(timeout)
+            return ''
+        wait = due - time()
+        if wait > 0:
+            sleep(min(wait, timeout))
+        with self.lock:
+            self._fill(size)
+            return self._take(size)
+
+
+class SimulatedBoat(boat.BareBoat):
+
+    '''
+    Boat connected to a SimulatedSerial (same arguments).
+    '''
+
+    def __init__(self, threaded=True, **kwargs):
+        super(SimulatedBoat, self).__init__(SimulatedSerial(**kwargs),
+                                            threaded=threaded)
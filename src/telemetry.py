@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+'''
+Decode the telemetry frames sent by the boat into its attributes.
+
+Two wire formats are supported: the human readable "!K:V K:V ..." text
+messages, and the compact binary frames of BinaryCodec. Both can be mixed
+on the same serial line or UDP link.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import re
+import struct
+from binascii import crc_hqx
+from commons import *
+
+# -----------------------------------------------------------------------------
+# --- ERROR AND EXCEPTIONS DEFINITIONS
+# -----------------------------------------------------------------------------
+
+class MalformedFrameError(ValueError):
+
+    def __init__(self, value):
+        self.parameter = value
+
+    def __str__(self):
+        return repr(self.parameter)
+
+# -----------------------------------------------------------------------------
+# --- TEXT FRAMES
+# -----------------------------------------------------------------------------
+
+def _to_integer(value):
+    '''
+    Convert an INTEGER field, tolerating values sent as "12.0".
+    '''
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+# Converters for the sqlite types used in LOG_SIGNALS
+CONVERTERS = {
+    'INTEGER' : _to_integer,
+    'REAL'    : float,
+}
+
+# Default value of a field, by sqlite type
+DEFAULTS = {
+    'INTEGER' : 0,
+    'REAL'    : 0.0,
+}
+
+
+class FrameDecoder(object):
+
+    '''
+    Decode "K:V K:V ..." frames into the attributes of an object (a boat).
+
+    The table giving the attribute name and the converter of each key is
+    built once from the signal definitions. INTEGER values are converted
+    with int(), and only if that fails with the tolerant CONVERTERS.
+    '''
+
+    def __init__(self, signals=LOG_SIGNALS):
+        self.fields = dict((key, (entry[0], int if entry[2] == 'INTEGER'
+                                  else CONVERTERS[entry[2]]))
+                           for key, entry in signals.iteritems())
+        self.tolerant = dict((key, (entry[0], CONVERTERS[entry[2]]))
+                             for key, entry in signals.iteritems())
+
+    def decode(self, data, target):
+        '''
+        Update the attributes of "target" with the content of the frame "data".
+
+        "data" is the frame without its leading exclamation mark. The frame is
+        validated as a whole before being applied, so a corrupted frame never
+        leaves the target half-updated. Return the number of fields decoded.
+        '''
+        try:
+            decoded = self._convert(data, self.fields)
+        except ValueError:    # e.g. "12.0" for an INTEGER
+            decoded = self._convert(data, self.tolerant)
+        for name, value in decoded:
+            setattr(target, name, value)
+        return len(decoded)
+
+    def _convert(self, data, fields):
+        # Return the [(attribute, value), ...] list of the frame "data"
+        decoded = []
+        try:
+            for bit in data.split():
+                key, value = bit.split(':')
+                name, convert = fields[key]
+                decoded.append((name, convert(value)))
+        except (KeyError, ValueError, OverflowError):    # e.g. "B:1e999"
+            raise MalformedFrameError(data)
+        return decoded
+
+# -----------------------------------------------------------------------------
+# --- BINARY FRAMES
+# -----------------------------------------------------------------------------
+
+# A binary frame is made of:
+#   magic    1 byte   BINARY_MAGIC (never found in ascii text messages)
+#   version  1 byte   BINARY_VERSION (the layout of the frame)
+#   schema   1 byte   fingerprint of the LOG_SIGNALS keys and types
+#   length   1 byte   length of the payload
+#   seq      2 bytes  sequence number (wraps around)
+#   mask     4 bytes  bit N set if the N-th signal (sorted by key) is present
+#   payload           the present values, little endian, in schema order
+#   crc      2 bytes  CRC-CCITT of all of the above
+BINARY_MAGIC = '\xa5'
+BINARY_VERSION = 1
+HEADER = struct.Struct('<cBBBHI')
+CRC = struct.Struct('<H')
+
+# Struct format of each signal in the payload, by sqlite type. Signals that
+# do not fit (see LOG_SIGNALS_BINARY in commons) are overridden by key.
+BINARY_FORMATS = {
+    'INTEGER' : 'i',
+    'REAL'    : 'd',
+}
+
+
+class BinaryCodec(object):
+
+    '''
+    Encode and decode binary frames with a schema derived from LOG_SIGNALS.
+    '''
+
+    def __init__(self, signals=LOG_SIGNALS, overrides=LOG_SIGNALS_BINARY):
+        self.keys = sorted(signals)
+        assert len(self.keys) <= 32, "The presence mask is 32 bits long"
+        self.names = [signals[k][0] for k in self.keys]
+        self.formats = [overrides.get(k, BINARY_FORMATS[signals[k][2]])
+                        for k in self.keys]
+        self.index = dict((k, i) for i, k in enumerate(self.keys))
+        description = ' '.join(k + f for k, f in zip(self.keys, self.formats))
+        self.schema = crc_hqx(description, 0xFFFF) & 0xFF
+        self.structs = {}    # payload Struct by presence mask
+
+    def _payload_struct(self, mask):
+        try:
+            return self.structs[mask]
+        except KeyError:
+            fmt = '<' + ''.join(f for i, f in enumerate(self.formats)
+                                if mask & (1 << i))
+            self.structs[mask] = struct.Struct(fmt)
+            return self.structs[mask]
+
+    def encode(self, values, seq):
+        '''
+        Return the binary frame for "values", a {key: value} dictionary.
+        '''
+        mask = 0
+        for key in values:
+            mask |= 1 << self.index[key]
+        ordered = [values[k] for k in self.keys if k in values]
+        payload = self._payload_struct(mask).pack(*ordered)
+        frame = HEADER.pack(BINARY_MAGIC, BINARY_VERSION, self.schema,
+                            len(payload), seq & 0xFFFF, mask) + payload
+        return frame + CRC.pack(crc_hqx(frame, 0xFFFF))
+
+    def encode_state(self, boat, seq):
+        '''
+        Return the binary frame carrying every signal of a boat.
+        '''
+        return self.encode(dict((k, getattr(boat, n))
+                                for k, n in zip(self.keys, self.names)), seq)
+
+    def frame_length(self, header):
+        '''
+        Return the total length of a frame, given (at least) its header.
+        '''
+        return HEADER.size + ord(header[3]) + CRC.size
+
+    def decode(self, frame):
+        '''
+        Return (seq, [(key, value), ...]) for a binary frame.
+
+        Raise MalformedFrameError if the frame is truncated, corrupted or
+        built with a different version or schema.
+        '''
+        if len(frame) < HEADER.size + CRC.size or \
+           len(frame) != self.frame_length(frame):
+            raise MalformedFrameError(frame)
+        magic, version, schema, length, seq, mask = \
+                HEADER.unpack_from(frame)
+        crc, = CRC.unpack_from(frame, len(frame) - CRC.size)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION or \
+           schema != self.schema or crc != crc_hqx(frame[:-CRC.size], 0xFFFF):
+            raise MalformedFrameError(frame)
+        payload = self._payload_struct(mask)
+        if payload.size != length:
+            raise MalformedFrameError(frame)
+        values = payload.unpack_from(frame, HEADER.size)
+        keys = [k for i, k in enumerate(self.keys) if mask & (1 << i)]
+        return seq, zip(keys, values)
+
+    def to_text(self, frame):
+        '''
+        Return the text log message ("!K:V ...") equivalent to a binary frame.
+        '''
+        seq, fields = self.decode(frame)
+        return '!' + ' '.join('%s:%s' % field for field in fields)
+
+
+class FrameSplitter(object):
+
+    '''
+    Split a byte stream into text messages and binary frames.
+
+    Text messages are terminated by a carriage return and are returned
+    stripped. Binary frames are returned whole. When a frame fails its
+    check, nothing is returned for it: the stream is resynchronised on the
+    next magic byte, exclamation mark (start of a log message) or byte
+    following a carriage return, and the "corrupted" counter is increased.
+    Text containing non-printable bytes (what is left of a corrupted frame)
+    is discarded the same way.
+    '''
+
+    # Bytes of an unterminated message after which the buffer is discarded
+    MAX_PENDING = 4096
+    NOT_TEXT = re.compile('[^\t\n\x20-\x7e]')
+
+    def __init__(self, binary_codec=None):
+        self.codec = binary_codec or codec
+        self.buffer = ''
+        self.corrupted = 0
+
+    def feed(self, data):
+        '''
+        Add "data" to the stream and return the list of complete messages.
+        '''
+        buf = self.buffer + data
+        output = []
+        pos = 0
+        while pos < len(buf):
+            if buf[pos] == BINARY_MAGIC:
+                if len(buf) - pos < HEADER.size:
+                    break
+                end = pos + self.codec.frame_length(buf[pos:pos+HEADER.size])
+                if end > len(buf):
+                    break
+                try:
+                    self.codec.decode(buf[pos:end])
+                except MalformedFrameError:
+                    self.corrupted += 1
+                    pos = self._resync(buf, pos)
+                else:
+                    output.append(buf[pos:end])
+                    pos = end
+                continue
+            start = pos
+            cr = buf.find('\r', pos)
+            magic = buf.find(BINARY_MAGIC, pos)
+            if magic != -1 and (cr == -1 or magic < cr):
+                end = pos = magic
+            elif cr != -1:
+                end, pos = cr, cr + 1
+            else:
+                break
+            text = buf[start:end].strip()
+            if self.NOT_TEXT.search(text):
+                self.corrupted += 1
+                pos = self._resync(buf, start)
+            elif text:
+                output.append(text)
+        self.buffer = buf[pos:]
+        if len(self.buffer) > self.MAX_PENDING:
+            self.corrupted += 1
+            self.buffer = ''
+        return output
+
+    def _resync(self, buf, pos):
+        # Return where the next message may start after corrupted data at
+        # "pos" (the end of "buf" if there is no such place yet)
+        candidates = [buf.find(BINARY_MAGIC, pos + 1), buf.find('!', pos + 1)]
+        cr = buf.find('\r', pos + 1)
+        if cr != -1:
+            candidates.append(cr + 1)
+        candidates = [candidate for candidate in candidates if candidate != -1]
+        return min(candidates) if candidates else len(buf)
+
+
+def is_log_message(msg):
+    '''
+    Return True if "msg" carries log data (as opposed to debug messages).
+    '''
+    return msg[0] == '!' or msg[0] == BINARY_MAGIC
+
+
+def message_fields(msg):
+    '''
+    Return the [(key, value), ...] list carried by a log message.
+
+    "msg" can be either a text message (with or without its leading
+    exclamation mark) or a binary frame. Values are converted according to
+    the type declared in LOG_SIGNALS.
+    '''
+    if msg[0] == BINARY_MAGIC:
+        return codec.decode(msg)[1]
+    fields = []
+    try:
+        for bit in msg.lstrip('!').split():
+            key, value = bit.split(':')
+            fields.append((key, CONVERTERS[LOG_SIGNALS[key][2]](value)))
+    except (KeyError, ValueError, OverflowError):
+        raise MalformedFrameError(msg)
+    return fields
+
+
+def to_text(msg):
+    '''
+    Return "msg" as a text message, converting it if it is a binary frame.
+    '''
+    return codec.to_text(msg) if msg[0] == BINARY_MAGIC else msg
+
+# The decoder and codec used by the boats (and anybody parsing boat frames)
+decoder = FrameDecoder()
+codec = BinaryCodec()
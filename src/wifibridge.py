@@ -9,47 +9,116 @@ __copyright__ = "Copyright (c) 2010 The Magellan Machinep"
 __license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
 
 
+import select
 import socket
+from collections import deque
 from commons import *
 from time import time
 
 class WifiBridge(object):
     '''
-    classdocs
+    UDP link between the FreeRunner and a remote client.
+
+    Incoming datagrams are drained from the socket all at once into "inbox"
+    (pings are answered, pongs passed to "on_pong" on the way, see
+    linkquality). "status", if set, is a function whose result is added to
+    the pongs, so that the other end can see how its data is received. The
+    socket can be watched from the GTK main loop (see watch), so that
+    datagrams are handled as soon as they arrive rather than at the next
+    timer tick; outside GTK, wait() blocks until the socket is readable.
     '''
-    def __init__(self, remote_address=None):
+    def __init__(self, remote_address=None, port=WIFI_PORT):
+        '''
+        "port" is the local UDP port (0 for any free port).
+        '''
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind(("", WIFI_PORT))
+        self.socket.bind(("", port))
         self.socket.setblocking(0)
         self.remote_address = remote_address
         self.last_ping_request_time = 0
+        self.inbox = deque()
+        self.watch_id = None
+        self.on_pong = None
+        self.status = None
 
-    def read(self):
+    def fileno(self):
+        return self.socket.fileno()
+
+    def drain(self):
         '''
-        Read messages from the wifi bridge.
+        Read every datagram waiting on the socket into "inbox".
 
-        Can return:
-        - None               : no message present
-        - data, (host, port) : if the server is not linked to a client
-        - data               : if the server is already linked
-        '''
-        try:
-            if self.remote_address:
-                msg = self.socket.recv(1024)
-            else:
-                msg, self.remote_address = self.socket.recvfrom(1024)
-                self.last_wifi_in_time = time()  # first msg ever received
-        except socket.error:
-            return None
-        else:
+        The first sender becomes the remote address if none was given.
+        Return the number of messages added to the inbox.
+        '''
+        received = 0
+        while True:
+            try:
+                msg, address = self.socket.recvfrom(WIFI_DATAGRAM_SIZE)
+            except socket.error:    # nothing left (or an ICMP error)
+                break
             self.last_wifi_in_time = time()
+            if not self.remote_address:
+                self.remote_address = address  # first msg ever received
             if msg == 'ping':
                 self.write('pong')
-                return None
-            if msg == 'pong':
-                return None
-            else:
-                return msg
+            elif msg.startswith('ping:'):    # echo the probe and our status
+                status = ':' + self.status() if self.status else ''
+                self.write('pong' + msg[4:] + status)
+            elif msg.startswith('pong:'):
+                if self.on_pong:
+                    self.on_pong(msg[5:])
+            elif msg != 'pong':
+                self.inbox.append(msg)
+                received += 1
+        return received
+
+    def read(self):
+        '''
+        Read messages from the wifi bridge.
+
+        Return the oldest message received, or None if there is none.
+        '''
+        if not self.inbox:
+            self.drain()
+        return self.inbox.popleft() if self.inbox else None
+
+    def wait(self, timeout=None):
+        '''
+        Wait up to "timeout" seconds (forever if None) for a message.
+
+        Return True if a message is waiting in the inbox.
+        '''
+        if not self.inbox and select.select([self.socket], [], [], timeout)[0]:
+            self.drain()
+        return bool(self.inbox)
+
+    def watch(self, callback=None):
+        '''
+        Drain the socket from the GTK main loop whenever it is readable.
+
+        If "callback" is given, it is called with each message received
+        (in order), otherwise messages stay in the inbox for read().
+        '''
+        import gobject    # the bridge is also used without GTK
+        def on_readable(source, condition):
+            self.drain()
+            while callback and self.inbox:
+                callback(self.inbox.popleft())
+            return True
+        self.unwatch()
+        self.watch_id = gobject.io_add_watch(self.socket, gobject.IO_IN,
+                                             on_readable)
+
+    def unwatch(self):
+        if self.watch_id != None:
+            import gobject
+            gobject.source_remove(self.watch_id)
+            self.watch_id = None
+
+    def close(self):
+        self.unwatch()
+        self.socket.close()
 
     def write(self, data, server=None):
         if server == None:
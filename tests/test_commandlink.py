@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the acknowledged command channel, over a lossy and reordering link.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import time
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import commandlink
+from commons import WIFI_RTO_INITIAL, WIFI_RTO_MIN
+
+
+class Clock(object):
+
+    '''
+    Stand-in for time.time, moved forward by hand.
+    '''
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class CommandLinkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = commandlink.time = Clock()
+        self.sender = commandlink.CommandSender()
+        self.receiver = commandlink.CommandReceiver()
+
+    def tearDown(self):
+        commandlink.time = time.time
+
+    def deliver(self, datagrams):
+        # Return the commands executed and the acknowledgements
+        executed = []
+        acks = []
+        for datagram in datagrams:
+            ack, command = self.receiver.receive(datagram)
+            acks.append(ack)
+            if command != None:
+                executed.append(command)
+        return executed, acks
+
+
+class TestNewer(unittest.TestCase):
+
+    def test_wraparound(self):
+        self.assertTrue(commandlink._newer(1, 0))
+        self.assertTrue(commandlink._newer(0, 0xFFFF))
+        self.assertTrue(commandlink._newer(2, 0xFFFE))
+        self.assertFalse(commandlink._newer(0xFFFF, 0))
+        self.assertFalse(commandlink._newer(7, 7))
+        self.assertFalse(commandlink._newer(0x8000, 0))
+
+
+class TestCommandSender(CommandLinkTestCase):
+
+    def test_exactly_once(self):
+        # Every other datagram is lost, one ack in three too, and each
+        # batch arrives in reverse order
+        commands = ['SET%d 1' % i for i in range(20)]
+        datagrams = [self.sender.send(command) for command in commands]
+        executed = []
+        count = 0
+        while self.sender.pending:
+            batch = []
+            for datagram in datagrams:
+                count += 1
+                if count % 2:
+                    batch.append(datagram)
+            done, acks = self.deliver(reversed(batch))
+            executed.extend(done)
+            for ack in acks:
+                count += 1
+                if count % 3:
+                    self.sender.on_ack(ack)
+            self.clock.now += 2
+            datagrams = self.sender.retransmissions()
+        self.assertEqual(sorted(executed), sorted(commands))
+        self.assertEqual(self.sender.acked, len(commands))
+        self.assertEqual(self.sender.failed, 0)
+        self.assertTrue(self.receiver.duplicates > 0)
+
+    def test_karn(self):
+        # The RTT of a retransmitted command is ambiguous: not sampled
+        datagram = self.sender.send('R 10')
+        self.clock.now += WIFI_RTO_INITIAL
+        self.assertEqual(self.sender.retransmissions(), [datagram])
+        self.clock.now += 0.05
+        self.sender.on_ack(self.receiver.receive(datagram)[0])
+        self.assertEqual(self.sender.srtt, None)
+        self.assertEqual(self.sender.rto, WIFI_RTO_INITIAL)
+        self.assertEqual(self.sender.lost, 1)
+        datagram = self.sender.send('R 20')
+        self.clock.now += 0.05
+        self.sender.on_ack(self.receiver.receive(datagram)[0])
+        self.assertAlmostEqual(self.sender.srtt, 0.05)
+        self.assertAlmostEqual(self.sender.rttvar, 0.025)
+        self.assertAlmostEqual(self.sender.rto, 0.15)
+
+    def test_rto_floor(self):
+        for i in range(50):
+            datagram = self.sender.send('R %d' % i)
+            self.clock.now += 0.001
+            self.sender.on_ack(self.receiver.receive(datagram)[0])
+        self.assertEqual(self.sender.rto, WIFI_RTO_MIN)
+
+    def test_backoff_and_failure(self):
+        self.sender = commandlink.CommandSender(retries=2)
+        self.sender.send('M 1')
+        times = []
+        for i in range(100):
+            self.clock.now += 0.1
+            if self.sender.retransmissions():
+                times.append(self.clock.now)
+        self.assertEqual(len(times), 2)
+        self.assertTrue(times[1] - times[0] > 2 * WIFI_RTO_INITIAL - 0.01)
+        self.assertEqual(self.sender.failed, 1)
+        self.assertEqual(self.sender.pending, {})
+        self.assertEqual(self.sender.lost, 3)
+
+    def test_refused(self):
+        datagram = self.sender.send('M 1')
+        self.sender.on_nack(commandlink.nack(datagram))
+        self.clock.now += 10
+        self.assertEqual(self.sender.retransmissions(), [])
+        self.assertEqual(self.sender.refused, 1)
+
+    def test_results(self):
+        results = []
+        self.sender = commandlink.CommandSender(retries=0)
+        self.sender.on_result = lambda seq, delivered: \
+                                results.append((seq, delivered))
+        acked = self.sender.send('M 1')
+        refused = self.sender.send('M 2')
+        self.sender.send('M 3')
+        self.sender.on_nack(commandlink.nack(refused))
+        ack = self.receiver.receive(acked)[0]
+        self.sender.on_ack(ack)
+        self.sender.on_ack(ack)
+        self.clock.now += 10
+        self.sender.retransmissions()
+        self.assertEqual(results, [(2, False), (1, True), (3, False)])
+
+    def test_other_session(self):
+        datagram = self.sender.send('M 1')
+        other = commandlink.CommandSender()
+        other.session = (self.sender.session + 1) & 0xFFFF
+        self.sender.on_ack(self.receiver.receive(other.send('M 1'))[0])
+        self.assertEqual(len(self.sender.pending), 1)
+        self.sender.on_ack(self.receiver.receive(datagram)[0])
+        self.assertEqual(self.sender.acked, 1)
+
+
+class TestCommandReceiver(CommandLinkTestCase):
+
+    def test_stale(self):
+        # An older rudder position overtaken by a newer one is acknowledged
+        # but not executed; other commands are not affected
+        old = self.sender.send('R 10')
+        mode = self.sender.send('M 2')
+        new = self.sender.send('R 20')
+        executed, acks = self.deliver([new, mode, old])
+        self.assertEqual(executed, ['R 20', 'M 2'])
+        self.assertTrue(None not in acks)
+        self.assertEqual(self.receiver.stale, 1)
+
+    def test_sequence_wraparound(self):
+        self.sender.seq = 0xFFFD
+        datagrams = [self.sender.send('R %d' % i) for i in range(4)]
+        executed, acks = self.deliver(datagrams[:2] + datagrams[3:])
+        self.assertEqual(executed, ['R 0', 'R 1', 'R 3'])
+        executed, acks = self.deliver(datagrams)
+        self.assertEqual(executed, [])
+        self.assertEqual(self.receiver.duplicates, 3)
+        self.assertEqual(self.receiver.stale, 1)
+
+    def test_dedup_window(self):
+        self.receiver = commandlink.CommandReceiver(window=4)
+        datagrams = [self.sender.send('S%d 1' % i) for i in range(6)]
+        self.deliver(datagrams)
+        executed, acks = self.deliver(datagrams[:1] + datagrams[-1:])
+        self.assertEqual(executed, ['S0 1'])    # forgotten
+        self.assertEqual(self.receiver.duplicates, 1)
+
+    def test_new_session(self):
+        datagram = self.sender.send('M 1')
+        self.deliver([datagram])
+        restarted = commandlink.CommandSender()
+        restarted.session = (self.sender.session + 1) & 0xFFFF
+        executed, acks = self.deliver([restarted.send('M 1')])
+        self.assertEqual(executed, ['M 1'])
+
+    def test_malformed(self):
+        self.assertEqual(self.receiver.receive('cmd:x:1:M 1'), (None, None))
+        self.assertEqual(self.receiver.receive('cmd:1'), (None, None))
+        self.assertEqual(self.receiver.malformed, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the telemetry hub: subscriptions and the control lease.
+
+The hub and its clients talk over UDP on the loopback interface.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import select
+import socket
+import sys
+import time
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import boat
+import commandlink
+import fanout
+import linkquality
+import relay
+from commons import WIFI_LEASE_TIME, WIFI_PING_INTERVAL, \
+                    WIFI_SUBSCRIBER_TIMEOUT
+from test_commandlink import Clock
+
+
+class TestTelemetryHub(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = fanout.time = linkquality.time = Clock()
+        self.hub = fanout.TelemetryHub(port=0, max_subscribers=2)
+        self.address = ('127.0.0.1', self.hub.socket.getsockname()[1])
+        self.clients = []
+
+    def tearDown(self):
+        fanout.time = linkquality.time = time.time
+        self.hub.close()
+        for client in self.clients:
+            client.close()
+
+    def client(self):
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.bind(('127.0.0.1', 0))
+        client.settimeout(1)
+        self.clients.append(client)
+        return client
+
+    def send(self, client, msg):
+        # Return the number of messages the hub added to its inbox
+        client.sendto(msg, self.address)
+        select.select([self.hub.socket], [], [], 1)
+        return self.hub.drain()
+
+    def replies(self, client):
+        result = []
+        while select.select([client], [], [], 0.05)[0]:
+            result.append(client.recv(4096))
+        return result
+
+    def test_subscribers(self):
+        clients = [self.client() for i in range(3)]
+        for client in clients:
+            self.send(client, 'sub:0.5')
+        self.assertEqual(len(self.hub.subscribers), 2)
+        self.assertEqual(self.hub.rejected, 1)
+        self.hub.publish('#hello', None)
+        self.assertEqual(self.replies(clients[0]), ['#hello'])
+        self.assertEqual(self.replies(clients[2]), [])
+        self.send(clients[0], 'unsub')
+        self.assertEqual(len(self.hub.subscribers), 1)
+
+    def test_unencodable(self):
+        # A value out of the range of its binary format is relayed as text
+        client = self.client()
+        self.send(client, 'sub:0')
+        source = boat.Boat()
+        source.parse_log_data('H:90')
+        self.hub.publish('!H:90', source)
+        source.parse_log_data('B:3000000000')
+        self.hub.publish('!B:3000000000', source)
+        source.parse_log_data('B:10')
+        self.hub.publish('!B:10', source)
+        replies = self.replies(client)
+        self.assertEqual(replies[1], '!B:3000000000')
+        self.assertEqual(self.hub.unencodable, 1)
+        decoder = relay.DeltaDecoder()
+        decoder.decode(replies[0])
+        self.assertTrue('B:10' in decoder.decode(replies[2]).split())
+        self.assertEqual(decoder.lost, 0)
+
+    def test_subscriber_timeout(self):
+        client = self.client()
+        self.send(client, 'sub:0')
+        self.clock.now += WIFI_SUBSCRIBER_TIMEOUT + 1
+        self.hub.service()
+        self.assertEqual(self.hub.subscribers, {})
+
+    def test_ping(self):
+        client = self.client()
+        self.send(client, 'ping:7')
+        self.assertEqual(self.replies(client), ['pong:7'])
+        self.clock.now += WIFI_PING_INTERVAL
+        self.hub.service()
+        probe = self.replies(client)[0]
+        self.assertTrue(probe.startswith('ping:'))
+        self.send(client, 'pong' + probe[4:])
+        self.assertEqual(self.hub.stats()[0]['pongs'], 1)
+
+    def test_lease(self):
+        first, second = self.client(), self.client()
+        sender = commandlink.CommandSender()
+        datagram = sender.send('M 1')
+        self.assertEqual(self.send(first, datagram), 0)    # just watching
+        self.assertEqual(self.replies(first), [commandlink.nack(datagram)])
+        self.assertEqual(self.send(first, 'M 1'), 0)
+        self.send(first, 'take')
+        self.assertEqual(self.send(first, datagram), 1)
+        self.send(second, 'take')
+        datagram = sender.send('M 2')
+        self.assertEqual(self.send(second, datagram), 0)
+        self.assertEqual(self.replies(second), [commandlink.nack(datagram)])
+        self.send(second, 'release')    # not the controller: no effect
+        self.assertFalse(self.hub.service())
+        self.send(first, 'release')
+        self.hub.write('reply')    # to a command sent before releasing
+        self.assertEqual(self.replies(first)[-1], 'reply')
+        self.assertTrue(self.hub.service())
+        self.assertFalse(self.hub.service())
+        self.send(second, 'take')
+        self.assertEqual(self.send(second, datagram), 1)
+        self.assertEqual(self.hub.remote_address, second.getsockname())
+        self.send(second, 'unsub')
+        self.assertEqual(self.hub.remote_address, None)
+        self.assertTrue(self.hub.service())
+
+    def test_lease_expiry(self):
+        first, second = self.client(), self.client()
+        self.send(first, 'take')
+        self.send(second, 'take')
+        self.clock.now += WIFI_LEASE_TIME / 2.0
+        self.send(second, 'pong')
+        self.assertFalse(self.hub.service())
+        self.clock.now += WIFI_LEASE_TIME / 2.0 + 1
+        self.send(second, 'pong')
+        self.assertTrue(self.hub.service())
+        self.assertEqual(self.hub.remote_address, None)
+        self.assertFalse(self.hub.service())
+        self.send(second, 'take')
+        self.assertEqual(self.send(second, 'M 2'), 1)
+
+    def test_remote_boat(self):
+        # Connecting does not take the lease, take_control does
+        remote = boat.RemoteBoat(self.address)
+        try:
+            select.select([self.hub.socket], [], [], 1)
+            self.assertEqual(self.hub.drain(), 0)
+            self.assertEqual(self.hub.remote_address, None)
+            remote.take_control()
+            remote.send_command('M', 1)
+            select.select([self.hub.socket], [], [], 1)
+            self.hub.drain()
+            self.assertEqual(len(self.hub.inbox), 1)
+            remote.release()
+            select.select([self.hub.socket], [], [], 1)
+            self.hub.drain()
+            self.assertEqual(self.hub.remote_address, None)
+            self.assertTrue(self.hub.service())
+            # Closing the window of the controller loses the lease too
+            remote.take_control()
+        finally:
+            remote.close()
+        select.select([self.hub.socket], [], [], 1)
+        self.hub.drain()
+        self.assertEqual(self.hub.subscribers, {})
+        self.assertTrue(self.hub.service())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the batch geodesy: both backends must agree.
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import geodesy
+
+# Missing coordinates and timestamps, a pause and a clock going backwards
+LATITUDES = [57.7, 57.7001, None, 57.7003, 57.7004, 57.7004, 57.7005]
+LONGITUDES = [11.9, 11.9001, 11.9002, None, 11.9004, 11.9004, 11.9005]
+MILLIS = [0, 1000, 2000, None, 4000, 4000, 3000]
+
+
+class TestTrackSegments(unittest.TestCase):
+
+    def test_python(self):
+        distances, speeds, cumulative = geodesy.track_segments(
+                LATITUDES, LONGITUDES, MILLIS, use_numpy=False)
+        self.assertEqual(len(distances), len(LATITUDES) - 1)
+        self.assertTrue(distances[0] > 10)
+        self.assertEqual(distances[1:3], [0.0, 0.0])    # missing coordinates
+        self.assertEqual(speeds[3], 0.0)                # missing timestamp
+        self.assertEqual(speeds[4:], [0.0, 0.0])        # no elapsed time
+        self.assertAlmostEqual(cumulative[-1], sum(distances))
+
+    @unittest.skipIf(geodesy.numpy == None, 'numpy is not installed')
+    def test_backends_agree(self):
+        expected = geodesy.track_segments(LATITUDES, LONGITUDES, MILLIS,
+                                          use_numpy=False)
+        result = geodesy.track_segments(LATITUDES, LONGITUDES, MILLIS)
+        for values, expected_values in zip(result, expected):
+            self.assertEqual(len(values), len(expected_values))
+            for value, expected_value in zip(values, expected_values):
+                self.assertAlmostEqual(value, expected_value)
+
+    def test_empty_track(self):
+        self.assertEqual([len(values) for values in geodesy.track_segments(
+                          [], [], [], use_numpy=False)], [0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the ground station: commands are answered once the boat answers.
+
+The FreeRunner (a fanout.TelemetryHub), the ground station and its client
+talk over UDP on the loopback interface.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import boat
+import commandlink
+import fanout
+import groundstation
+from commons import RC, SET_PILOT_MODE
+
+
+class TestGroundStation(unittest.TestCase):
+
+    def setUp(self):
+        self.freerunner = fanout.TelemetryHub(port=0)
+        address = ('127.0.0.1', self.freerunner.socket.getsockname()[1])
+        self.station = groundstation.GroundStation(address, udp_port=0,
+                                                   tcp_port=0)
+        self.client = boat.RemoteBoat(
+                ('127.0.0.1', self.station.hub.socket.getsockname()[1]))
+        self.other = boat.RemoteBoat(address)
+        self.receiver = commandlink.CommandReceiver()
+        self.executed = []
+
+    def tearDown(self):
+        self.station.close()
+        self.client.close()
+        self.other.close()
+        self.freerunner.close()
+
+    def spin(self, steps=10):
+        for i in range(steps):
+            self.station.step(0.01)
+            self.freerunner.drain()
+            while self.freerunner.inbox:
+                ack, command = self.receiver.receive(
+                        self.freerunner.inbox.popleft())
+                self.freerunner.write(ack)
+                self.executed.append(command)
+            self.client.poll_messages()
+
+    def test_acknowledged(self):
+        self.client.take_control()
+        self.client.send_command('M', 1)
+        self.spin()
+        self.assertEqual(self.executed, ['M 1\r'])
+        self.assertEqual(self.client.commands.acked, 1)
+        self.assertEqual(self.station.replies, {})
+
+    def test_refused_upstream(self):
+        # Another client of the FreeRunner is in control
+        self.other.take_control()
+        self.spin()
+        self.client.take_control()
+        self.client.send_command('M', 1)
+        self.spin()
+        self.assertEqual(self.executed, [])
+        self.assertEqual(self.client.commands.refused, 1)
+        self.assertEqual(self.client.commands.acked, 0)
+        self.assertEqual(self.client.commands.pending, {})
+
+    def test_not_in_control(self):
+        self.client.send_command('M', 1)
+        self.spin()
+        self.assertEqual(self.client.commands.refused, 1)
+        self.assertEqual(self.station.forwarded, 0)
+
+    def test_released(self):
+        # With the watchdog, a client releasing the lease is a lost lease
+        self.station.watchdog = True
+        self.client.take_control()
+        self.spin()
+        self.assertTrue(self.station.in_control)
+        self.client.release()
+        self.spin()
+        self.assertEqual(self.executed, ['%s %d\r' % (SET_PILOT_MODE, RC)])
+        self.assertFalse(self.station.in_control)
+        self.assertEqual(self.freerunner.remote_address, None)
+        self.assertTrue(self.freerunner.service())
+
+
+if __name__ == '__main__':
+    unittest.main()
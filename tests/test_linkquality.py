@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the link estimates and of the adaptation of the telemetry rate.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import time
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import linkquality
+from commons import WIFI_ADAPT_INTERVAL, WIFI_EWMA_WEIGHT, \
+                    WIFI_MAYBE_LOST, WIFI_PING_INTERVAL, WIFI_PING_TIMEOUT, \
+                    WIFI_RELAY_INTERVALS, WIFI_UPGRADE_DELAY
+from test_commandlink import Clock
+
+
+class LinkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = linkquality.time = Clock()
+        self.link = linkquality.LinkEstimator()
+
+    def tearDown(self):
+        linkquality.time = time.time
+
+    def exchange(self, rtt, counters=''):
+        # Ping, and pong "rtt" seconds later
+        self.clock.now += WIFI_PING_INTERVAL
+        probe = self.link.ping()
+        self.clock.now += rtt
+        self.link.on_pong(probe[5:] + counters)
+
+
+class TestLinkEstimator(LinkTestCase):
+
+    def test_rtt_and_jitter(self):
+        self.exchange(0.2)
+        self.assertAlmostEqual(self.link.rtt, 0.2)
+        self.assertEqual(self.link.jitter, None)
+        self.exchange(0.1)
+        self.assertAlmostEqual(self.link.rtt, 0.2 - WIFI_EWMA_WEIGHT * 0.1)
+        self.assertAlmostEqual(self.link.jitter, 0.1)
+        self.assertEqual(self.link.loss, 0.0)
+
+    def test_ping_interval(self):
+        self.clock.now += WIFI_PING_INTERVAL
+        self.assertNotEqual(self.link.ping(), None)
+        self.clock.now += WIFI_PING_INTERVAL / 2
+        self.assertEqual(self.link.ping(), None)
+
+    def test_lost_probe(self):
+        self.clock.now += WIFI_PING_INTERVAL
+        probe = self.link.ping()
+        self.clock.now += WIFI_PING_TIMEOUT + 0.1
+        self.link.ping()
+        self.assertEqual(self.link.loss, 1.0)
+        self.link.on_pong(probe[5:])    # too late
+        self.assertEqual(self.link.pongs, 0)
+        self.assertEqual(self.link.rtt, None)
+
+    def test_malformed_pong(self):
+        self.link.on_pong('x')
+        self.link.on_pong('')
+        self.assertEqual(self.link.pongs, 0)
+
+    def test_log_period(self):
+        self.assertEqual(linkquality.log_period(3), 3)
+        self.assertEqual(linkquality.log_period(-250), 0.25)
+        self.assertEqual(linkquality.log_period(0), 0)
+
+    def test_telemetry_loss(self):
+        self.exchange(0.01, ':100:0')
+        self.assertEqual(self.link.telemetry_loss, None)
+        self.exchange(0.01, ':190:10')
+        self.assertAlmostEqual(self.link.telemetry_loss, 0.1)
+        self.exchange(0.01, ':5:0')    # a new client
+        self.assertAlmostEqual(self.link.telemetry_loss, 0.1)
+
+
+class TestRateController(LinkTestCase):
+
+    def setUp(self):
+        super(TestRateController, self).setUp()
+        self.rate = linkquality.RateController(self.link)
+
+    def test_degrade_and_hysteresis(self):
+        self.link.loss = 0.5
+        self.assertTrue(self.rate.update())
+        self.assertEqual(self.rate.level, 1)
+        self.assertEqual(self.rate.relay_interval, WIFI_RELAY_INTERVALS[1])
+        self.assertEqual(self.link.loss, None)    # measured afresh
+        self.link.loss = 0.5
+        self.assertFalse(self.rate.update())    # too soon
+        self.clock.now += WIFI_ADAPT_INTERVAL
+        self.assertTrue(self.rate.update())
+        self.assertEqual(self.rate.level, 2)
+        # Neither good nor bad: the level stays put
+        for i in range(20):
+            self.link.loss = 0.05
+            self.clock.now += WIFI_ADAPT_INTERVAL
+            self.assertFalse(self.rate.update())
+        self.assertEqual(self.rate.level, 2)
+
+    def test_upgrade(self):
+        self.rate.level = 2
+        self.link.loss = 0.0
+        self.link.rtt = 0.01
+        self.assertFalse(self.rate.update())
+        self.clock.now += WIFI_UPGRADE_DELAY - 0.1
+        self.assertFalse(self.rate.update())
+        self.clock.now += 0.1
+        self.assertTrue(self.rate.update())
+        self.assertEqual(self.rate.level, 1)
+        self.link.loss = 0.0
+        self.clock.now += WIFI_ADAPT_INTERVAL
+        self.assertFalse(self.rate.update())    # one level per delay
+        self.clock.now += WIFI_UPGRADE_DELAY
+        self.assertTrue(self.rate.update())
+        self.assertEqual(self.rate.level, 0)
+
+    def test_rtt(self):
+        self.link.rtt = 1.0
+        self.assertTrue(self.rate.update())
+        self.assertEqual(self.rate.level, 1)
+
+    def test_log_interval(self):
+        self.rate.level = 1
+        self.assertEqual(self.rate.log_interval(-50), -50)    # relay only
+        linkquality.WIFI_ADAPT_LOG_INTERVAL = True
+        try:
+            self.assertEqual(self.rate.log_interval(-50), -100)
+            self.assertEqual(self.rate.log_interval(-200), -200)
+            self.assertEqual(self.rate.log_interval(3), 3)
+            self.assertEqual(self.rate.log_interval(0), 0)
+            self.rate.level = len(WIFI_RELAY_INTERVALS) - 1
+            self.assertEqual(self.rate.log_interval(1), -2000)
+        finally:
+            linkquality.WIFI_ADAPT_LOG_INTERVAL = False
+
+    def test_silence(self):
+        self.link.loss = 0.5
+        self.rate.update()
+        self.assertTrue(self.rate.update(silence=WIFI_MAYBE_LOST + 1))
+        self.assertEqual(self.rate.level, len(WIFI_RELAY_INTERVALS) - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the log database.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import shutil
+import datetime
+import tempfile
+from cStringIO import StringIO
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from storm.locals import Store, create_database
+
+import log
+import rawlog
+
+START = 1700000000.0    # unix time of the first signal of the test logs
+COLUMNS = log.SIGNAL_COLUMNS[1:]    # all but the ID
+
+
+def track_lines(start, seconds, moving=True):
+    '''
+    Return the raw log lines of a track sampled every second from "start".
+
+    The boat sails east at about 1 m/s if "moving", or stays still.
+    '''
+    lines = []
+    for i in range(seconds):
+        longitude = 18.0 + (i * 0.00002 if moving else 0)
+        lines.append('%.3f !T:%d X:%.6f Y:59.300000 P:1\n' %
+                     (start + i, i * 1000, longitude))
+    return lines
+
+
+def voyage_lines(start=START):
+    '''
+    Return the raw log lines of two stints, then of a move too short to be
+    one, ended by a stop, sampled every second from "start".
+    '''
+    lines = []
+    longitude = 18.0
+    for seconds, moving in ((40, True), (20, False), (50, True),
+                            (10, False), (3, True), (10, False)):
+        for i in range(seconds):
+            if moving:
+                longitude += 0.00002
+            lines.append('%.3f !T:%d X:%.6f Y:59.300000 P:1\n' %
+                         (start + len(lines), len(lines) * 1000, longitude))
+    return lines
+
+
+class LogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def write_raw(self, lines, name='raw.txt', mode='w'):
+        with open(self.path(name), mode) as raw:
+            raw.writelines(lines)
+        return self.path(name)
+
+    def all_signals(self, db):
+        return db.signals_between(0, 2 ** 32, COLUMNS)
+
+
+class TestImport(LogTestCase):
+
+    def test_import(self):
+        raw = self.write_raw(track_lines(START, 100))
+        db = log.LogDataBase(self.path('log.sqlite'))
+        self.assertEqual(db.import_log(raw, chunk_size=30), 100)
+        self.assertEqual(len(self.all_signals(db)), 100)
+        self.assertEqual(db.get_import_offset(raw), os.path.getsize(raw))
+        self.assertEqual(db.import_log(raw), 0)
+
+    def test_resume(self):
+        lines = track_lines(START, 100)
+        full = log.LogDataBase(self.path('full.sqlite'))
+        full.import_log(self.write_raw(lines, 'full.txt'))
+        # The last line is still being written when the first import runs
+        raw = self.write_raw(lines[:60] + [lines[60][:10]])
+        db = log.LogDataBase(self.path('log.sqlite'))
+        self.assertEqual(db.import_log(raw, chunk_size=7), 60)
+        self.write_raw([lines[60][10:]] + lines[61:], mode='a')
+        self.assertEqual(db.import_log(raw, chunk_size=7), 40)
+        self.assertEqual(self.all_signals(db), self.all_signals(full))
+
+    def test_malformed(self):
+        lines = track_lines(START, 10)
+        lines[0] = '%.3f !B:60 0 T:200\n' % (START - 1)
+        lines[5] = '%.3f !T:abc\n' % (START + 100)
+        raw = self.write_raw(lines)
+        db = log.LogDataBase(self.path('log.sqlite'))
+        self.assertEqual(db.import_log(raw, chunk_size=1), 8)
+        self.assertEqual(db.malformed, 2)
+        self.assertEqual(db.get_import_offset(raw), os.path.getsize(raw))
+        self.assertEqual(db.import_log(raw), 0)
+
+
+
+class TestStints(LogTestCase):
+
+    def test_full_scan(self):
+        db = log.LogDataBase(self.path('log.sqlite'))
+        db.import_log(self.write_raw(voyage_lines()))
+        stints = db.find_stints()
+        self.assertEqual(len(stints), 2)
+        self.assertEqual(stints, db.find_stints(from_id=1))
+
+    def test_incremental(self):
+        lines = voyage_lines()
+        full = log.LogDataBase(self.path('full.sqlite'))
+        full.import_log(self.write_raw(lines, 'full.txt'))
+        expected = full.find_stints(db_save=True)
+        db = log.LogDataBase(self.path('log.sqlite'))
+        stints = []
+        # Cut the log inside the stints and in the still periods
+        for start, stop in ((0, 17), (17, 18), (18, 55), (55, 90),
+                            (90, 130), (130, len(lines))):
+            db.import_log(self.write_raw(lines[start:stop], mode='a'))
+            stints.extend(db.find_stints(db_save=True))
+        self.assertEqual(stints, expected)
+        self.assertEqual(db.find_stints(db_save=True), [])
+
+
+
+class TestQueries(LogTestCase):
+
+    def test_migrations(self):
+        # A DB created before the schema had a version
+        fname = self.path('old.sqlite')
+        old = log.LogDataBase.__new__(log.LogDataBase)
+        old.store = Store(create_database('sqlite:' + fname))
+        old._generate_schema()
+        old.store.execute('INSERT INTO signals (time, ardu_millis) \
+                VALUES (?, 1000)',
+                (unicode(datetime.datetime.fromtimestamp(START + 0.25)),))
+        old.store.commit()
+        old.store.close()
+        db = log.LogDataBase(fname)
+        self.assertEqual(db.store.execute('PRAGMA user_version').get_one(),
+                         (len(log.MIGRATIONS),))
+        self.assertEqual(db.signals_between(START, START + 1,
+                                            ('timestamp', 'ardu_millis')),
+                         [(START + 0.25, 1000)])
+        db.store.close()
+        self.assertEqual(len(log.LogDataBase(fname).signals_between(
+                START, START + 1)), 1)
+
+    def test_signals_between(self):
+        lines = track_lines(START, 10)
+        db = log.LogDataBase(self.path('log.sqlite'))
+        db.import_log(self.write_raw(lines[5:] + lines[:5]))
+        signals = db.signals_between(START + 2, START + 4,
+                                     ('timestamp', 'ardu_millis'))
+        self.assertEqual(signals, [(START + 2, 2000), (START + 3, 3000),
+                                   (START + 4, 4000)])
+        self.assertEqual(db.signals_between(START + 10, START + 20), [])
+        self.assertEqual(len(db.signals_between(START, START)[0]),
+                         len(log.SIGNAL_COLUMNS))
+        self.assertRaises(ValueError, db.signals_between, START, START + 1,
+                          ('timestamp', 'speed'))
+
+
+class TestStats(LogTestCase):
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+        self.db = log.LogDataBase(self.path('log.sqlite'))
+        self.db.import_log(self.write_raw(voyage_lines()))
+        self.db.find_stints(db_save=True)
+
+    def test_stint_stats(self):
+        stats = self.db.get_db_stats()
+        self.assertEqual(stats['signal_number'], 133)
+        self.assertEqual(stats['stint_number'], 2)
+        self.assertEqual(stats['orphans'], 133 - 40 - 51)
+        stint = stats['stints'][0]
+        self.assertEqual((stint['start_signal'], stint['stop_signal']),
+                         (1, 40))
+        self.assertEqual(stint['signals'], 40)
+        self.assertEqual(stint['duration'], 39.0)
+        self.assertEqual(stint['time_auto'], 39.0)
+        self.assertEqual(stint['time_rc'], 0.0)
+        self.assertAlmostEqual(stint['distance'], 39 * 1.137, delta=0.5)
+        self.assertAlmostEqual(stint['avg_speed'],
+                               stint['distance'] / stint['duration'])
+        self.assertEqual(self.db.get_stint_stats(stint['stint']), stint)
+
+    def test_refresh(self):
+        self.assertEqual(self.db.refresh_stats(), 2)
+        self.assertEqual(self.db.refresh_stats(), 0)
+        stint = self.db.store.get(log.Stint, 1)
+        stint.stop_signal = 20
+        self.assertEqual(self.db.refresh_stats(), 1)
+        self.assertEqual(self.db.get_stint_stats(1)['signals'], 20)
+        self.db.store.remove(stint)
+        self.db.refresh_stats()
+        self.assertEqual(self.db.get_stint_stats(1), None)
+        self.assertEqual(self.db.get_db_stats()['stint_number'], 1)
+
+
+
+class TestPartitions(LogTestCase):
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+        # Two sessions, more than LOG_SESSION_GAP seconds apart
+        self.second = START + 10000
+        self.lines = voyage_lines() + voyage_lines(self.second)
+        self.raw = self.write_raw(self.lines[:133])
+        self.directory = self.path('partitions')
+        self.db = log.PartitionedLog(self.directory, 'session')
+
+    def test_sessions(self):
+        self.assertEqual(self.db.import_log(self.raw), 133)
+        self.write_raw(self.lines[133:], mode='a')
+        self.assertEqual(self.db.import_log(self.raw), 133)
+        self.assertEqual(len(self.db.get_partitions()), 2)
+        first, second = self.db.get_partitions()
+        self.assertEqual(self.db.get_partitions(self.second, self.second),
+                         [second])
+        self.assertEqual(len(self.db.signals_between(START, self.second)),
+                         134)
+        self.assertEqual([stint[0] for stint in
+                          self.db.find_stints(db_save=True)],
+                         [first, first, second, second])
+        stints = self.db.get_stints()
+        self.assertEqual([stint[:2] for stint in stints],
+                         [(first, 1), (first, 2), (second, 1), (second, 2)])
+        self.assertEqual(stints[2][2], self.second)
+        self.assertEqual(self.db.get_db_stats()['stint_number'], 4)
+
+    def export(self, stints, infile):
+        cli = log.CommandLine.__new__(log.CommandLine)
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            return cli.export_to_keyhole_files(stints, infile=infile,
+                                               outfile=self.path('path_'))
+        finally:
+            sys.stdout = stdout
+
+    def test_export(self):
+        self.write_raw(self.lines[133:], mode='a')
+        self.db.import_log(self.raw)
+        self.db.find_stints(db_save=True)
+        second = self.db.get_partitions()[1]
+        failures = self.export([(second, 2), (second, 3), 1],
+                               self.directory)
+        self.assertEqual([stint for stint, error in failures],
+                         [(second, 3), 1])
+        kml = open(self.path('path_%s_2.kml' % second)).read()
+        self.assertTrue('<kml' in kml and '18.0' in kml)
+        self.assertEqual(log.CommandLine.parse_stint(second + ':2'),
+                         (second, 2))
+
+    def test_export_single_db(self):
+        db = log.LogDataBase(self.path('log.sqlite'))
+        db.import_log(self.raw)
+        db.find_stints(db_save=True)
+        failures = self.export([2, ('2026-10-18', 2)],
+                               self.path('log.sqlite'))
+        self.assertEqual([stint for stint, error in failures],
+                         [('2026-10-18', 2)])
+        self.assertTrue(os.path.isfile(self.path('path_2.kml')))
+
+
+
+class TestLiveWriter(LogTestCase):
+
+    def live_writer(self, **kwargs):
+        return log.LiveDatabaseWriter(self.path('log.sqlite'),
+                                      batch_interval=3600, stint_interval=3600,
+                                      **kwargs)
+
+    def records(self, lines):
+        # Stamps with more precision than the text log keeps
+        return [(float(stamp) + 0.0004, msg.rstrip('\n')) for stamp, msg in
+                (line.split(None, 1) for line in lines)]
+
+    def test_batches(self):
+        writer = self.live_writer(batch_frames=5)
+        records = self.records(track_lines(START, 7))
+        for stamp, msg in records[:4]:
+            writer.write(stamp, msg)
+        writer.write(START, 'debug message')
+        self.assertFalse(writer.sync())
+        writer.write(*records[4])
+        self.assertTrue(writer.sync())
+        reader = log.LogDataBase(self.path('log.sqlite'), read_only=True)
+        self.assertEqual(len(self.all_signals(reader)), 5)
+        reader.store.close()
+        writer.write(*records[5])
+        writer.write(START + 6, '!T:abc')
+        writer.close()
+        reader = log.LogDataBase(self.path('log.sqlite'), read_only=True)
+        self.assertEqual(len(self.all_signals(reader)), 6)
+        self.assertEqual((writer.records, writer.malformed), (6, 1))
+
+    def test_stints_on_close(self):
+        lines = voyage_lines()
+        writer = self.live_writer()
+        for stamp, msg in self.records(lines):
+            writer.write(stamp, msg)
+        writer.close()
+        full = log.LogDataBase(self.path('full.sqlite'))
+        full.import_log(self.write_raw(lines))
+        full.find_stints(db_save=True)
+        db = log.LogDataBase(self.path('log.sqlite'))
+        self.assertEqual(db.store.find(log.Stint).count(), 2)
+        self.assertEqual(db.get_db_stats()['stints'],
+                         full.get_db_stats()['stints'])
+
+    def test_import_after_live(self):
+        # The raw logs recorded along the DB add nothing when imported
+        records = self.records(track_lines(START, 20))
+        writer = self.live_writer()
+        text = rawlog.TextLogWriter(self.path('raw.log'))
+        segments = rawlog.RawLogWriter(self.path('raw'))
+        for stamp, msg in records:
+            for output in (writer, text, segments):
+                output.write(stamp, msg)
+        for output in (writer, text, segments):
+            output.close()
+        db = log.LogDataBase(self.path('log.sqlite'))
+        self.assertEqual(db.import_log(self.path('raw.log')), 0)
+        self.assertEqual(db.import_log(segments.fname), 0)
+        self.assertEqual(len(self.all_signals(db)), 20)
+        self.assertEqual(db.signals_between(START, START, ('timestamp',)),
+                         [(START,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the raw log writers and readers.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os
+import os.path
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from itertools import islice
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import boat
+import rawlog
+import telemetry
+
+START = 1700000000.0    # unix time of the first record of the test logs
+
+
+def records(number):
+    '''
+    Return "number" records, one a second: text and binary log messages,
+    and debug messages.
+    '''
+    source = boat.Boat()
+    result = []
+    for i in range(number):
+        source.ardu_millis = i * 1000
+        if i % 3 == 0:
+            msg = telemetry.codec.encode_state(source, i)
+        elif i % 3 == 1:
+            msg = '!T:%d H:%d' % (i * 1000, i)
+        else:
+            msg = 'debug %d' % i
+        result.append((START + i + 0.0001, msg))
+    return result
+
+
+class RawLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tmp, 'raw')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_segments(self, records, **kwargs):
+        writer = rawlog.RawLogWriter(self.directory, **kwargs)
+        for stamp, msg in records:
+            writer.write(stamp, msg)
+        writer.close()
+        return writer
+
+    def read_segments(self, signals=False):
+        result = []
+        for segment in rawlog.list_segments(self.directory):
+            reader = rawlog.RawLogReader(segment)
+            result.extend(reader.iter_signals() if signals
+                          else reader.iter_records())
+            reader.close()
+        return result
+
+
+class TestSegments(RawLogTestCase):
+
+    def test_round_trip(self):
+        written = records(30)
+        writer = self.write_segments(written)
+        self.assertEqual(writer.records, 30)
+        self.assertEqual(self.read_segments(), written)
+        self.assertEqual(self.read_segments(signals=True),
+                         [r for r in written if not r[1].startswith('debug')])
+
+    def test_rotation(self):
+        written = records(30)
+        self.write_segments(written[:10], segment_time=4)
+        self.assertEqual(len(rawlog.list_segments(self.directory)), 3)
+        self.write_segments(written[10:], segment_size=100)
+        segments = rawlog.list_segments(self.directory)
+        self.assertTrue(len(segments) > 4)
+        self.assertEqual(os.path.basename(segments[3]), '000004.rlog')
+        self.assertEqual(self.read_segments(), written)
+
+    def test_torn_record(self):
+        written = records(10)
+        writer = self.write_segments(written)
+        size = os.path.getsize(writer.fname)
+        with open(writer.fname, 'r+b') as segment:
+            segment.truncate(size - 3)
+        reader = rawlog.RawLogReader(writer.fname)
+        self.assertEqual(list(reader.iter_records()), written[:9])
+        self.assertFalse(reader.corrupted)
+        self.assertEqual(reader.offset, size - rawlog.RECORD.size -
+                                        len(written[9][1]))
+
+    def test_corrupted_record(self):
+        written = records(10)
+        writer = self.write_segments(written)
+        with open(writer.fname, 'r+b') as segment:
+            segment.seek(-1, os.SEEK_END)
+            segment.write('#')
+        reader = rawlog.RawLogReader(writer.fname)
+        self.assertEqual(list(reader.iter_records()), written[:9])
+        self.assertTrue(reader.corrupted)
+
+    def test_resume(self):
+        written = records(10)
+        writer = self.write_segments(written)
+        reader = rawlog.RawLogReader(writer.fname)
+        self.assertEqual(list(islice(reader.iter_records(), 4)), written[:4])
+        offset = reader.offset
+        self.assertEqual(list(reader.iter_records(offset)), written[4:])
+
+    def test_is_segment(self):
+        writer = self.write_segments(records(1))
+        self.assertTrue(rawlog.is_segment(writer.fname))
+        text = os.path.join(self.tmp, 'raw.log')
+        rawlog.TextLogWriter(text).close()
+        self.assertFalse(rawlog.is_segment(text))
+        self.assertFalse(rawlog.is_segment(self.directory))
+        self.assertRaises(IOError, rawlog.RawLogReader, text)
+
+
+
+class FakeWriter(object):
+
+    '''
+    Writer recording the messages in memory, which can be made to wait in
+    write() until "release" is set, or to fail.
+    '''
+
+    fsync_interval = 0.01
+
+    def __init__(self, fail=False):
+        self.messages = []
+        self.records = 0
+        self.bytes_written = 0
+        self.fail = fail
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.forced_syncs = 0
+        self.closed = False
+
+    def write(self, stamp, msg):
+        if self.fail:
+            raise IOError("No space left on device")
+        self.entered.set()
+        self.release.wait()
+        self.messages.append(msg)
+        self.records += 1
+        self.bytes_written += len(msg)
+
+    def sync(self, force=False):
+        self.forced_syncs += force
+
+    def close(self):
+        self.closed = True
+
+
+class TestAsyncWriter(RawLogTestCase):
+
+    def blocked_writer(self, **kwargs):
+        # Return an AsyncLogWriter whose thread waits in the write of 'm0'
+        fake = FakeWriter()
+        fake.release.clear()
+        writer = rawlog.AsyncLogWriter(fake, **kwargs)
+        writer.write(START, 'm0')
+        self.assertTrue(fake.entered.wait(2))
+        return fake, writer
+
+    def test_text_log(self):
+        fname = os.path.join(self.tmp, 'raw.log')
+        writer = rawlog.AsyncLogWriter(rawlog.TextLogWriter(fname))
+        for stamp, msg in records(50):
+            writer.write(stamp, msg.encode('hex'))
+        writer.close()
+        self.assertFalse(writer.is_alive())
+        lines = open(fname).readlines()
+        self.assertEqual(lines, ['%.3f %s\n' % (stamp, msg.encode('hex'))
+                                 for stamp, msg in records(50)])
+        stats = writer.stats()
+        self.assertEqual((stats['records'], stats['dropped']), (50, 0))
+        self.assertEqual(stats['bytes'], os.path.getsize(fname))
+
+    def test_drop_oldest(self):
+        fake, writer = self.blocked_writer(queue_size=3)
+        for i in range(1, 6):
+            writer.write(START + i, 'm%d' % i)
+        stats = writer.stats()
+        self.assertEqual((stats['depth'], stats['max_depth'],
+                          stats['dropped']), (3, 3, 2))
+        fake.release.set()
+        writer.close()
+        self.assertEqual(fake.messages, ['m0', 'm3', 'm4', 'm5'])
+        self.assertTrue(fake.closed)
+
+    def test_block(self):
+        fake, writer = self.blocked_writer(queue_size=2, policy='block')
+        writer.write(START + 1, 'm1')
+        writer.write(START + 2, 'm2')
+        producer = threading.Thread(target=writer.write,
+                                    args=(START + 3, 'm3'))
+        producer.start()
+        producer.join(0.1)
+        self.assertTrue(producer.is_alive())
+        fake.release.set()
+        producer.join(2)
+        self.assertFalse(producer.is_alive())
+        writer.close()
+        self.assertEqual(fake.messages, ['m0', 'm1', 'm2', 'm3'])
+        self.assertEqual(writer.stats()['dropped'], 0)
+
+    def test_writer_error(self):
+        writer = rawlog.AsyncLogWriter(FakeWriter(fail=True))
+        writer.write(START, 'm0')
+        writer.join(2)
+        self.assertTrue(isinstance(writer.error, IOError))
+        writer.write(START + 1, 'm1')
+        writer.close()
+        self.assertEqual(writer.stats()['dropped'], 2)
+
+    def test_forced_sync(self):
+        fake = FakeWriter()
+        writer = rawlog.AsyncLogWriter(fake)
+        writer.write(START, 'm0')
+        writer.sync(force=True)
+        writer.close()
+        self.assertTrue(fake.forced_syncs >= 1)
+        self.assertEqual(fake.messages, ['m0'])
+
+    def test_policy(self):
+        self.assertRaises(ValueError, rawlog.AsyncLogWriter, FakeWriter(),
+                          policy='drop-newest')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the delta-encoded telemetry relay.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import boat
+import relay
+
+
+class TestRelay(unittest.TestCase):
+
+    def setUp(self):
+        self.source = boat.Boat()
+        self.encoder = relay.DeltaEncoder(keyframe_interval=3600)
+        self.decoder = relay.DeltaDecoder()
+
+    def frames(self, number):
+        # Return "number" frames, each changing the heading
+        result = []
+        for i in range(number):
+            self.source.desired_heading += 1
+            result.append(self.encoder.encode(self.source))
+        return result
+
+    def test_round_trip(self):
+        self.source.parse_log_data('X:1.5 R:-10')
+        for frame in self.frames(5):
+            msg = self.decoder.decode(frame)
+        target = boat.Boat()
+        target.parse_log_data(msg[1:])
+        for name in ('desired_heading', 'longitude', 'rudder_position'):
+            self.assertEqual(getattr(target, name), getattr(self.source, name))
+        self.assertTrue(self.decoder.synchronised)
+        self.assertEqual(self.encoder.encode(self.source), None)
+
+    def test_lost_deltas(self):
+        frames = self.frames(5)
+        for frame in frames[:2] + frames[4:]:
+            self.decoder.decode(frame)
+        self.assertEqual(self.decoder.lost, 2)
+        self.assertFalse(self.decoder.synchronised)
+
+    def test_lost_before_keyframe(self):
+        # Frames lost just before a keyframe are counted too
+        frames = self.frames(3)
+        self.encoder.request_keyframe()
+        keyframe = self.frames(1)[0]
+        self.decoder.decode(frames[0])
+        self.decoder.decode(keyframe)
+        self.assertEqual(self.decoder.lost, 2)
+        self.assertTrue(self.decoder.synchronised)
+
+    def test_stale(self):
+        frames = self.frames(3)
+        for frame in frames[:1] + frames[2:] + frames[1:2] + frames[2:]:
+            self.decoder.decode(frame)
+        self.assertEqual(self.decoder.stale, 2)
+        self.assertEqual(self.decoder.lost, 1)
+
+    def test_restarted_encoder(self):
+        # A keyframe is applied even with an older sequence number
+        self.frames(10)
+        for frame in self.frames(10):
+            self.decoder.decode(frame)
+        self.encoder = relay.DeltaEncoder()
+        self.source.desired_heading = 7
+        msg = self.decoder.decode(self.frames(1)[0])
+        self.assertTrue('H:8' in msg.split())
+        self.assertEqual(self.decoder.stale, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
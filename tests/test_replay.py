@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the replay of recorded logs.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import boat
+import log
+import rawlog
+import replay
+import telemetry
+from test_commandlink import Clock
+
+START = 1700000000.0    # unix time of the first record of the test logs
+
+
+class ReplayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = boat.Boat()
+        self.records = []
+        for i in range(20):
+            self.source.ardu_millis = i * 1000
+            self.source.desired_heading = i * 10
+            self.source.longitude = 18.0 + i / 1000.0
+            if i % 2:
+                msg = telemetry.codec.encode_state(self.source, i)
+            else:
+                msg = '!T:%d H:%d X:%.3f' % (self.source.ardu_millis,
+                                             self.source.desired_heading,
+                                             self.source.longitude)
+            self.records.append((START + i, msg))
+        self.records.insert(5, (START + 4.5, 'debug message'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_text(self):
+        fname = os.path.join(self.tmp, 'raw.log')
+        writer = rawlog.TextLogWriter(fname)
+        for stamp, msg in self.records:
+            writer.write(stamp, telemetry.to_text(msg)
+                         if msg[0] == telemetry.BINARY_MAGIC else msg)
+        writer.close()
+        return fname
+
+    def write_segments(self):
+        directory = os.path.join(self.tmp, 'raw')
+        writer = rawlog.RawLogWriter(directory, segment_time=8)
+        for stamp, msg in self.records:
+            writer.write(stamp, msg)
+        writer.close()
+        return directory
+
+
+class TestRoundTrip(ReplayTestCase):
+
+    def replay(self, source, number):
+        # Return the "number" messages polled by a boat replaying "source"
+        replayed = replay.ReplayBoat(source, speed=None)
+        messages = []
+        deadline = time.time() + 5
+        while len(messages) < number and time.time() < deadline:
+            msg = replayed.poll_message()
+            if msg != None:
+                messages.append(msg)
+            else:
+                time.sleep(0.001)
+        replayed.close()
+        self.assertEqual(len(messages), number)
+        self.assertTrue(replayed.ser.finished)
+        for name in ('ardu_millis', 'desired_heading', 'longitude'):
+            self.assertEqual(getattr(replayed, name),
+                             getattr(self.source, name))
+        return messages
+
+    def test_segments(self):
+        directory = self.write_segments()
+        self.assertTrue(len(rawlog.list_segments(directory)) > 1)
+        messages = self.replay(directory, 21)
+        self.assertEqual(messages[1], telemetry.to_text(self.records[1][1]))
+
+    def test_text_log(self):
+        messages = self.replay(self.write_text(), 21)
+        self.assertEqual(messages[5], 'debug message')
+
+    def test_database(self):
+        db = log.LogDataBase(os.path.join(self.tmp, 'log.sqlite'))
+        db.import_log(self.write_text())
+        db.store.close()
+        self.replay(db.db_file_name, 20)
+
+    def test_start(self):
+        records = list(replay.iter_records(self.write_segments(), START + 15))
+        self.assertEqual(records, self.records[16:])
+
+
+class TestTiming(ReplayTestCase):
+
+    def setUp(self):
+        ReplayTestCase.setUp(self)
+        self.clock = Clock()
+        replay.time = self.clock
+
+    def tearDown(self):
+        replay.time = time.time
+        ReplayTestCase.tearDown(self)
+
+    def test_speed(self):
+        serial = replay.ReplaySerial(self.write_segments(), speed=2)
+        self.assertEqual(serial.readline(), self.records[0][1] + '\r')
+        self.assertEqual(serial.readline(), '')
+        self.clock.now += 0.5
+        self.assertEqual(serial.readline(), self.records[1][1])
+        self.assertEqual(serial.position, START + 2)
+        serial.set_speed(None)
+        self.assertEqual(len(list(iter(serial.readline, ''))), 19)
+        self.assertTrue(serial.finished)
+        serial.close()
+
+    def test_gap(self):
+        self.records[10:] = [(stamp + 3600, msg)
+                             for stamp, msg in self.records[10:]]
+        serial = replay.ReplaySerial(self.write_segments())
+        self.clock.now += 9
+        # The record after the gap is due at once, the next one 1s later
+        self.assertEqual(len(list(iter(serial.readline, ''))), 12)
+        self.assertEqual(serial.position, START + 3600 + 11)
+        self.clock.now += 1
+        self.assertEqual(serial.readline(), self.records[12][1])
+        serial.close()
+
+    def test_seek_and_loop(self):
+        serial = replay.ReplaySerial(self.write_segments(), speed=None,
+                                     loop=True)
+        serial.seek(START + 18)
+        self.assertEqual(serial.readline(), self.records[19][1] + '\r')
+        self.assertEqual(serial.readline(), self.records[20][1])
+        self.assertEqual(serial.loops, 1)
+        self.assertEqual(serial.position, START)
+        self.assertFalse(serial.finished)
+        serial.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
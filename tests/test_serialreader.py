@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the background serial reader and of its frame buffer.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import time
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import serialreader
+import telemetry
+
+
+class ChunkSerial(object):
+
+    '''
+    Stand-in for serial.Serial returning the given chunks of bytes, then
+    timing out (or raising "error" if given).
+    '''
+
+    def __init__(self, chunks, error=None):
+        self.chunks = list(chunks)
+        self.error = error
+        self.timeout = None
+
+    def inWaiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size=1):
+        if self.chunks:
+            return self.chunks.pop(0)
+        if self.error:
+            raise self.error
+        time.sleep(self.timeout)
+        return ''
+
+
+class TestFrameRing(unittest.TestCase):
+
+    def test_overflow(self):
+        ring = serialreader.FrameRing(3)
+        for i in range(5):
+            ring.push('!H:%d' % i)
+        self.assertEqual(ring.overflowed, 2)
+        self.assertEqual([ring.pop() for i in range(4)],
+                         ['!H:2', '!H:3', '!H:4', None])
+
+    def test_coalesce(self):
+        ring = serialreader.FrameRing()
+        for msg in ('!H:1', '!H:2', 'debug', '!H:3', '!H:4'):
+            ring.push(msg)
+        self.assertEqual(ring.pop(coalesce=True), '!H:2')
+        self.assertEqual(ring.pop(coalesce=True), 'debug')
+        self.assertEqual(ring.pop(coalesce=True), '!H:4')
+        self.assertEqual(ring.dropped, 2)
+
+
+class TestSerialReader(unittest.TestCase):
+
+    def read_all(self, ser, number):
+        reader = serialreader.SerialReader(ser)
+        reader.start()
+        deadline = time.time() + 2
+        while len(reader.ring) < number and time.time() < deadline:
+            time.sleep(0.01)
+        reader.stop()
+        return reader, [reader.ring.pop() for i in range(len(reader.ring))]
+
+    def test_split_messages(self):
+        frame = telemetry.codec.encode({'H': 90}, 1)
+        data = '!H:1\r debug \r' + frame + '!H:2\r'
+        chunks = [data[i:i+3] for i in range(0, len(data), 3)]
+        reader, messages = self.read_all(ChunkSerial(chunks), 4)
+        self.assertEqual(messages, ['!H:1', 'debug', frame, '!H:2'])
+        self.assertFalse(reader.is_alive())
+
+    def test_device_error(self):
+        error = IOError('unplugged')
+        reader = serialreader.SerialReader(ChunkSerial(['!H:1\r'], error))
+        reader.start()
+        reader.join(2)    # the thread ends by itself
+        self.assertFalse(reader.is_alive())
+        self.assertTrue(reader.error is error)
+        self.assertEqual(reader.ring.pop(), '!H:1')
+
+
+if __name__ == '__main__':
+    unittest.main()
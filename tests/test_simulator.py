@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the boat simulator.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import sys
+import time
+import random
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from commons import RC, SET_LOG_INTERVAL, SET_PILOT_MODE, SET_RUDDER
+import simulator
+import telemetry
+from test_commandlink import Clock
+
+START = 1700000000.0    # unix time of the first frame of the simulations
+
+
+def stream(read_size, size=20000, seed=1, **kwargs):
+    '''
+    Return the first "size" bytes of an unpaced simulation, read
+    "read_size" bytes at a time.
+    '''
+    serial = simulator.SimulatedSerial(paced=False, seed=seed, start=START,
+                                       **kwargs)
+    data = ''
+    while len(data) < size:
+        data += serial.read(read_size)
+    return data[:size]
+
+
+def messages(data):
+    splitter = telemetry.FrameSplitter()
+    result = splitter.feed(data)
+    return result, splitter.corrupted
+
+
+class TestStream(unittest.TestCase):
+
+    def test_reproducible(self):
+        data = stream(4096)
+        self.assertEqual(stream(7), data)
+        self.assertNotEqual(stream(4096, seed=2), data)
+
+    def test_text_frames(self):
+        frames, corrupted = messages(stream(1000))
+        self.assertEqual(corrupted, 0)
+        fields = [dict(telemetry.message_fields(frame)) for frame in frames]
+        for i, f in enumerate(fields[:10], 1):
+            self.assertAlmostEqual(f['T'], (START + i / 10.0) * 1000, delta=1)
+        self.assertEqual(sorted(fields[0]), sorted(simulator.SailingModel(
+                random.Random()).values(START)))
+
+    def test_binary_frames(self):
+        frames, corrupted = messages(stream(1000, binary=True))
+        self.assertEqual(corrupted, 0)
+        text = messages(stream(1000))[0]
+        for frame, message in zip(frames, text):
+            self.assertEqual(sorted(telemetry.message_fields(frame)),
+                             sorted(telemetry.message_fields(message)))
+            self.assertEqual(frame[0], telemetry.BINARY_MAGIC)
+
+    def test_corruption(self):
+        serial = simulator.SimulatedSerial(paced=False, seed=1, corruption=1)
+        frames, corrupted = messages(serial.read(20000))
+        self.assertEqual(serial.corrupted, serial.frames)
+        self.assertTrue(corrupted > 0)
+
+    def test_energy_counter(self):
+        # The counter goes beyond 2**31 µJ within hours
+        model = simulator.SailingModel(random.Random())
+        model.energy = 3e9
+        frame = telemetry.codec.encode(model.values(START), 1)
+        self.assertEqual(dict(telemetry.codec.decode(frame)[1])['e'],
+                         3000000000)
+
+
+class TestPacing(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock(START)
+        simulator.time = self.clock
+        self.serial = simulator.SimulatedSerial(rate=100, jitter=0, seed=1,
+                                                start=START, buffer_size=1000)
+
+    def tearDown(self):
+        simulator.time = time.time
+
+    def test_rate(self):
+        self.assertEqual(self.serial.inWaiting(), 0)
+        self.clock.now += 0.05
+        self.assertEqual(len(messages(self.serial.read(1000))[0]), 5)
+
+    def test_overrun(self):
+        self.clock.now += 0.995
+        self.assertTrue(0 < self.serial.inWaiting() <= 1000)
+        self.assertTrue(self.serial.overrun > 0)
+        self.assertEqual(self.serial.frames, 100)
+
+    def test_commands(self):
+        self.serial.write('%s %d\n' % (SET_PILOT_MODE, RC))
+        self.serial.write('%s %d\n' % (SET_RUDDER, 150))
+        self.serial.write('garbage')
+        self.clock.now += 0.01
+        fields = dict(telemetry.message_fields(self.serial.readline()))
+        self.assertEqual((fields['P'], fields['R']), (RC, 100))
+        self.serial.write('%s 0\n' % SET_LOG_INTERVAL)
+        self.clock.now += 1
+        self.assertEqual(self.serial.inWaiting(), 0)
+        self.serial.write('%s 1\n' % SET_LOG_INTERVAL)
+        self.clock.now += 0.01
+        self.assertEqual(dict(telemetry.message_fields(
+                self.serial.readline()))['I'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the telemetry frame splitting.
+
+Run from the repository root: "python -m unittest discover tests".
+'''
+
+__author__ = "The Magellan Machine developers"
+__created__ = "2026/10/18"
+__copyright__ = "Copyright (c) 2026 The Magellan Machine"
+__license__ = "GPLv3 - http://www.gnu.org/licenses/gpl.html"
+
+
+import os.path
+import struct
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import boat
+import telemetry
+
+
+def frame(seq=1):
+    return telemetry.codec.encode({'H': 90, 'R': -10, 'S': 50}, seq)
+
+
+def corrupt(data):
+    return data[:-1] + chr(ord(data[-1]) ^ 0xff)
+
+
+class TestFrameDecoder(unittest.TestCase):
+
+    def test_malformed(self):
+        state = boat.Boat()
+        for data in ('B:1e999', 'B:nan', 'B:x', 'B', 'Q:1', 'B:1 H'):
+            self.assertRaises(telemetry.MalformedFrameError,
+                              telemetry.decoder.decode, data, state)
+            self.assertRaises(telemetry.MalformedFrameError,
+                              telemetry.message_fields, '!' + data)
+        self.assertEqual(state.bat_timeleft, 0)
+
+    def test_integer_as_real(self):
+        state = boat.Boat()
+        self.assertEqual(telemetry.decoder.decode('B:12.0 X:1.5', state), 2)
+        self.assertEqual((state.bat_timeleft, state.longitude), (12, 1.5))
+
+    def test_boat_attributes(self):
+        source = boat.Boat()
+        source.parse_log_data('H:90 X:1.5 R:-10')
+        self.assertEqual((source.desired_heading, source.longitude,
+                          source.rudder_position), (90, 1.5, -10))
+        self.assertEqual(source.sail_position, 0)
+        fields = dict(telemetry.message_fields(
+                telemetry.codec.encode_state(source, 1)))
+        self.assertEqual((fields['H'], fields['X']), (90, 1.5))
+
+
+class TestBinaryCodec(unittest.TestCase):
+
+    def test_counters(self):
+        values = {'e': 3000000000, 'T': 1287400000000, 'R': -10}
+        frame = telemetry.codec.encode(values, 7)
+        self.assertEqual(telemetry.codec.decode(frame), (7, sorted(
+                values.items())))
+
+    def test_out_of_range(self):
+        self.assertRaises(struct.error, telemetry.codec.encode,
+                          {'B': 2 ** 31}, 1)
+
+
+class TestFrameSplitter(unittest.TestCase):
+
+    def test_text_and_frames(self):
+        splitter = telemetry.FrameSplitter()
+        output = splitter.feed('!a:1\r' + frame() + 'debug\r')
+        self.assertEqual(output, ['!a:1', frame(), 'debug'])
+        self.assertEqual(splitter.corrupted, 0)
+
+    def test_corrupted_frame_between_text(self):
+        splitter = telemetry.FrameSplitter()
+        output = splitter.feed('!a:1\r' + corrupt(frame()) + '!b:2\r')
+        self.assertEqual(output, ['!a:1', '!b:2'])
+        self.assertEqual(splitter.corrupted, 1)
+
+    def test_corrupted_frame_with_carriage_return(self):
+        # A carriage return inside the corrupted frame must not let its
+        # bytes through as text
+        data = corrupt(frame())
+        data = data[:6] + '\r' + data[7:]
+        splitter = telemetry.FrameSplitter()
+        output = splitter.feed('!a:1\r' + data + '!b:2\r' + frame(2))
+        self.assertEqual(output, ['!a:1', '!b:2', frame(2)])
+        self.assertTrue(splitter.corrupted >= 1)
+
+    def test_corrupted_frame_fed_in_pieces(self):
+        data = '!a:1\r' + corrupt(frame()) + '!b:2\r' + frame(2)
+        splitter = telemetry.FrameSplitter()
+        output = []
+        for i in xrange(len(data)):
+            output += splitter.feed(data[i])
+        self.assertEqual(output, ['!a:1', '!b:2', frame(2)])
+
+
+if __name__ == '__main__':
+    unittest.main()